@@ -0,0 +1,355 @@
+# scripts/backfill.py
+"""
+Resumable, sharded historical backfill across Garmin, Toggl and habits.
+
+    python -m scripts.cli backfill 2020-01-01               # through today
+    python -m scripts.cli backfill 2020-01-01 2021-01-01 --sources garmin toggl
+
+The range is split per source into shards on a fixed date grid (multiples of
+the shard length since SHARD_EPOCH), so a rerun over a different range lines
+up with the shards of earlier runs. Shards run in a bounded worker pool,
+handed out round-robin across sources, with SOURCE_LIMITS capping how many
+shards of one source run at once: Garmin's unofficial API and Toggl's
+per-token rate limit gain nothing from more parallel requests than that.
+
+Each finished shard is recorded in backfill_checkpoints. A restart skips
+every shard a checkpoint covers and runs failed or interrupted shards
+again; within a Garmin shard, sync_garmin_range also checkpoints every
+window, so an interrupted shard resumes where it stopped. Stores are
+upserts, so rerunning a shard is harmless. Habit shards read and write
+through PostgREST and only take a database connection to record their
+checkpoint.
+"""
+
+import json
+import logging
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from datetime import date, datetime, timedelta
+from typing import Callable, Deque, Dict, List, Optional, Sequence, Tuple
+
+from psycopg2.extensions import connection
+
+import scripts.config as config
+from scripts import metrics
+
+logger = logging.getLogger(__name__)
+
+BACKFILL_SOURCES = ("garmin", "toggl", "habits")
+
+# Most shards of one source running at the same time. Each concurrent
+# Garmin shard logs in a client of its own, so keep that one low.
+SOURCE_LIMITS = {
+    "garmin": 1,
+    "toggl": 2,
+    "habits": 2,
+}
+
+# Shard boundaries fall on multiples of the shard length counted from here
+SHARD_EPOCH = date(2000, 1, 1)
+
+# Sources whose shards never touch Postgres (they go through PostgREST)
+POSTGREST_SOURCES = ("habits",)
+
+Shard = Tuple[date, date]
+# (conn, shard_start, shard_end) -> result counts; raises on failure. conn
+# is None for POSTGREST_SOURCES.
+ShardRunner = Callable[[Optional[connection], date, date], Dict]
+
+
+def create_backfill_checkpoints_table_query() -> str:
+    """
+    Returns the SQL creating backfill_checkpoints, which records each
+    completed backfill shard with its result counts (JSON text).
+    """
+    return """
+    CREATE TABLE IF NOT EXISTS backfill_checkpoints (
+        source TEXT NOT NULL,
+        shard_start DATE NOT NULL,
+        shard_end DATE NOT NULL,
+        result TEXT,
+        completed_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+        PRIMARY KEY (source, shard_start, shard_end)
+    );
+    """
+
+
+def plan_shards(start_date: date, end_date: date, shard_days: int) -> List[Shard]:
+    """Split [start_date, end_date) into grid-aligned half-open shards."""
+    shard_days = max(1, shard_days)
+    shards = []
+    shard_start = start_date
+    while shard_start < end_date:
+        offset = (shard_start - SHARD_EPOCH).days % shard_days
+        shard_end = min(shard_start + timedelta(days=shard_days - offset), end_date)
+        shards.append((shard_start, shard_end))
+        shard_start = shard_end
+    return shards
+
+
+def load_checkpoints(
+    conn: connection,
+    source: str,
+    start_date: date,
+    end_date: date
+) -> List[Shard]:
+    """Completed shards of `source` overlapping [start_date, end_date)."""
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT shard_start, shard_end FROM backfill_checkpoints
+            WHERE source = %s AND shard_start < %s AND shard_end > %s
+            """,
+            (source, end_date, start_date)
+        )
+        return [(row[0], row[1]) for row in cur.fetchall()]
+
+
+def record_checkpoint(conn: connection, source: str, shard: Shard, result: Dict) -> None:
+    """Mark a shard completed (replacing an earlier record of it)."""
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            INSERT INTO backfill_checkpoints (source, shard_start, shard_end, result)
+            VALUES (%s, %s, %s, %s)
+            ON CONFLICT (source, shard_start, shard_end) DO UPDATE SET
+                result = EXCLUDED.result,
+                completed_at = now()
+            """,
+            (source, shard[0], shard[1], json.dumps(result, default=str))
+        )
+    if not conn.autocommit:
+        conn.commit()
+
+
+def clear_checkpoints(
+    conn: connection,
+    sources: Sequence[str],
+    start_date: date,
+    end_date: date
+) -> int:
+    """Forget completed shards overlapping the range. Returns rows deleted."""
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            DELETE FROM backfill_checkpoints
+            WHERE source = ANY(%s) AND shard_start < %s AND shard_end > %s
+            """,
+            (list(sources), end_date, start_date)
+        )
+        deleted = cur.rowcount
+    if not conn.autocommit:
+        conn.commit()
+    return deleted
+
+
+def _covered(shard: Shard, completed: List[Shard]) -> bool:
+    return any(start <= shard[0] and shard[1] <= end for start, end in completed)
+
+
+def garmin_shard_cursor(shard: Shard) -> str:
+    """sync_state key of a Garmin shard's per-window checkpoint."""
+    return f"garmin_backfill:{shard[0].isoformat()}:{shard[1].isoformat()}"
+
+
+def _garmin_runner() -> Tuple[Optional[ShardRunner], Callable[[], None]]:
+    """
+    Shard runner giving each worker thread its own client (garth sessions
+    aren't thread-safe), plus a cleanup callback saving their tokens. One
+    client logs in up front; the others resume from its tokens.
+    """
+    from scripts.fetcher import get_garmin_client, save_garmin_tokens, sync_garmin_range
+
+    first = get_garmin_client()
+    if first is None:
+        return None, lambda: None
+    tokens = first.garth.dumps()
+    clients = [first]
+    idle = [first]
+    lock = threading.Lock()
+    local = threading.local()
+
+    def worker_client():
+        if getattr(local, "client", None) is None:
+            with lock:
+                local.client = idle.pop() if idle else None
+            if local.client is None:
+                local.client = get_garmin_client(tokens)
+                with lock:
+                    clients.append(local.client)
+        return local.client
+
+    def run(conn: connection, start: date, end: date) -> Dict:
+        return sync_garmin_range(
+            conn, worker_client(), start, end, checkpoint=garmin_shard_cursor((start, end))
+        )
+
+    def cleanup() -> None:
+        for client in clients:
+            save_garmin_tokens(client)
+
+    return run, cleanup
+
+
+def _toggl_runner(concurrency: int) -> Tuple[Optional[ShardRunner], Callable[[], None]]:
+    """Shard runner sharing one session, so all shards share its rate limit."""
+    from scripts.toggl_integration import backfill_toggl, create_toggl_session
+
+    if not config.TOGGL_API_KEY:
+        logger.error("TOGGL_API_KEY not set")
+        return None, lambda: None
+    session = create_toggl_session(config.TOGGL_API_KEY, pool_size=max(10, concurrency))
+
+    def run(conn: connection, start: date, end: date) -> Dict:
+        # One window per shard: a failed window then fails the whole shard
+        counts = backfill_toggl(
+            conn, start, end, window_days=(end - start).days, workers=1, session=session
+        )
+        if counts is None:
+            raise RuntimeError("Toggl fetch or store failed")
+        return counts
+
+    return run, session.close
+
+
+def _habits_runner() -> Tuple[Optional[ShardRunner], Callable[[], None]]:
+    from scripts.habit_fetcher import backfill_habit_analysis
+
+    def run(conn: Optional[connection], start: date, end: date) -> Dict:
+        return {"days": backfill_habit_analysis(start, end)}
+
+    return run, lambda: None
+
+
+def run_backfill(
+    start_date: date,
+    end_date: Optional[date] = None,
+    sources: Sequence[str] = BACKFILL_SOURCES,
+    workers: int = config.BACKFILL_WORKERS,
+    shard_days: int = config.BACKFILL_SHARD_DAYS,
+    limits: Optional[Dict[str, int]] = None,
+    restart: bool = False
+) -> Dict[str, Dict[str, int]]:
+    """
+    Backfill [start_date, end_date) (default: through today) for `sources`.
+
+    Args:
+        workers: Shards running at once across all sources (at most the DB
+                 pool size, as each shard holds a connection).
+        shard_days: Days per Garmin/habits shard; Toggl shards are also
+                    capped at TOGGL_WINDOW_DAYS.
+        limits: Per-source concurrency caps (default SOURCE_LIMITS).
+        restart: Forget the range's checkpoints and redo every shard.
+
+    Returns:
+        Per source: 'shards', 'skipped' (already completed), 'completed'
+        and 'failed' counts. Failures are logged; rerun to retry them.
+    """
+    from scripts.database import clear_sync_cursor
+    from scripts.db_pool import db_connection
+
+    end_date = end_date or (datetime.now().date() + timedelta(days=1))
+    limits = dict(SOURCE_LIMITS, **(limits or {}))
+    if workers > config.DB_POOL_MAX_SIZE:
+        logger.warning(f"Using {config.DB_POOL_MAX_SIZE} workers, the DB pool size")
+        workers = config.DB_POOL_MAX_SIZE
+    workers = max(1, workers)
+
+    shard_lengths = {
+        source: min(shard_days, config.TOGGL_WINDOW_DAYS) if source == "toggl" else shard_days
+        for source in sources
+    }
+    summary = {
+        source: {"shards": 0, "skipped": 0, "completed": 0, "failed": 0}
+        for source in sources
+    }
+    queues: Dict[str, Deque[Shard]] = {}
+    with db_connection() as conn:
+        if restart:
+            cleared = clear_checkpoints(conn, sources, start_date, end_date)
+            logger.info(f"Cleared {cleared} backfill checkpoints")
+        for source in sources:
+            shards = plan_shards(start_date, end_date, shard_lengths[source])
+            completed = load_checkpoints(conn, source, start_date, end_date)
+            queue = deque(shard for shard in shards if not _covered(shard, completed))
+            if restart and source == "garmin":
+                for shard in shards:
+                    clear_sync_cursor(conn, garmin_shard_cursor(shard))
+            summary[source]["shards"] = len(shards)
+            summary[source]["skipped"] = len(shards) - len(queue)
+            logger.info(
+                f"Backfill {source}: {len(shards)} shards, "
+                f"{len(shards) - len(queue)} already completed"
+            )
+            if queue:
+                queues[source] = queue
+
+    factories = {
+        "garmin": _garmin_runner,
+        "toggl": lambda: _toggl_runner(limits["toggl"]),
+        "habits": _habits_runner,
+    }
+    runners: Dict[str, ShardRunner] = {}
+    cleanups = []
+    for source in list(queues):
+        runner, cleanup = factories[source]()
+        cleanups.append(cleanup)
+        if runner is None:
+            logger.error(f"Backfill {source}: client unavailable, skipping its shards")
+            summary[source]["failed"] = len(queues.pop(source))
+            continue
+        runners[source] = runner
+
+    # Pool threads have no stage of their own; report into the caller's
+    stage_name = metrics.current_stage()
+
+    def run_shard(source: str, shard: Shard) -> bool:
+        with metrics.attach(stage_name), metrics.stage(source):
+            try:
+                if source in POSTGREST_SOURCES:
+                    result = runners[source](None, shard[0], shard[1])
+                    with db_connection() as conn:
+                        record_checkpoint(conn, source, shard, result)
+                else:
+                    with db_connection() as conn:
+                        result = runners[source](conn, shard[0], shard[1])
+                        record_checkpoint(conn, source, shard, result)
+            except Exception as e:
+                logger.error(f"Backfill {source} shard {shard[0]} - {shard[1]} failed: {str(e)}")
+                return False
+        logger.info(f"Backfill {source} shard {shard[0]} - {shard[1]} done: {result}")
+        return True
+
+    running: Dict[Future, Tuple[str, Shard]] = {}
+    active = dict.fromkeys(queues, 0)
+    try:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="backfill") as pool:
+            while running or any(queues.values()):
+                # Round-robin so one long source doesn't hold every worker
+                submitted = True
+                while submitted and len(running) < workers:
+                    submitted = False
+                    for source, queue in queues.items():
+                        if queue and active[source] < max(1, limits.get(source, 1)) \
+                                and len(running) < workers:
+                            shard = queue.popleft()
+                            running[pool.submit(run_shard, source, shard)] = (source, shard)
+                            active[source] += 1
+                            submitted = True
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    source, shard = running.pop(future)
+                    active[source] -= 1
+                    summary[source]["completed" if future.result() else "failed"] += 1
+    finally:
+        for cleanup in cleanups:
+            cleanup()
+
+    for source, counts in summary.items():
+        logger.info(
+            f"Backfill {source}: {counts['completed']} completed, "
+            f"{counts['skipped']} skipped, {counts['failed']} failed "
+            f"of {counts['shards']} shards"
+        )
+    return summary
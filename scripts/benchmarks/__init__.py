@@ -0,0 +1,7 @@
+# scripts/benchmarks/__init__.py
+"""
+Ingestion benchmarks: synthetic data generators, fake API clients, a SQLite
+stand-in for Postgres and a runner that writes machine-readable results.
+
+Run with:  python -m scripts.benchmarks --scale 1000 10000 --output bench.json
+"""
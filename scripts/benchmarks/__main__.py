@@ -0,0 +1,371 @@
+# scripts/benchmarks/__main__.py
+"""
+Run the ingestion benchmarks and write the results as JSON.
+
+    python -m scripts.benchmarks --scale 1000 10000 100000 --output bench.json
+    python -m scripts.benchmarks --only format_for_frontend analyze_habits
+    python -m scripts.benchmarks --baseline previous.json --threshold 0.25
+
+Every benchmark is run --repeat times on freshly prepared data; preparation
+(data generation, seeding the database) is not timed. With --baseline the
+run exits non-zero when a benchmark's median time regressed by more than
+--threshold relative to the baseline file.
+"""
+
+import argparse
+import json
+import logging
+import platform
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Tuple
+
+from scripts.benchmarks import generators
+from scripts.benchmarks.fakes import FakeGarmin, FakeSupabase, FakeTogglSession
+from scripts.benchmarks.localdb import open_database
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SCALES = (1_000, 10_000)
+
+# prepare(rows, dsn) -> (run, cleanup); run() returns counters to report
+Benchmark = Callable[[int, Optional[str]], Tuple[Callable[[], Dict], Callable[[], None]]]
+
+
+@lru_cache(maxsize=None)
+def _activities(rows: int) -> List[Dict]:
+    return generators.garmin_activities(rows)
+
+
+@lru_cache(maxsize=None)
+def _toggl_entries(rows: int) -> List[Dict]:
+    return generators.toggl_entries(rows)
+
+
+@lru_cache(maxsize=None)
+def _toggl_api_entries(rows: int) -> List[Dict]:
+    return generators.toggl_api_entries(rows)
+
+
+@lru_cache(maxsize=None)
+def _habit_rows(rows: int) -> List[Dict]:
+    return generators.habit_rows(rows)
+
+
+@lru_cache(maxsize=None)
+def _workout_rows(rows: int) -> List[Dict]:
+    return generators.workout_rows(rows)
+
+
+def _round_trips(conn) -> Optional[int]:
+    return getattr(conn, "round_trips", None)
+
+
+def bench_store_workout_data(rows: int, dsn: Optional[str]):
+    """One upsert per activity, as the original daily fetch did."""
+    from scripts.database import store_workout_data
+
+    conn, backend, cleanup = open_database(dsn)
+    activities = _activities(rows)
+
+    def run() -> Dict:
+        for activity in activities:
+            store_workout_data(conn, activity)
+        return {"backend": backend, "db_round_trips": _round_trips(conn)}
+
+    return run, cleanup
+
+
+def bench_store_workout_batch(rows: int, dsn: Optional[str]):
+    """Multi-row upserts via store_workout_batch."""
+    from scripts.database import store_workout_batch
+
+    conn, backend, cleanup = open_database(dsn)
+    activities = _activities(rows)
+
+    def run() -> Dict:
+        result = store_workout_batch(conn, activities)
+        return {
+            "backend": backend,
+            "db_round_trips": _round_trips(conn),
+            "stored": result["stored"],
+            "rejected": len(result["rejected"]),
+        }
+
+    return run, cleanup
+
+
+def bench_garmin_dedup(rows: int, dsn: Optional[str]):
+    """
+    The daily fetch's dedup step: page through a fake Garmin client and drop
+    already-stored activities. Half of the activities are pre-stored.
+    """
+    from scripts.database import store_workout_batch
+    from scripts.fetcher import filter_new_activities, iter_garmin_activity_pages
+
+    conn, backend, cleanup = open_database(dsn)
+    activities = _activities(rows)
+    store_workout_batch(conn, activities[::2])
+    client = FakeGarmin(activities)
+    start = datetime.strptime(activities[0]["startTimeLocal"][:10], "%Y-%m-%d").date()
+    end = datetime.strptime(
+        activities[-1]["startTimeLocal"][:10], "%Y-%m-%d"
+    ).date() + timedelta(days=1)
+    if hasattr(conn, "round_trips"):
+        conn.round_trips = 0
+
+    def run() -> Dict:
+        new = 0
+        for window_start, window_end, page in iter_garmin_activity_pages(client, start, end):
+            new += len(filter_new_activities(conn, page, window_start, window_end))
+        return {
+            "backend": backend,
+            "api_calls": client.calls,
+            "db_round_trips": _round_trips(conn),
+            "new_activities": new,
+        }
+
+    return run, cleanup
+
+
+def bench_store_toggl_entries(rows: int, dsn: Optional[str]):
+    """First load of Toggl entries into an empty table."""
+    from scripts.toggl_integration import store_toggl_entries
+
+    conn, backend, cleanup = open_database(dsn)
+    entries = _toggl_entries(rows)
+
+    def run() -> Dict:
+        counts = store_toggl_entries(conn, entries, generators.PROJECTS)
+        return dict(counts, backend=backend, db_round_trips=_round_trips(conn))
+
+    return run, cleanup
+
+
+def bench_store_toggl_entries_unchanged(rows: int, dsn: Optional[str]):
+    """Re-storing entries that are already present and unchanged."""
+    from scripts.toggl_integration import store_toggl_entries
+
+    conn, backend, cleanup = open_database(dsn)
+    entries = _toggl_entries(rows)
+    store_toggl_entries(conn, entries, generators.PROJECTS)
+    if hasattr(conn, "round_trips"):
+        conn.round_trips = 0
+
+    def run() -> Dict:
+        counts = store_toggl_entries(conn, entries, generators.PROJECTS)
+        return dict(counts, backend=backend, db_round_trips=_round_trips(conn))
+
+    return run, cleanup
+
+
+def bench_fetch_toggl_entries(rows: int, dsn: Optional[str]):
+    """Parsing a Toggl time-entries response from a fake session."""
+    from scripts.toggl_integration import fetch_toggl_entries
+
+    session = FakeTogglSession(_toggl_api_entries(rows))
+
+    def run() -> Dict:
+        entries = fetch_toggl_entries(session, since_days=7)
+        return {"api_calls": session.calls, "entries": len(entries or [])}
+
+    return run, lambda: None
+
+
+def bench_fetch_habits(rows: int, dsn: Optional[str]):
+    """Paging habit rows out of a fake Supabase client."""
+    from scripts import habit_fetcher
+
+    habit_rows = _habit_rows(rows)
+    client = FakeSupabase(habit_rows)
+    previous = habit_fetcher._client
+    habit_fetcher._client = client
+
+    def run() -> Dict:
+        start = datetime.strptime(habit_rows[0]["habit_date"], "%Y-%m-%d").date()
+        fetched = habit_fetcher.fetch_habits(start)
+        return {"api_calls": client.calls, "fetched": len(fetched)}
+
+    def cleanup() -> None:
+        habit_fetcher._client = previous
+
+    return run, cleanup
+
+
+def bench_analyze_habits(rows: int, dsn: Optional[str]):
+    from scripts.habit_fetcher import analyze_habits
+
+    habit_rows = _habit_rows(rows)
+
+    def run() -> Dict:
+        return analyze_habits(habit_rows)
+
+    return run, lambda: None
+
+
+def bench_format_for_frontend(rows: int, dsn: Optional[str]):
+    from scripts.database_utils import format_for_frontend
+
+    workout_rows = _workout_rows(rows)
+
+    def run() -> Dict:
+        return {"formatted": len(format_for_frontend(workout_rows))}
+
+    return run, lambda: None
+
+
+def bench_encode_snapshot(rows: int, dsn: Optional[str]):
+    from scripts.serializer import dumps
+
+    workout_rows = _workout_rows(rows)
+
+    def run() -> Dict:
+        return {
+            "bytes": len(dumps(workout_rows, sort_keys=True)),
+            "columnar_bytes": len(dumps(workout_rows, layout="columns", sort_keys=True)),
+        }
+
+    return run, lambda: None
+
+
+BENCHMARKS: Dict[str, Benchmark] = {
+    "store_workout_data": bench_store_workout_data,
+    "store_workout_batch": bench_store_workout_batch,
+    "garmin_dedup": bench_garmin_dedup,
+    "store_toggl_entries": bench_store_toggl_entries,
+    "store_toggl_entries_unchanged": bench_store_toggl_entries_unchanged,
+    "fetch_toggl_entries": bench_fetch_toggl_entries,
+    "fetch_habits": bench_fetch_habits,
+    "analyze_habits": bench_analyze_habits,
+    "format_for_frontend": bench_format_for_frontend,
+    "encode_snapshot": bench_encode_snapshot,
+}
+
+
+def run_benchmark(
+    name: str,
+    rows: int,
+    repeat: int,
+    dsn: Optional[str]
+) -> Dict:
+    """Run one benchmark `repeat` times and summarise the timings."""
+    result = {"benchmark": name, "rows": rows, "repeat": repeat}
+    timings = []
+    counters: Dict = {}
+    try:
+        for _ in range(repeat):
+            run, cleanup = BENCHMARKS[name](rows, dsn)
+            try:
+                started = time.perf_counter()
+                counters = run()
+                timings.append(time.perf_counter() - started)
+            finally:
+                cleanup()
+    except NotImplementedError as e:
+        result.update(status="skipped", detail=str(e))
+        return result
+    except Exception as e:
+        logger.exception(f"Benchmark {name} ({rows} rows) failed")
+        result.update(status="error", detail=repr(e))
+        return result
+
+    median = statistics.median(timings)
+    result.update(
+        status="ok",
+        seconds={
+            "min": round(min(timings), 6),
+            "median": round(median, 6),
+            "max": round(max(timings), 6),
+        },
+        rows_per_second=round(rows / median, 1) if median else None,
+        us_per_row=round(median / rows * 1e6, 3) if rows else None,
+        counters=counters,
+    )
+    return result
+
+
+def compare_to_baseline(results: List[Dict], baseline: Dict, threshold: float) -> List[str]:
+    """Describe every benchmark whose median slowed by more than `threshold`."""
+    previous = {
+        (item["benchmark"], item["rows"]): item["seconds"]["median"]
+        for item in baseline.get("results", [])
+        if item.get("status") == "ok"
+    }
+    regressions = []
+    for item in results:
+        before = previous.get((item["benchmark"], item["rows"]))
+        if item.get("status") != "ok" or not before:
+            continue
+        change = item["seconds"]["median"] / before - 1
+        if change > threshold:
+            regressions.append(
+                f"{item['benchmark']} ({item['rows']} rows): "
+                f"{before:.4f}s -> {item['seconds']['median']:.4f}s (+{change:.0%})"
+            )
+    return regressions
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m scripts.benchmarks")
+    parser.add_argument("--scale", type=int, nargs="+", default=list(DEFAULT_SCALES),
+                        help="Row counts to generate (e.g. 1000 100000 1000000)")
+    parser.add_argument("--only", nargs="+", choices=sorted(BENCHMARKS),
+                        help="Run only these benchmarks")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--dsn", help="Postgres DSN (default: BENCH_DATABASE_URL, else SQLite)")
+    parser.add_argument("--output", help="Write JSON results here (default: stdout)")
+    parser.add_argument("--baseline", help="Previous results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="Allowed median slowdown vs. baseline (0.2 = 20%%)")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    # The store functions log every row at INFO/DEBUG; keep that out of timings
+    logging.basicConfig(level=logging.WARNING)
+    logging.getLogger().setLevel(logging.WARNING)
+
+    names = args.only or list(BENCHMARKS)
+    results = []
+    for rows in args.scale:
+        for name in names:
+            result = run_benchmark(name, rows, args.repeat, args.dsn)
+            results.append(result)
+            print(
+                f"{name:<30} {rows:>9} rows  {result['status']:<7} "
+                + (f"{result['seconds']['median']:.4f}s" if result["status"] == "ok"
+                   else result.get("detail", "")),
+                file=sys.stderr
+            )
+
+    report = {
+        "generated_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": args.repeat,
+        "results": results,
+    }
+    payload = json.dumps(report, indent=2, default=str)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(payload + "\n")
+    else:
+        print(payload)
+
+    exit_code = 0 if all(item["status"] != "error" for item in results) else 1
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare_to_baseline(results, json.load(f), args.threshold)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        if regressions:
+            exit_code = 1
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
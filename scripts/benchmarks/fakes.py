@@ -0,0 +1,112 @@
+# scripts/benchmarks/fakes.py
+"""
+In-memory stand-ins for the Garmin, Toggl and Supabase clients.
+
+Each fake serves pre-generated data through the same call shape the
+production code uses and counts the calls it receives, so benchmarks can
+exercise paging and parsing without touching the network.
+"""
+
+import copy
+from typing import Dict, List, Optional
+
+
+class FakeGarmin:
+    """Serves activities from get_activities_by_date like garminconnect.Garmin."""
+
+    def __init__(self, activities: List[Dict]):
+        self.calls = 0
+        self._by_day: Dict[str, List[Dict]] = {}
+        for activity in activities:
+            self._by_day.setdefault(activity["startTimeLocal"][:10], []).append(activity)
+        self._days = sorted(self._by_day)
+
+    def get_activities_by_date(self, startdate: str, enddate: str) -> List[Dict]:
+        self.calls += 1
+        return [
+            activity
+            for day in self._days if startdate <= day <= enddate
+            for activity in self._by_day[day]
+        ]
+
+
+class FakeResponse:
+    """Minimal requests.Response replacement."""
+
+    def __init__(self, payload, status_code: int = 200):
+        self._payload = payload
+        self.status_code = status_code
+        self.text = ""
+
+    def json(self):
+        # Callers may mutate the parsed payload, as they can with a real response
+        return copy.deepcopy(self._payload)
+
+
+class FakeTogglSession:
+    """Answers every GET with the same list of raw Toggl time entries."""
+
+    def __init__(self, api_entries: List[Dict]):
+        self.calls = 0
+        self._entries = api_entries
+
+    def get(self, url: str, **kwargs) -> FakeResponse:
+        self.calls += 1
+        return FakeResponse(self._entries)
+
+
+class _FakeResult:
+    def __init__(self, data: List[Dict], count: Optional[int]):
+        self.data = data
+        self.count = count
+
+
+class _FakeQuery:
+    """Supports the select/gte/lte/order/range/execute chain used for habits."""
+
+    def __init__(self, client: "FakeSupabase", rows: List[Dict]):
+        self._client = client
+        self._rows = rows
+        self._count = None
+        self._range = None
+
+    def select(self, columns: str, count: Optional[str] = None) -> "_FakeQuery":
+        self._columns = columns.split(",")
+        self._count = count
+        return self
+
+    def gte(self, column: str, value) -> "_FakeQuery":
+        self._rows = [row for row in self._rows if str(row[column]) >= value]
+        return self
+
+    def lte(self, column: str, value) -> "_FakeQuery":
+        self._rows = [row for row in self._rows if str(row[column]) <= value]
+        return self
+
+    def order(self, column: str) -> "_FakeQuery":
+        # Rows are generated in (habit_date, habit_name) order already
+        return self
+
+    def range(self, start: int, end: int) -> "_FakeQuery":
+        self._range = (start, end)
+        return self
+
+    def execute(self) -> _FakeResult:
+        self._client.calls += 1
+        rows = self._rows
+        if self._range is not None:
+            rows = rows[self._range[0]:self._range[1] + 1]
+        data = [{column: row[column] for column in self._columns} for row in rows]
+        return _FakeResult(data, len(self._rows) if self._count else None)
+
+
+class FakeSupabase:
+    """Serves habit_tracking rows like a supabase.Client."""
+
+    def __init__(self, habit_rows: List[Dict]):
+        self.calls = 0
+        self._rows = habit_rows
+
+    def table(self, name: str) -> _FakeQuery:
+        return _FakeQuery(self, self._rows if name == "habit_tracking" else [])
+
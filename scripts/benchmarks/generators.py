@@ -0,0 +1,113 @@
+# scripts/benchmarks/generators.py
+"""
+Deterministic synthetic data shaped like the real API payloads and tables.
+Every generator takes a row count and a seed, so runs are comparable.
+"""
+
+import random
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+ACTIVITY_TYPES = ("running", "cycling", "indoor_cycling", "strength_training", "walking")
+PROJECTS = {1: "Deep Work", 2: "Learning", 3: "Admin", 4: "Exercise", 5: "Reading"}
+TAGS = ("focus", "meeting", "coding", "writing", "review")
+HABITS = ("Morning Meditation", "Read 30 Minutes", "Drink Water", "Workout", "No Sugar")
+
+BASE_TIME = datetime(2015, 1, 1, 6, 0, 0)
+
+
+def garmin_activities(count: int, seed: int = 0) -> List[Dict]:
+    """Garmin activity dicts as returned by get_activities_by_date."""
+    rng = random.Random(seed)
+    activities = []
+    for i in range(count):
+        activity_type = ACTIVITY_TYPES[i % len(ACTIVITY_TYPES)]
+        # Ten minutes apart keeps (date, activity_type) unique at any scale
+        start = BASE_TIME + timedelta(minutes=10 * i)
+        activity = {
+            "activityId": 10_000_000_000 + i,
+            "activityName": f"{activity_type.title()} #{i}",
+            "activityType": {"typeKey": activity_type},
+            "startTimeLocal": start.strftime("%Y-%m-%d %H:%M:%S"),
+            "favorite": rng.random() < 0.1,
+            "distance": round(rng.uniform(0, 40_000), 1),
+            "calories": rng.randint(50, 1200),
+            "duration": round(rng.uniform(600, 7200), 1),
+            "averageHR": rng.randint(100, 170),
+            "maxHR": rng.randint(150, 195),
+        }
+        if activity_type == "running":
+            activity["averageRunningCadenceInStepsPerMinute"] = rng.randint(150, 185)
+        elif activity_type in ("cycling", "indoor_cycling"):
+            activity["averageCadence"] = rng.randint(70, 100)
+        activities.append(activity)
+    return activities
+
+
+def toggl_api_entries(count: int, seed: int = 0) -> List[Dict]:
+    """Raw Toggl v9 /me/time_entries items."""
+    rng = random.Random(seed)
+    entries = []
+    for i in range(count):
+        start = BASE_TIME + timedelta(minutes=30 * i)
+        entries.append({
+            "id": 3_000_000_000 + i,
+            "start": start.strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "duration": rng.randint(60, 4 * 3600),
+            "project_id": rng.choice(list(PROJECTS)),
+            "tags": rng.sample(TAGS, rng.randint(0, 2)),
+            "description": f"Entry {i}",
+            "at": start.strftime("%Y-%m-%dT%H:%M:%SZ"),
+        })
+    return entries
+
+
+def toggl_entries(count: int, seed: int = 0) -> List[Dict]:
+    """Parsed entries as produced by fetch_toggl_entries."""
+    return [
+        {
+            "id": entry["id"],
+            "date": datetime.strptime(entry["start"], "%Y-%m-%dT%H:%M:%SZ").date(),
+            "duration_seconds": entry["duration"],
+            "project_id": entry["project_id"],
+            "tags": entry["tags"],
+            "description": entry["description"],
+            "deleted": False,
+        }
+        for entry in toggl_api_entries(count, seed)
+    ]
+
+
+def habit_rows(count: int, seed: int = 0) -> List[Dict]:
+    """habit_tracking rows: one row per habit per day."""
+    rng = random.Random(seed)
+    rows = []
+    for i in range(count):
+        day = BASE_TIME.date() + timedelta(days=i // len(HABITS))
+        rows.append({
+            "habit_date": day.isoformat(),
+            "habit_name": HABITS[i % len(HABITS)],
+            "completed": rng.random() < 0.75,
+        })
+    return rows
+
+
+def workout_rows(count: int, seed: int = 0) -> List[Dict]:
+    """workout_stats rows as read back through database_utils."""
+    from decimal import Decimal
+
+    rows = []
+    for activity in garmin_activities(count, seed):
+        rows.append({
+            "activity_type": activity["activityType"]["typeKey"],
+            "date": datetime.strptime(activity["startTimeLocal"], "%Y-%m-%d %H:%M:%S"),
+            "favorite": activity["favorite"],
+            "title": activity["activityName"],
+            "distance": Decimal(str(activity["distance"])),
+            "calories": activity["calories"],
+            "time": Decimal(str(activity["duration"])),
+            "avg_hr": activity["averageHR"],
+            "max_hr": activity["maxHR"],
+            "avg_bike_cadence": None,
+        })
+    return rows
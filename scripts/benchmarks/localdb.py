@@ -0,0 +1,213 @@
+# scripts/benchmarks/localdb.py
+"""
+Database stand-ins for the benchmarks.
+
+By default a SQLite database is wrapped in a psycopg2-like connection that
+rewrites the Postgres-specific bits the store functions use (%s placeholders,
+= ANY(array), casts, xmax). It is good for relative numbers and catching
+regressions in the Python side of a store; absolute timings need a real
+Postgres, used when BENCH_DATABASE_URL (or --dsn) is set. There the tables
+are created in a throwaway schema that is dropped afterwards.
+"""
+
+import json
+import os
+import re
+import sqlite3
+import uuid
+from datetime import date, datetime
+from typing import Optional, Sequence
+
+# Postgres casts like ::date or ::bigint[] that SQLite doesn't understand
+_CAST_RE = re.compile(r"::\w+(\[\])?")
+
+BENCH_TABLES = """
+CREATE TABLE workout_stats (
+    id BIGSERIAL PRIMARY KEY,
+    activity_type TEXT NOT NULL,
+    date TIMESTAMP NOT NULL,
+    favorite BOOLEAN,
+    title TEXT,
+    distance FLOAT,
+    calories INTEGER,
+    time FLOAT,
+    avg_hr INTEGER,
+    max_hr INTEGER,
+    avg_bike_cadence INTEGER,
+    garmin_activity_id BIGINT,
+    strava_activity_id BIGINT,
+    content_hash TEXT,
+    UNIQUE (date, activity_type)
+);
+CREATE UNIQUE INDEX workout_stats_garmin_activity_id_idx
+    ON workout_stats (garmin_activity_id);
+CREATE UNIQUE INDEX workout_stats_strava_activity_id_idx
+    ON workout_stats (strava_activity_id);
+CREATE INDEX workout_stats_date_idx ON workout_stats (date);
+CREATE TABLE toggl_entries (
+    id BIGINT PRIMARY KEY,
+    date DATE NOT NULL,
+    duration_seconds INTEGER NOT NULL,
+    project_id BIGINT,
+    project_name TEXT,
+    tags TEXT[],
+    description TEXT,
+    updated_at TIMESTAMPTZ
+);
+CREATE TABLE toggl_deleted_entries (
+    id BIGINT PRIMARY KEY,
+    deleted_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+CREATE TABLE toggl_rejected_entries (
+    id BIGINT PRIMARY KEY,
+    entry JSONB NOT NULL,
+    reason TEXT NOT NULL,
+    rejected_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+"""
+
+
+def _adapt(value):
+    """Convert a psycopg2 parameter into something sqlite3 can bind."""
+    if isinstance(value, datetime):
+        return value.isoformat(sep=" ")
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, (list, tuple)):
+        return json.dumps(value)
+    return value
+
+
+def translate(sql: str, params: Optional[Sequence]) -> tuple:
+    """
+    Rewrite a psycopg2 statement and its positional parameters for SQLite.
+    `col = ANY(%s)` with a list parameter becomes `col IN (?, ?, ...)`.
+    """
+    sql = _CAST_RE.sub("", sql)
+    sql = sql.replace("(xmax = 0)", "1").replace("now()", "CURRENT_TIMESTAMP")
+    if not params:
+        return sql, ()
+
+    pieces = sql.split("%s")
+    if len(pieces) - 1 != len(params):
+        raise ValueError("Parameter count does not match placeholders")
+    out = [pieces[0]]
+    values = []
+    for value, piece in zip(params, pieces[1:]):
+        if out[-1].rstrip().upper().endswith("ANY(") and isinstance(value, (list, tuple)):
+            head = out[-1].rstrip()
+            out[-1] = re.sub(r"=\s*ANY\($", "IN (", head, flags=re.IGNORECASE)
+            out.append(", ".join("?" * len(value)) if value else "NULL")
+            values.extend(_adapt(v) for v in value)
+        else:
+            out.append("?")
+            values.append(_adapt(value))
+        out.append(piece)
+    return "".join(out), values
+
+
+class SQLiteCursor:
+    """psycopg2-cursor-shaped wrapper around a sqlite3 cursor."""
+
+    def __init__(self, conn: "SQLiteConnection"):
+        self._conn = conn
+        self._cursor = conn.raw.cursor()
+
+    def __enter__(self) -> "SQLiteCursor":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def execute(self, sql: str, params: Optional[Sequence] = None) -> None:
+        if isinstance(params, dict):
+            raise NotImplementedError("Named parameters are not supported on SQLite")
+        self._conn.round_trips += 1
+        self._conn.begin_if_needed()
+        statement, values = translate(sql, params)
+        self._cursor.execute(statement, values)
+
+    def fetchall(self) -> list:
+        return self._cursor.fetchall()
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    @property
+    def rowcount(self) -> int:
+        return self._cursor.rowcount
+
+    def close(self) -> None:
+        self._cursor.close()
+
+
+class SQLiteConnection:
+    """psycopg2-connection-shaped wrapper with explicit autocommit handling."""
+
+    def __init__(self, path: str = ":memory:"):
+        self.raw = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self.autocommit = True
+        self.round_trips = 0
+        self.closed = 0
+
+    def begin_if_needed(self) -> None:
+        if not self.autocommit and not self.raw.in_transaction:
+            self.raw.execute("BEGIN")
+
+    def cursor(self, *args, **kwargs) -> SQLiteCursor:
+        return SQLiteCursor(self)
+
+    def commit(self) -> None:
+        if self.raw.in_transaction:
+            self.raw.execute("COMMIT")
+
+    def rollback(self) -> None:
+        if self.raw.in_transaction:
+            self.raw.execute("ROLLBACK")
+
+    def close(self) -> None:
+        self.raw.close()
+        self.closed = 1
+
+
+def _sqlite_ddl() -> str:
+    """BENCH_TABLES adjusted to SQLite types."""
+    return (
+        BENCH_TABLES
+        .replace("BIGSERIAL PRIMARY KEY", "INTEGER PRIMARY KEY AUTOINCREMENT")
+        .replace("TEXT[]", "TEXT")
+        .replace("now()", "CURRENT_TIMESTAMP")
+    )
+
+
+def open_database(dsn: Optional[str] = None):
+    """
+    Return (connection, backend, cleanup) with empty benchmark tables.
+    Uses Postgres when a DSN is given or BENCH_DATABASE_URL is set.
+    """
+    dsn = dsn or os.getenv("BENCH_DATABASE_URL")
+    if not dsn:
+        conn = SQLiteConnection()
+        conn.raw.executescript(_sqlite_ddl())
+        return conn, "sqlite", conn.close
+
+    import psycopg2
+
+    conn = psycopg2.connect(dsn)
+    conn.autocommit = True
+    schema = f"bench_{uuid.uuid4().hex[:8]}"
+    with conn.cursor() as cur:
+        cur.execute(f"CREATE SCHEMA {schema}")
+        cur.execute(f"SET search_path TO {schema}")
+        cur.execute(BENCH_TABLES)
+
+    def cleanup() -> None:
+        with conn.cursor() as cur:
+            cur.execute(f"DROP SCHEMA {schema} CASCADE")
+        conn.close()
+
+    return conn, "postgres", cleanup
@@ -0,0 +1,258 @@
+# scripts/cli.py
+"""
+Command-line entry point for the data scripts.
+
+    python -m scripts.cli run                    # full daily pipeline
+    python -m scripts.cli sync habits            # one or more sources
+    python -m scripts.cli sync garmin toggl
+    python -m scripts.cli analyze                # training load
+    python -m scripts.cli export                 # dashboard snapshots
+    python -m scripts.cli backfill 2020-01-01    # resumable history load
+    python -m scripts.cli post IMAGE "MESSAGE" --twitter
+    python -m scripts.cli schema                 # create missing tables
+
+Each subcommand imports only the client stack it needs: a habit refresh
+never loads garminconnect or psycopg2, and `post` loads nothing but the
+social clients. --profile-imports re-runs the command under
+`python -X importtime` and prints the slowest top-level imports.
+"""
+
+import argparse
+import logging
+import os
+import re
+import subprocess
+import sys
+import time
+from datetime import date
+from typing import Callable, Dict, List, Optional, Tuple
+
+import scripts.config as config
+
+logger = logging.getLogger(__name__)
+
+SYNC_SOURCES = ("garmin", "strava", "toggl", "habits")
+# Mirrors backfill.BACKFILL_SOURCES (not imported, to keep startup cheap)
+BACKFILL_SOURCES = ("garmin", "toggl", "habits")
+
+# "import time:  self [us] | cumulative | imported package"
+_IMPORT_TIME_RE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( +)(\S+)$")
+
+
+def cmd_run(args: argparse.Namespace) -> int:
+    from scripts import main
+
+    results = main.run_pipeline([main.SOURCES, main.ANALYTICS, main.PUBLISH])
+    return 0 if all(result["status"] == "ok" for result in results.values()) else 1
+
+
+def _run_steps(steps: Dict[str, Callable[[], str]], args: argparse.Namespace, name: str) -> int:
+    from scripts import main
+
+    results = main.run_pipeline(
+        [steps], ensure_tables=args.ensure_schema, metrics_name=name
+    )
+    return 0 if all(result["status"] == "ok" for result in results.values()) else 1
+
+
+def cmd_sync(args: argparse.Namespace) -> int:
+    from scripts import main
+
+    sources = list(dict.fromkeys(args.sources))
+    return _run_steps(
+        {source: main.SOURCES[source] for source in sources}, args,
+        "sync_" + "_".join(sources)
+    )
+
+
+def cmd_analyze(args: argparse.Namespace) -> int:
+    from scripts import main
+
+    return _run_steps(main.ANALYTICS, args, "analyze")
+
+
+def cmd_export(args: argparse.Namespace) -> int:
+    from scripts import main
+
+    return _run_steps(main.PUBLISH, args, "export")
+
+
+def cmd_backfill(args: argparse.Namespace) -> int:
+    from scripts import main
+
+    def backfill() -> str:
+        from scripts.backfill import run_backfill
+
+        limits = dict(args.limit or [])
+        summary = run_backfill(
+            args.start_date, args.end_date, list(dict.fromkeys(args.sources)),
+            workers=args.workers, shard_days=args.shard_days, limits=limits,
+            restart=args.restart
+        )
+        detail = ", ".join(
+            f"{source} {counts['completed'] + counts['skipped']}/{counts['shards']}"
+            for source, counts in summary.items()
+        )
+        failed = sum(counts["failed"] for counts in summary.values())
+        if failed:
+            raise RuntimeError(f"{failed} shards failed ({detail} done); rerun to retry")
+        return f"shards done: {detail}"
+
+    results = main.run_pipeline([{"backfill": backfill}], metrics_name="backfill")
+    return 0 if results["backfill"]["status"] == "ok" else 1
+
+
+def _source_limit(value: str) -> Tuple[str, int]:
+    source, _, limit = value.partition("=")
+    if source not in BACKFILL_SOURCES or not limit.isdigit() or int(limit) < 1:
+        raise argparse.ArgumentTypeError(
+            f"expected SOURCE=N with SOURCE in {', '.join(BACKFILL_SOURCES)}"
+        )
+    return source, int(limit)
+
+
+def cmd_post(args: argparse.Namespace) -> int:
+    from scripts.post_to_social import post_instagram, post_twitter
+
+    if not args.twitter and not args.instagram:
+        logger.error("Nothing to do: pass --twitter and/or --instagram")
+        return 2
+    if args.twitter:
+        post_twitter(args.image_path, args.message)
+    if args.instagram:
+        post_instagram(args.image_path, args.message)
+    return 0
+
+
+def cmd_schema(args: argparse.Namespace) -> int:
+    from scripts.db_pool import close_pool, db_connection
+    from scripts.habit_fetcher import dedupe_habit_analytics
+    from scripts.schema import ensure_schema
+
+    try:
+        with db_connection() as conn:
+            # Duplicate dates would keep the unique index from being built
+            deleted = dedupe_habit_analytics(conn)
+            if deleted:
+                logger.info(f"Deleted {deleted} duplicate habit_analytics rows")
+            ensure_schema(conn)
+    finally:
+        close_pool()
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="python -m scripts.cli",
+        description="My Daily Proof data jobs."
+    )
+    parser.add_argument("--log-level", default=None,
+                        help=f"Logging level (default: LOG_LEVEL or {config.LOG_LEVEL})")
+    parser.add_argument("--log-file", default=None, help="Also log to this file")
+    parser.add_argument("--profile-imports", action="store_true",
+                        help="Re-run under -X importtime and report the slowest imports")
+    parser.add_argument("--profile-top", type=int, default=15, metavar="N",
+                        help="Imports to list with --profile-imports (default: 15)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run = subparsers.add_parser("run", help="Full daily pipeline (same as scripts.main)")
+    run.set_defaults(func=cmd_run)
+
+    sync = subparsers.add_parser("sync", help="Sync one or more sources")
+    sync.add_argument("sources", nargs="+", choices=SYNC_SOURCES)
+    sync.set_defaults(func=cmd_sync)
+
+    analyze = subparsers.add_parser("analyze", help="Recompute training load")
+    analyze.set_defaults(func=cmd_analyze)
+
+    export = subparsers.add_parser("export", help="Write dashboard JSON snapshots")
+    export.set_defaults(func=cmd_export)
+
+    for step_parser in (sync, analyze, export):
+        step_parser.add_argument("--ensure-schema", action="store_true",
+                                 help="Create missing tables first (loads every module)")
+
+    backfill = subparsers.add_parser(
+        "backfill", help="Load history in resumable shards (completed shards are skipped)"
+    )
+    backfill.add_argument("start_date", type=date.fromisoformat, metavar="START",
+                          help="First day to load (YYYY-MM-DD)")
+    backfill.add_argument("end_date", type=date.fromisoformat, metavar="END", nargs="?",
+                          help="Day after the last one to load (default: tomorrow)")
+    backfill.add_argument("--sources", nargs="+", choices=BACKFILL_SOURCES,
+                          default=list(BACKFILL_SOURCES))
+    backfill.add_argument("--workers", type=int, default=config.BACKFILL_WORKERS,
+                          help=f"Shards in flight (default: {config.BACKFILL_WORKERS})")
+    backfill.add_argument("--shard-days", type=int, default=config.BACKFILL_SHARD_DAYS,
+                          help=f"Days per shard (default: {config.BACKFILL_SHARD_DAYS})")
+    backfill.add_argument("--limit", type=_source_limit, action="append", metavar="SOURCE=N",
+                          help="Most shards of one source at once (repeatable)")
+    backfill.add_argument("--restart", action="store_true",
+                          help="Forget the range's checkpoints and redo every shard")
+    backfill.set_defaults(func=cmd_backfill)
+
+    post = subparsers.add_parser("post", help="Post a screenshot to social media")
+    post.add_argument("image_path", help="Path to the screenshot image")
+    post.add_argument("message", help="Message to post")
+    post.add_argument("--twitter", action="store_true", help="Post to Twitter")
+    post.add_argument("--instagram", action="store_true", help="Post to Instagram")
+    post.set_defaults(func=cmd_post)
+
+    schema = subparsers.add_parser("schema", help="Create missing tables and columns")
+    schema.set_defaults(func=cmd_schema)
+    return parser
+
+
+def profile_imports(argv: List[str], top: int) -> int:
+    """
+    Run this CLI again with `python -X importtime` and summarise the
+    cumulative import time of each top-level module it loaded.
+    """
+    command = [sys.executable, "-X", "importtime", "-m", "scripts.cli"] + argv
+    started = time.perf_counter()
+    proc = subprocess.run(command, stderr=subprocess.PIPE, text=True, env=os.environ.copy())
+    wall = time.perf_counter() - started
+
+    timings = []
+    for line in proc.stderr.splitlines():
+        match = _IMPORT_TIME_RE.match(line)
+        if match is None:
+            if not line.startswith("import time:"):  # column header
+                sys.stderr.write(line + "\n")
+        elif len(match.group(3)) == 1:  # top-level import, not a nested one
+            timings.append((int(match.group(2)), match.group(4)))
+
+    timings.sort(reverse=True)
+    total_us = sum(cumulative for cumulative, _ in timings)
+    print(f"\nImport profile for: {' '.join(argv)}", file=sys.stderr)
+    print(f"  {'module':<40} {'cumulative':>12}", file=sys.stderr)
+    for cumulative, module in timings[:top]:
+        print(f"  {module:<40} {cumulative / 1000:10.1f}ms", file=sys.stderr)
+    print(
+        f"  {len(timings)} top-level imports, {total_us / 1000:.1f}ms importing, "
+        f"{wall:.2f}s wall",
+        file=sys.stderr
+    )
+    return proc.returncode
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    argv = list(sys.argv[1:] if argv is None else argv)
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    if args.profile_imports:
+        return profile_imports(
+            [arg for arg in argv if arg != "--profile-imports"], args.profile_top
+        )
+
+    log_file = args.log_file
+    if log_file is None and args.command == "run":
+        from scripts.main import LOG_FILE
+        log_file = LOG_FILE
+    config.setup_logging(args.log_level, log_file)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
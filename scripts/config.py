@@ -3,30 +3,62 @@
 Environment and logging configuration.
 Loads environment variables from .env for local usage,
 or from GitHub Actions secrets in CI.
+
+Importing this module only reads settings; entry points call
+setup_logging() themselves.
 """
 
 import os
 import logging
+from typing import Optional
 from dotenv import load_dotenv
 
 # Load .env only when running locally; in production (GitHub Actions, etc.),
 # the environment variables come from secrets configured in the workflow.
 load_dotenv()
 
-# Set up logging (match main.py's DEBUG level for detailed output)
-logging.basicConfig(
-    level=logging.DEBUG,  # Set to DEBUG for detailed output, matching main.py
-    format="%(asctime)s [%(levelname)s] %(name)s - %(message)s"
-)
+LOG_FORMAT = "%(asctime)s [%(levelname)s] %(name)s - %(message)s"
+LOG_LEVEL = os.getenv("LOG_LEVEL", "DEBUG")
+
+# HTTP client internals log whole request/response payloads at DEBUG
+QUIET_LOGGERS = ("urllib3", "requests_oauthlib", "httpx", "httpcore", "hpack", "garth")
+
+
+def setup_logging(level: Optional[str] = None, log_file: Optional[str] = None) -> None:
+    """
+    Configure root logging to the console (and optionally a file).
+    Safe to call more than once; only the first call takes effect.
+    """
+    handlers = [logging.StreamHandler()]
+    if log_file:
+        handlers.append(logging.FileHandler(log_file))
+    logging.basicConfig(
+        level=getattr(logging, (level or LOG_LEVEL).upper(), logging.DEBUG),
+        format=LOG_FORMAT,
+        handlers=handlers
+    )
+    for name in QUIET_LOGGERS:
+        logging.getLogger(name).setLevel(logging.WARNING)
+
 
 # Garmin
 GARMIN_USERNAME = os.getenv("GARMIN_USERNAME")
 GARMIN_PASSWORD = os.getenv("GARMIN_PASSWORD")
+# OAuth token cache reused across runs (cached between Actions runs)
+GARMIN_TOKEN_DIR = os.path.expanduser(os.getenv("GARMIN_TOKEN_DIR", "~/.garminconnect"))
+
+# Heart-rate bounds for training load (TRIMP) calculations
+TRAINING_RESTING_HR = float(os.getenv("TRAINING_RESTING_HR", "60"))
+TRAINING_MAX_HR = float(os.getenv("TRAINING_MAX_HR", "190"))
 
 # Strava
 STRAVA_CLIENT_ID = os.getenv("STRAVA_CLIENT_ID")
 STRAVA_CLIENT_SECRET = os.getenv("STRAVA_CLIENT_SECRET")
 STRAVA_REFRESH_TOKEN = os.getenv("STRAVA_REFRESH_TOKEN")
+# Strava allows 100 reads per 15 minutes; stay just under that
+STRAVA_REQUESTS_PER_SECOND = float(os.getenv("STRAVA_REQUESTS_PER_SECOND", "0.1"))
+# Days fetched on the first sync; later syncs continue from the last one
+STRAVA_LOOKBACK_DAYS = int(os.getenv("STRAVA_LOOKBACK_DAYS", "7"))
 
 # Supabase DB (Session Pooler) credentials
 SUPABASE_DB_HOST = os.getenv("SUPABASE_DB_HOST")
@@ -35,10 +67,30 @@ SUPABASE_DB_USER = os.getenv("SUPABASE_DB_USER")
 SUPABASE_DB_PASSWORD = os.getenv("SUPABASE_DB_PASSWORD")
 SUPABASE_DB_PORT = os.getenv("SUPABASE_DB_PORT", "5432")
 
+# Shared connection pool (see db_pool.py)
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "1"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "5"))
+DB_POOL_CHECKOUT_TIMEOUT = float(os.getenv("DB_POOL_CHECKOUT_TIMEOUT", "30"))
+DB_CONNECT_TIMEOUT = int(os.getenv("DB_CONNECT_TIMEOUT", "10"))
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "60000"))
+
 # Supabase REST API credentials (for client library and REST API calls, e.g., habit_fetcher.py)
 SUPABASE_URL = os.getenv("SUPABASE_URL")  # Remove default value to force environment variable usage
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")  # Remove default value to force environment variable usage
 
+# Static dashboard snapshots (see snapshot_export.py)
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SNAPSHOT_DIR = os.getenv(
+    "SNAPSHOT_DIR", os.path.join(REPO_ROOT, "web", "public", "data")
+)
+# "rows" (array of objects) or "columns" (one array per field, smaller)
+SNAPSHOT_LAYOUT = os.getenv("SNAPSHOT_LAYOUT", "rows")
+
+# Per-stage run metrics (see metrics.py): JSON + Prometheus textfile
+METRICS_DIR = os.getenv("METRICS_DIR", os.path.join(REPO_ROOT, "metrics"))
+# Local spool for fetched records not yet written to the database (outbox.py)
+OUTBOX_PATH = os.getenv("OUTBOX_PATH", os.path.join(REPO_ROOT, "outbox.sqlite3"))
+
 # Twitter
 TWITTER_API_KEY = os.getenv("TWITTER_API_KEY")
 TWITTER_API_SECRET = os.getenv("TWITTER_API_SECRET")
@@ -51,3 +103,19 @@ INSTAGRAM_PAGE_ACCESS_TOKEN = os.getenv("INSTAGRAM_PAGE_ACCESS_TOKEN")
 
 # Toggl
 TOGGL_API_KEY = os.getenv("TOGGL_API_KEY")
+# Optional; defaults to the account's default workspace
+TOGGL_WORKSPACE_ID = os.getenv("TOGGL_WORKSPACE_ID")
+TOGGL_PROJECT_CACHE_TTL_HOURS = float(os.getenv("TOGGL_PROJECT_CACHE_TTL_HOURS", "24"))
+# Toggl allows about one request per second per token (see http_client.py)
+TOGGL_REQUESTS_PER_SECOND = float(os.getenv("TOGGL_REQUESTS_PER_SECOND", "1"))
+TOGGL_MAX_RETRIES = int(os.getenv("TOGGL_MAX_RETRIES", "5"))
+# Longest Retry-After / quota reset we wait out before giving up
+TOGGL_MAX_RETRY_AFTER = float(os.getenv("TOGGL_MAX_RETRY_AFTER", "300"))
+# Long ranges are fetched in windows of this many days, several at a time
+TOGGL_WINDOW_DAYS = int(os.getenv("TOGGL_WINDOW_DAYS", "30"))
+TOGGL_BACKFILL_WORKERS = int(os.getenv("TOGGL_BACKFILL_WORKERS", "4"))
+
+# Historical backfill job (backfill.py): shards in flight across all
+# sources, and days per Garmin/habits shard (Toggl shards are one window)
+BACKFILL_WORKERS = int(os.getenv("BACKFILL_WORKERS", "4"))
+BACKFILL_SHARD_DAYS = int(os.getenv("BACKFILL_SHARD_DAYS", "90"))
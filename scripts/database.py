@@ -6,10 +6,11 @@ Uses psycopg2 for direct Postgres (Supabase) access.
 
 import logging
 import datetime
-from typing import Optional
-import psycopg2
+import hashlib
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 from psycopg2.extensions import connection
-import scripts.config as config
+from scripts import db_pool
 
 logger = logging.getLogger(__name__)
 
@@ -28,16 +29,16 @@ API_KEY_MAPPING = {
 }
 
 def get_db_connection() -> connection:
-    """Create a new database connection using config credentials."""
-    conn = psycopg2.connect(
-        host=config.SUPABASE_DB_HOST,
-        port=config.SUPABASE_DB_PORT,
-        database=config.SUPABASE_DB_NAME,
-        user=config.SUPABASE_DB_USER,
-        password=config.SUPABASE_DB_PASSWORD,
-    )
-    conn.autocommit = True
-    return conn
+    """
+    Check out an autocommit connection from the shared pool.
+    Return it with release_db_connection(), or prefer db_pool.db_connection().
+    """
+    return db_pool.acquire(autocommit=True)
+
+
+def release_db_connection(conn: connection) -> None:
+    """Return a connection obtained from get_db_connection() to the pool."""
+    db_pool.release(conn)
 
 def get_last_successful_fetch_date(
     conn: connection
@@ -68,63 +69,413 @@ def update_last_successful_fetch_date(
     conn.commit()
     logger.info("Updated last_fetch_date to %s", date_val)
 
-def store_workout_data(conn, activity):
-    """Upsert activity data from Garmin API into workout_stats."""
-    try:
-        # Extract and transform the necessary data
-        activity_type = activity['activityType']['typeKey']  # e.g., 'running'
-        date_str = activity['startTimeLocal']  # e.g., '2025-02-22 10:10:39'
-        date = datetime.datetime.strptime(date_str, '%Y-%m-%d %H:%M:%S')
-        favorite = activity['favorite']  # Correct key is 'favorite', not 'isFavorite'
-        title = activity['activityName']
-        distance = activity['distance']  # in meters, consider converting to km if needed
-        calories = activity['calories']
-        time = activity['duration']  # in seconds, consider converting to minutes if needed
-        avg_hr = activity.get('averageHR', 0)  # Use 0 or None if missing
-        max_hr = activity.get('maxHR', 0)
-        
-        # Handle cadence based on activity type
-        if activity_type == 'running':
-            avg_bike_cadence = activity.get('averageRunningCadenceInStepsPerMinute', 0)
-        elif activity_type == 'cycling' or activity_type == 'indoor_cycling':
-            avg_bike_cadence = activity.get('averageCadence', 0)  # Adjust based on actual key
-        else:
-            avg_bike_cadence = 0
+def create_sync_state_table_query() -> str:
+    """
+    Returns the SQL creating sync_state, which holds one resumable cursor
+    (JSON text) per sync source, e.g. a backfill checkpoint.
+    """
+    return """
+    CREATE TABLE IF NOT EXISTS sync_state (
+        source TEXT PRIMARY KEY,
+        cursor TEXT NOT NULL,
+        updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+    );
+    """
 
-        with conn.cursor() as cur:
+
+def get_sync_cursor(conn: connection, source: str) -> Optional[str]:
+    """Get the stored cursor for a sync source, or None if never synced."""
+    with conn.cursor() as cur:
+        cur.execute("SELECT cursor FROM sync_state WHERE source = %s", (source,))
+        row = cur.fetchone()
+    return row[0] if row else None
+
+
+def set_sync_cursor(conn: connection, source: str, cursor_value: str) -> None:
+    """Insert or replace the cursor for a sync source."""
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            INSERT INTO sync_state (source, cursor, updated_at)
+            VALUES (%s, %s, now())
+            ON CONFLICT (source) DO UPDATE SET
+                cursor = EXCLUDED.cursor,
+                updated_at = EXCLUDED.updated_at
+            """,
+            (source, cursor_value)
+        )
+    if not conn.autocommit:
+        conn.commit()
+
+
+def clear_sync_cursor(conn: connection, source: str) -> None:
+    """Forget the cursor for a sync source."""
+    with conn.cursor() as cur:
+        cur.execute("DELETE FROM sync_state WHERE source = %s", (source,))
+    if not conn.autocommit:
+        conn.commit()
+
+
+def create_workout_dedup_query() -> str:
+    """
+    Returns the SQL adding the Garmin/Strava activity id and content hash
+    columns used for incremental dedup, plus the indexes that keep the
+    lookup windowed.
+    """
+    return """
+    ALTER TABLE workout_stats ADD COLUMN IF NOT EXISTS garmin_activity_id BIGINT;
+    ALTER TABLE workout_stats ADD COLUMN IF NOT EXISTS strava_activity_id BIGINT;
+    ALTER TABLE workout_stats ADD COLUMN IF NOT EXISTS content_hash TEXT;
+    CREATE UNIQUE INDEX IF NOT EXISTS workout_stats_garmin_activity_id_idx
+        ON workout_stats (garmin_activity_id);
+    CREATE UNIQUE INDEX IF NOT EXISTS workout_stats_strava_activity_id_idx
+        ON workout_stats (strava_activity_id);
+    CREATE INDEX IF NOT EXISTS workout_stats_date_idx
+        ON workout_stats (date);
+    """
+
+
+WORKOUT_COLUMNS = (
+    'activity_type', 'date', 'favorite', 'title', 'distance',
+    'calories', 'time', 'avg_hr', 'max_hr', 'avg_bike_cadence',
+    'garmin_activity_id', 'strava_activity_id', 'content_hash'
+)
+
+# Positions of the source ids in an activity_to_row() tuple
+GARMIN_ID_INDEX = WORKOUT_COLUMNS.index('garmin_activity_id')
+STRAVA_ID_INDEX = WORKOUT_COLUMNS.index('strava_activity_id')
+
+WORKOUT_UPSERT_SQL = """
+    INSERT INTO workout_stats (
+        activity_type, date, favorite, title, distance,
+        calories, time, avg_hr, max_hr, avg_bike_cadence,
+        garmin_activity_id, strava_activity_id, content_hash
+    ) VALUES {values}
+    ON CONFLICT (date, activity_type) DO UPDATE SET
+        favorite = EXCLUDED.favorite,
+        title = EXCLUDED.title,
+        distance = EXCLUDED.distance,
+        calories = EXCLUDED.calories,
+        time = EXCLUDED.time,
+        avg_hr = EXCLUDED.avg_hr,
+        max_hr = EXCLUDED.max_hr,
+        avg_bike_cadence = EXCLUDED.avg_bike_cadence,
+        garmin_activity_id = COALESCE(
+            EXCLUDED.garmin_activity_id, workout_stats.garmin_activity_id
+        ),
+        strava_activity_id = COALESCE(
+            EXCLUDED.strava_activity_id, workout_stats.strava_activity_id
+        ),
+        content_hash = EXCLUDED.content_hash
+"""
+
+# Rows still holding a source id under another (date, activity_type) key.
+# An activity whose start time or type was edited at the source comes back
+# with a new key; its old row has to give up the id before the upsert, or
+# the insert trips the id's unique index on every run after that. {moved}
+# is one MOVED_ID_MATCH per incoming row, OR-ed together.
+MOVED_ID_MATCH = "({column} = %s AND (date <> %s OR activity_type <> %s))"
+MOVED_GARMIN_DELETE_SQL = "DELETE FROM workout_stats WHERE {moved}"
+# A Strava-only row is deleted like a Garmin one; a Garmin row that had
+# merged the Strava id keeps its data and only drops the id.
+MOVED_STRAVA_DELETE_SQL = """
+    DELETE FROM workout_stats WHERE garmin_activity_id IS NULL AND ({moved})
+"""
+MOVED_STRAVA_UNLINK_SQL = "UPDATE workout_stats SET strava_activity_id = NULL WHERE {moved}"
+
+# pg_advisory_lock key serializing cross-source workout writes (see workout_dedup.py)
+WORKOUT_WRITE_LOCK_ID = 7_301_822
+
+
+# Rows per multi-row INSERT; keeps each statement well under Postgres' bind limit
+WORKOUT_BATCH_SIZE = 500
+
+
+def values_placeholders(row_count: int, column_count: int) -> str:
+    """Build a multi-row VALUES placeholder list, e.g. '(%s, %s), (%s, %s)'."""
+    row = "(" + ", ".join(["%s"] * column_count) + ")"
+    return ", ".join([row] * row_count)
+
+
+def activity_to_row(activity: dict) -> tuple:
+    """
+    Map a Garmin API activity dict to a workout_stats row tuple
+    (ordered as WORKOUT_COLUMNS). Raises KeyError/ValueError on bad input.
+    Strava activities are normalized into the same shape, with their id in
+    'stravaActivityId' (see strava_fallback.normalize_strava_activity).
+
+    The trailing content_hash covers the stored fields only, so it changes
+    exactly when an upsert would change the row.
+    """
+    activity_type = activity['activityType']['typeKey']  # e.g., 'running'
+    date_str = activity['startTimeLocal']  # e.g., '2025-02-22 10:10:39'
+    date = datetime.datetime.strptime(date_str, '%Y-%m-%d %H:%M:%S')
+
+    # Handle cadence based on activity type
+    if activity_type == 'running':
+        avg_bike_cadence = activity.get('averageRunningCadenceInStepsPerMinute', 0)
+    elif activity_type == 'cycling' or activity_type == 'indoor_cycling':
+        avg_bike_cadence = activity.get('averageCadence', 0)  # Adjust based on actual key
+    else:
+        avg_bike_cadence = 0
+
+    fields = (
+        activity_type,
+        date,
+        activity['favorite'],  # Correct key is 'favorite', not 'isFavorite'
+        activity['activityName'],
+        activity['distance'],  # in meters
+        activity['calories'],
+        activity['duration'],  # in seconds
+        activity.get('averageHR', 0),  # Use 0 if missing
+        activity.get('maxHR', 0),
+        avg_bike_cadence
+    )
+    return fields + (
+        activity.get('activityId'),
+        activity.get('stravaActivityId'),
+        workout_content_hash(fields)
+    )
+
+
+def workout_content_hash(fields: tuple) -> str:
+    """Stable hash of a workout's stored field values."""
+    return hashlib.sha1(repr(fields).encode("utf-8")).hexdigest()
+
+
+def get_known_workout_hashes(
+    conn: connection,
+    start_date: datetime.date,
+    end_date: datetime.date
+) -> Dict[int, str]:
+    """
+    Map garmin_activity_id -> content_hash for workouts in [start_date, end_date).
+    Bounded by the date index, so cost follows the fetch window, not history.
+    """
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT garmin_activity_id, content_hash
+            FROM workout_stats
+            WHERE date >= %s AND date < %s
+              AND garmin_activity_id IS NOT NULL
+            """,
+            (start_date, end_date)
+        )
+        return {row[0]: row[1] for row in cur.fetchall()}
+
+
+def get_workout_fingerprints(
+    conn: connection,
+    start: datetime.datetime,
+    end: datetime.datetime
+) -> List[Dict[str, Any]]:
+    """
+    Start time, duration, distance and source ids of the workouts that start
+    in [start, end), for cross-source matching (see workout_dedup.py).
+    """
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT date, activity_type, time, distance,
+                   garmin_activity_id, strava_activity_id, content_hash
+            FROM workout_stats
+            WHERE date >= %s AND date < %s
+            """,
+            (start, end)
+        )
+        columns = [desc[0] for desc in cur.description]
+        return [dict(zip(columns, row)) for row in cur.fetchall()]
+
+
+def delete_strava_only_workouts(conn: connection, keys: List[Tuple]) -> int:
+    """
+    Delete workouts recorded only by Strava, by (date, activity_type) key.
+    Rows that also carry a Garmin id are never touched. Returns rows deleted.
+    """
+    deleted = 0
+    with conn.cursor() as cur:
+        for date, activity_type in keys:
             cur.execute(
                 """
-                INSERT INTO workout_stats (
-                    activity_type, date, favorite, title, distance,
-                    calories, time, avg_hr, max_hr, avg_bike_cadence
-                ) VALUES (
-                    %s, %s, %s, %s, %s,
-                    %s, %s, %s, %s, %s
-                ) ON CONFLICT (date, activity_type) DO UPDATE SET
-                    favorite = EXCLUDED.favorite,
-                    title = EXCLUDED.title,
-                    distance = EXCLUDED.distance,
-                    calories = EXCLUDED.calories,
-                    time = EXCLUDED.time,
-                    avg_hr = EXCLUDED.avg_hr,
-                    max_hr = EXCLUDED.max_hr,
-                    avg_bike_cadence = EXCLUDED.avg_bike_cadence
+                DELETE FROM workout_stats
+                WHERE date = %s AND activity_type = %s
+                  AND garmin_activity_id IS NULL
+                  AND strava_activity_id IS NOT NULL
                 """,
-                (
-                    activity_type,
-                    date,
-                    favorite,
-                    title,
-                    distance,
-                    calories,
-                    time,
-                    avg_hr,
-                    max_hr,
-                    avg_bike_cadence
-                )
+                (date, activity_type)
             )
-        logger.info("Stored workout data for %s", date)
+            deleted += cur.rowcount
+    if not conn.autocommit:
+        conn.commit()
+    return deleted
+
+
+@contextmanager
+def workout_write_lock(conn: connection) -> Iterator[None]:
+    """
+    Hold a session-level Postgres advisory lock while checking for and
+    writing workouts, so concurrent sources see each other's rows.
+    """
+    with conn.cursor() as cur:
+        cur.execute("SELECT pg_advisory_lock(%s)", (WORKOUT_WRITE_LOCK_ID,))
+    try:
+        yield
+    finally:
+        if not conn.closed:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT pg_advisory_unlock(%s)", (WORKOUT_WRITE_LOCK_ID,))
+            except Exception as e:
+                # The lock dies with the session if unlocking fails
+                logger.warning(f"Releasing workout write lock failed: {str(e)}")
+
+
+def store_workout_data(conn, activity):
+    """
+    Upsert activity data from Garmin API into workout_stats. The old row of
+    an activity stored under another key is replaced in the same
+    transaction.
+    """
+    try:
+        row = activity_to_row(activity)
     except KeyError as e:
-        logger.error(f"Missing key in activity data: {e}. Activity: {activity}")
+        logger.error(
+            f"Missing key in activity data: {e}. "
+            f"Activity: {activity.get('activityId', 'N/A')}"
+        )
+        return
     except Exception as e:
         logger.error(f"Failed to store workout data: {e}")
+        return
+
+    previous_autocommit = conn.autocommit
+    if previous_autocommit:
+        conn.autocommit = False
+    try:
+        with conn.cursor() as cur:
+            _upsert_workout_rows(cur, [row])
+        conn.commit()
+        logger.info("Stored workout data for %s", row[1])
+    except Exception as e:
+        conn.rollback()
+        logger.error(f"Failed to store workout data: {e}")
+    finally:
+        if previous_autocommit:
+            conn.autocommit = True
+
+
+def _release_moved_ids(cur, rows: List[tuple]) -> None:
+    """Detach the source ids of `rows` from rows stored under another key."""
+    for column, index, statements in (
+        ('garmin_activity_id', GARMIN_ID_INDEX, (MOVED_GARMIN_DELETE_SQL,)),
+        ('strava_activity_id', STRAVA_ID_INDEX, (MOVED_STRAVA_DELETE_SQL, MOVED_STRAVA_UNLINK_SQL)),
+    ):
+        ided = [row for row in rows if row[index] is not None]
+        if not ided:
+            continue
+        moved = " OR ".join([MOVED_ID_MATCH.format(column=column)] * len(ided))
+        params = [value for row in ided for value in (row[index], row[1], row[0])]
+        for statement in statements:
+            cur.execute(statement.format(moved=moved), params)
+
+
+def _upsert_workout_rows(cur, rows: List[tuple]) -> None:
+    """Release moved source ids, then upsert `rows` in one statement."""
+    _release_moved_ids(cur, rows)
+    cur.execute(
+        WORKOUT_UPSERT_SQL.format(
+            values=values_placeholders(len(rows), len(WORKOUT_COLUMNS))
+        ),
+        [value for row in rows for value in row]
+    )
+
+
+def store_workout_batch(
+    conn: connection,
+    activities: List[dict],
+    batch_size: int = WORKOUT_BATCH_SIZE
+) -> Dict[str, Any]:
+    """
+    Upsert many activities (Garmin-shaped dicts) into workout_stats using
+    multi-row INSERTs.
+
+    Field mapping happens once per activity up front; activities that cannot be
+    mapped are rejected individually. All batches run in one transaction,
+    each under a savepoint: if a batch fails, only it is rolled back and
+    retried row by row, so only the offending rows are rejected.
+    An activity stored earlier under another (date, activity_type) key, e.g.
+    after its start time was edited, replaces its old row; the old row is
+    only removed together with the upsert that replaces it.
+
+    Args:
+        conn: psycopg2 connection (autocommit, as returned by get_db_connection).
+        activities: Garmin API activity dicts.
+        batch_size: Maximum rows per INSERT statement.
+
+    Returns:
+        Dict with 'stored' (int) and 'rejected' (list of (activity, reason)).
+        Errors outside a batch (e.g. a lost connection) roll everything back
+        and propagate.
+    """
+    rejected: List[Tuple[dict, str]] = []
+
+    # Map once; the last activity wins if two share the conflict key, since
+    # Postgres refuses to update the same row twice in one statement.
+    rows_by_key: Dict[tuple, tuple] = {}
+    sources_by_key: Dict[tuple, dict] = {}
+    for activity in activities:
+        try:
+            row = activity_to_row(activity)
+        except (KeyError, TypeError, ValueError) as e:
+            logger.error(f"Rejected activity during mapping: {e!r}")
+            rejected.append((activity, f"mapping: {e!r}"))
+            continue
+        key = (row[1], row[0])  # (date, activity_type)
+        rows_by_key[key] = row
+        sources_by_key[key] = activity
+
+    keys = list(rows_by_key)
+    stored = 0
+    # Savepoints need an open transaction, so leave autocommit for the load.
+    previous_autocommit = conn.autocommit
+    if previous_autocommit:
+        conn.autocommit = False
+    try:
+        with conn.cursor() as cur:
+            for offset in range(0, len(keys), batch_size):
+                chunk = keys[offset:offset + batch_size]
+                rows = [rows_by_key[key] for key in chunk]
+                cur.execute("SAVEPOINT workout_batch")
+                try:
+                    _upsert_workout_rows(cur, rows)
+                    cur.execute("RELEASE SAVEPOINT workout_batch")
+                    stored += len(rows)
+                    continue
+                except Exception as e:
+                    logger.warning(
+                        f"Batch of {len(rows)} workouts failed ({e}); retrying row by row"
+                    )
+                    cur.execute("ROLLBACK TO SAVEPOINT workout_batch")
+
+                for key, row in zip(chunk, rows):
+                    cur.execute("SAVEPOINT workout_row")
+                    try:
+                        _upsert_workout_rows(cur, [row])
+                        cur.execute("RELEASE SAVEPOINT workout_row")
+                        stored += 1
+                    except Exception as row_error:
+                        logger.error(f"Rejected workout {key}: {row_error}")
+                        cur.execute("ROLLBACK TO SAVEPOINT workout_row")
+                        rejected.append((sources_by_key[key], str(row_error)))
+                cur.execute("RELEASE SAVEPOINT workout_batch")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        if previous_autocommit:
+            conn.autocommit = True
+
+    logger.info(f"Stored {stored} workouts, rejected {len(rejected)}")
+    return {"stored": stored, "rejected": rejected}
@@ -6,14 +6,18 @@ Enhanced database utilities with better error handling and fallback data.
 import logging
 import json
 import datetime
-from typing import Optional, Dict, List, Any, Union
-import psycopg2
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional, Dict, List, Any
 from psycopg2.extensions import connection
-from psycopg2.extras import RealDictCursor
-import scripts.config as config
+from scripts import db_pool, metrics, serializer
 
 logger = logging.getLogger(__name__)
 
+# Rows fetched per round-trip by streaming (server-side cursor) queries
+STREAM_ITERSIZE = 2000
+
 # Demo data for tests and when database is unavailable
 DEMO_WORKOUT_DATA = [
     {
@@ -64,27 +68,29 @@ DEMO_HABIT_DATA = [
 ]
 
 def get_db_connection() -> Optional[connection]:
-    """Create a new database connection using config credentials with better error handling."""
+    """
+    Check out a pooled connection, returning None instead of raising.
+    Return it with db_pool.release().
+    """
     try:
-        conn = psycopg2.connect(
-            host=config.SUPABASE_DB_HOST,
-            port=config.SUPABASE_DB_PORT,
-            database=config.SUPABASE_DB_NAME,
-            user=config.SUPABASE_DB_USER,
-            password=config.SUPABASE_DB_PASSWORD,
-        )
-        conn.autocommit = True
-        return conn
+        return db_pool.acquire(autocommit=True)
     except Exception as e:
         logger.error(f"Database connection failed: {str(e)}")
         return None
 
+def record_query_timing(query: str, seconds: float, row_count: int) -> None:
+    """Default safe_execute_query hook: rows read go to the run metrics."""
+    metrics.count("rows_in", row_count)
+    logger.debug(f"Query returned {row_count} rows in {seconds:.3f}s")
+
+
 def safe_execute_query(
     conn: Optional[connection], 
     query: str, 
     params: tuple = None,
     use_dict_cursor: bool = False,
-    fallback_data: List[Dict] = None
+    fallback_data: List[Dict] = None,
+    on_query: Optional[Callable[[str, float, int], None]] = record_query_timing
 ) -> List[Dict]:
     """
     Safely execute a database query with better error handling and fallback data.
@@ -95,6 +101,8 @@ def safe_execute_query(
         params: Query parameters
         use_dict_cursor: Whether to use RealDictCursor
         fallback_data: Data to return if connection is None or query fails
+        on_query: Timing hook called as on_query(query, seconds, row_count)
+                  after a successful query (execute plus fetch)
         
     Returns:
         List of dictionaries with query results, or fallback data
@@ -104,7 +112,8 @@ def safe_execute_query(
         return fallback_data or []
     
     try:
-        cursor_factory = RealDictCursor if use_dict_cursor else None
+        started = time.perf_counter()
+        cursor_factory = db_pool.InstrumentedDictCursor if use_dict_cursor else None
         with conn.cursor(cursor_factory=cursor_factory) as cur:
             cur.execute(query, params)
             if use_dict_cursor:
@@ -112,13 +121,60 @@ def safe_execute_query(
             else:
                 columns = [desc[0] for desc in cur.description]
                 result = [dict(zip(columns, row)) for row in cur.fetchall()]
-            return result
+        if on_query is not None:
+            on_query(query, time.perf_counter() - started, len(result))
+        return result
     except Exception as e:
         logger.error(f"Query execution failed: {str(e)}")
         logger.error(f"Query: {query}")
         logger.error(f"Params: {params}")
         return fallback_data or []
 
+@contextmanager
+def server_cursor(conn: connection) -> Iterator[Any]:
+    """
+    A named server-side cursor, closed on exit.
+
+    Named cursors only live inside a transaction. On an autocommit connection
+    one is opened for the cursor's lifetime and ended on exit (committed, or
+    rolled back on error), then autocommit is restored. WITH HOLD is avoided
+    on purpose: it materializes the whole result at commit and outlives the
+    transaction if it isn't closed.
+    """
+    previous_autocommit = conn.autocommit
+    if previous_autocommit:
+        conn.autocommit = False
+    cur = conn.cursor(name=f"stream_{uuid.uuid4().hex[:12]}")
+    failed = False
+    try:
+        yield cur
+    except BaseException:
+        failed = True
+        raise
+    finally:
+        try:
+            cur.close()
+        except Exception as e:
+            logger.debug(f"Closing stream cursor failed: {str(e)}")
+        if previous_autocommit:
+            try:
+                if failed:
+                    conn.rollback()
+                else:
+                    conn.commit()
+            finally:
+                conn.autocommit = True
+
+def fetch_batches(cur: Any, itersize: int = STREAM_ITERSIZE) -> Iterator[List[tuple]]:
+    """Yield fetchmany() batches of an executed cursor, one round-trip each."""
+    while True:
+        started = time.perf_counter()
+        rows = cur.fetchmany(itersize)
+        metrics.record_query(time.perf_counter() - started, f"FETCH {itersize} FROM {cur.name}")
+        if not rows:
+            return
+        yield rows
+
 def get_workout_data(
     conn: Optional[connection], 
     start_date: datetime.date, 
@@ -158,25 +214,8 @@ def get_habit_data(
     )
 
 def format_for_frontend(data: List[Dict]) -> List[Dict]:
-    """Format data for frontend with safe type conversions."""
-    if not data:
-        return []
-    
-    formatted = []
-    for item in data:
-        formatted_item = {}
-        for key, value in item.items():
-            # Convert datetime objects to ISO strings
-            if isinstance(value, (datetime.datetime, datetime.date)):
-                formatted_item[key] = value.isoformat()
-            # Convert decimal to float
-            elif hasattr(value, 'is_finite') and callable(getattr(value, 'is_finite')):
-                formatted_item[key] = float(value)
-            # Handle None values
-            elif value is None:
-                formatted_item[key] = None
-            else:
-                formatted_item[key] = value
-        formatted.append(formatted_item)
-    
-    return formatted
+    """
+    Format data for frontend with safe type conversions: dates become ISO
+    strings and decimals floats, via a per-column plan (see serializer.py).
+    """
+    return serializer.format_rows(data)
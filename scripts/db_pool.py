@@ -0,0 +1,203 @@
+# scripts/db_pool.py
+"""
+Shared Postgres (Supabase session pooler) connection pool.
+
+Every module checks connections out of this one process-wide pool instead of
+opening its own. Connections are health-checked on checkout, dropped and
+replaced if the pooler has closed them, and carry a statement timeout.
+
+Usage:
+    with db_connection() as conn:
+        ...
+"""
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+import psycopg2
+from psycopg2 import pool as pg_pool
+from psycopg2.extensions import connection, cursor, TRANSACTION_STATUS_IDLE
+from psycopg2.extras import RealDictCursor
+
+import scripts.config as config
+from scripts import metrics
+
+logger = logging.getLogger(__name__)
+
+# How many times to replace a dead connection before giving up on checkout
+CHECKOUT_ATTEMPTS = 3
+
+
+class _TimedExecuteMixin:
+    """Times execute/executemany and reports them to metrics.record_query."""
+
+    def execute(self, query, vars=None):
+        started = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            metrics.record_query(time.perf_counter() - started, query)
+
+    def executemany(self, query, vars_list):
+        started = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            metrics.record_query(time.perf_counter() - started, query)
+
+
+class InstrumentedCursor(_TimedExecuteMixin, cursor):
+    """Default cursor for pooled connections."""
+
+
+class InstrumentedDictCursor(_TimedExecuteMixin, RealDictCursor):
+    """RealDictCursor with round-trip accounting."""
+
+
+_pool: Optional[pg_pool.ThreadedConnectionPool] = None
+_slots: Optional[threading.BoundedSemaphore] = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> pg_pool.ThreadedConnectionPool:
+    """Create the process-wide pool on first use."""
+    global _pool, _slots
+    with _pool_lock:
+        if _pool is None:
+            _pool = pg_pool.ThreadedConnectionPool(
+                config.DB_POOL_MIN_SIZE,
+                config.DB_POOL_MAX_SIZE,
+                host=config.SUPABASE_DB_HOST,
+                port=config.SUPABASE_DB_PORT,
+                database=config.SUPABASE_DB_NAME,
+                user=config.SUPABASE_DB_USER,
+                password=config.SUPABASE_DB_PASSWORD,
+                connect_timeout=config.DB_CONNECT_TIMEOUT,
+                # Counts and times every query for the run metrics
+                cursor_factory=InstrumentedCursor,
+            )
+            # ThreadedConnectionPool raises when exhausted; the semaphore
+            # makes callers wait for a free slot instead.
+            _slots = threading.BoundedSemaphore(config.DB_POOL_MAX_SIZE)
+            logger.info(
+                f"Created DB pool (min={config.DB_POOL_MIN_SIZE}, "
+                f"max={config.DB_POOL_MAX_SIZE})"
+            )
+        return _pool
+
+
+def _prepare(conn: connection) -> bool:
+    """
+    Health-check a connection and apply the statement timeout in one round-trip.
+    Returns False if the connection is unusable.
+    """
+    if conn.closed:
+        return False
+    try:
+        if conn.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+            conn.rollback()
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute(
+                "SET statement_timeout = %s", (config.DB_STATEMENT_TIMEOUT_MS,)
+            )
+        return True
+    except psycopg2.Error as e:
+        logger.warning(f"Discarding unhealthy DB connection: {str(e)}")
+        return False
+
+
+def acquire(autocommit: bool = True) -> connection:
+    """
+    Check out a healthy connection from the pool.
+    Callers must hand it back with release().
+    """
+    db_pool = _get_pool()
+    if not _slots.acquire(timeout=config.DB_POOL_CHECKOUT_TIMEOUT):
+        raise pg_pool.PoolError("Timed out waiting for a free DB connection")
+    try:
+        for attempt in range(1, CHECKOUT_ATTEMPTS + 1):
+            conn = db_pool.getconn()
+            if _prepare(conn):
+                conn.autocommit = autocommit
+                return conn
+            # Pooler dropped it; close and let the pool open a fresh one
+            db_pool.putconn(conn, close=True)
+            logger.info(f"Reconnecting to database (attempt {attempt})")
+        raise psycopg2.OperationalError(
+            f"No healthy DB connection after {CHECKOUT_ATTEMPTS} attempts"
+        )
+    except Exception:
+        _slots.release()
+        raise
+
+
+def release(conn: connection, close: bool = False) -> None:
+    """Return a connection to the pool, discarding it if broken or asked to."""
+    if _pool is None:
+        conn.close()
+        return
+    try:
+        if not conn.closed and conn.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+            conn.rollback()
+    except psycopg2.Error:
+        close = True
+    try:
+        _pool.putconn(conn, close=close or bool(conn.closed))
+    finally:
+        _slots.release()
+
+
+@contextmanager
+def _lend(conn: connection) -> Iterator[connection]:
+    """Yield a checked-out connection and hand it back afterwards."""
+    broken = False
+    try:
+        yield conn
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        broken = True
+        raise
+    finally:
+        release(conn, close=broken)
+
+
+@contextmanager
+def db_connection(autocommit: bool = True) -> Iterator[connection]:
+    """
+    Context manager yielding a pooled connection.
+
+    A connection that raised OperationalError/InterfaceError while in use is
+    assumed dropped by the pooler and closed rather than returned.
+    """
+    with _lend(acquire(autocommit=autocommit)) as conn:
+        yield conn
+
+
+@contextmanager
+def optional_db_connection(autocommit: bool = True) -> Iterator[Optional[connection]]:
+    """
+    Like db_connection(), but yields None when the database can't be reached,
+    so a caller can still fetch and spool (see outbox.py).
+    """
+    try:
+        conn = acquire(autocommit=autocommit)
+    except psycopg2.Error as e:
+        logger.error(f"Database unavailable: {str(e)}")
+        yield None
+        return
+    with _lend(conn) as conn:
+        yield conn
+
+
+def close_pool() -> None:
+    """Close every pooled connection (call at process exit)."""
+    global _pool, _slots
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
+            _slots = None
+            logger.info("Closed DB pool")
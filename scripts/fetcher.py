@@ -1,108 +1,327 @@
 # scripts/fetcher.py
-from datetime import datetime, timedelta
+"""
+Garmin activity fetching.
+
+Activities are pulled one date window at a time and each window is deduped
+and stored before the next is requested, so memory stays flat however long
+the range is. Backfills checkpoint their progress in sync_state and resume
+from the last completed window.
+
+Fetched windows are spooled to the local outbox before they touch the
+database and acked once stored; a run that can't reach the database only
+fetches and spools (spool_garmin_offline), and the next run replays the
+spool before fetching anything new.
+
+Garmin is the primary workout source: a stored activity replaces any
+Strava-only row for the same workout (see workout_dedup.py).
+"""
+
+from datetime import date, datetime, timedelta
+import json
 import logging
-from typing import List
-import pytz  # Ensure pytz is installed
+import os
+from typing import Dict, Iterator, List, Optional, Tuple
+from psycopg2 import OperationalError
 from psycopg2.extensions import connection
 from garminconnect import Garmin
 
 import scripts.config as config
-from scripts.database import get_last_successful_fetch_date
+from scripts import metrics, outbox
+from scripts.database import (
+    GARMIN_ID_INDEX,
+    activity_to_row,
+    clear_sync_cursor,
+    get_known_workout_hashes,
+    get_last_successful_fetch_date,
+    get_sync_cursor,
+    set_sync_cursor,
+    update_last_successful_fetch_date
+)
+from scripts.workout_dedup import store_primary_workouts
 
 logger = logging.getLogger(__name__)
 
-def fetch_garmin_daily(conn: connection) -> List[dict]:
+# Days of activities requested per Garmin call
+GARMIN_WINDOW_DAYS = 30
+
+# Written by garth.dump(); its presence means a token cache exists
+GARMIN_TOKEN_FILE = "oauth1_token.json"
+
+# Outbox source name; its mark holds the days offline runs have fetched
+GARMIN_OUTBOX = "garmin"
+
+# Days the first offline run fetches, as it can't read the last fetch date
+GARMIN_OFFLINE_DAYS = 7
+
+
+def save_garmin_tokens(client: Garmin, token_dir: Optional[str] = None) -> None:
+    """Persist the client's OAuth tokens (garth may have refreshed them)."""
+    token_dir = token_dir or config.GARMIN_TOKEN_DIR
+    try:
+        os.makedirs(token_dir, mode=0o700, exist_ok=True)
+        client.garth.dump(token_dir)
+    except Exception as e:
+        logger.warning(f"Could not save Garmin tokens to {token_dir}: {str(e)}")
+
+
+def get_garmin_client(tokens: Optional[str] = None) -> Optional[Garmin]:
     """
-    Fetch Garmin activities since the last successful fetch or 30 days ago, ensuring
-    current day's activities are included by extending end_date. Only return new activities.
+    Log into Garmin Connect, or return None if credentials are missing.
+
+    Cached OAuth tokens in GARMIN_TOKEN_DIR are tried first; garth refreshes
+    an expired OAuth2 token from the long-lived OAuth1 token by itself. Only
+    when there is no cache or Garmin rejects it do we fall back to a full SSO
+    login, after which the new tokens are cached for the next run.
+
+    With `tokens` (another client's garth.dumps()) the new client resumes
+    from those instead; errors then propagate. garth sessions aren't
+    thread-safe, so concurrent workers each need a client of their own.
     """
-    try:
-        # Validate credentials
-        username = config.GARMIN_USERNAME
-        password = config.GARMIN_PASSWORD
-        if not username or not password:
-            logger.error("Garmin credentials not found.")
-            return []
-
-        # Initialize client
-        client = Garmin(username, password)
-        client.login()
-        logger.info("Successfully logged into Garmin Connect.")
-
-        # Get last fetch date or default to 30 days ago
-        last_fetch = get_last_successful_fetch_date(conn)
-        logger.debug(f"last_fetch: {last_fetch}, type: {type(last_fetch)}")
-        
-        if last_fetch:
-            start_date = last_fetch  # Assuming last_fetch is a date object
-        else:
-            start_date = (datetime.now().date() - timedelta(days=30))
-
-        # Extend end_date to tomorrow for inclusivity
-        end_date = (datetime.now().date() + timedelta(days=1))
-
-        start_date_str = start_date.strftime("%Y-%m-%d")
-        end_date_str = end_date.strftime("%Y-%m-%d")
-        logger.info(f"Fetching activities from {start_date_str} to {end_date_str}")
-
-        # Fetch activities
-        activities = client.get_activities_by_date(start_date_str, end_date_str)
-        logger.debug(f"Raw Garmin API response: {activities}")
-
-        # Log sample activity dates for diagnostics
-        if activities:
-            for i, activity in enumerate(activities[:3]):  # Up to 3 samples
-                local_time = activity.get('startTimeLocal', 'N/A')
-                logger.debug(f"Activity {i+1} startTimeLocal: {local_time}")
-        else:
-            # Fallback: Fetch 5 recent activities if date range fails
-            logger.info("No activities in date range. Fetching 5 recent activities.")
-            activities = client.get_activities(0, 5)
-            logger.info(f"Fallback fetch returned {len(activities)} activities.")
-            if activities:
-                for i, activity in enumerate(activities):
-                    logger.debug(f"Recent activity {i+1}: {activity.get('startTimeLocal', 'N/A')}")
-
-        if not activities:
-            logger.info("No activities found after fallback.")
-            return []
-
-        # Filter out existing activities
-        with conn.cursor() as cursor:
-            cursor.execute("SELECT date FROM workout_stats")
-            existing_dates = {row[0] for row in cursor.fetchall()}
-            logger.debug(f"Existing dates in DB: {sorted(existing_dates)}")
+    username = config.GARMIN_USERNAME
+    password = config.GARMIN_PASSWORD
+    if not username or not password:
+        logger.error("Garmin credentials not found.")
+        return None
+
+    client = Garmin(username, password)
+    # garminconnect talks to Garmin through garth's requests session
+    session = getattr(getattr(client, "garth", None), "sess", None)
+    if session is not None:
+        metrics.instrument_session(session)
 
-        new_activities = []
-        for activity in activities:
+    token_dir = config.GARMIN_TOKEN_DIR
+    with metrics.stage("login"):
+        if tokens:
+            client.login(tokens)
+            return client
+        if os.path.isfile(os.path.join(token_dir, GARMIN_TOKEN_FILE)):
             try:
-                activity_date = datetime.strptime(
-                    activity['startTimeLocal'], "%Y-%m-%d %H:%M:%S"
-                ).date()
-                if activity_date not in existing_dates:
-                    new_activities.append(activity)
-                    logger.debug(f"New activity on {activity_date}")
-                else:
-                    logger.debug(f"Skipping activity on {activity_date} (already in DB)")
-            except (KeyError, ValueError) as e:
-                logger.error(f"Failed to parse activity date: {str(e)}. Activity: {activity}")
-                continue
-
-        logger.info(f"Found {len(new_activities)} new activities to store.")
-
-        # Update last fetch date only if new activities are stored
+                client.login(token_dir)
+                logger.info("Resumed Garmin Connect session from cached tokens.")
+                return client
+            except Exception as e:
+                logger.warning(f"Cached Garmin tokens rejected ({str(e)}); logging in")
+        # Full SSO login through garth directly: Garmin.login() without a
+        # tokenstore would fall back to $GARMINTOKENS if that is set.
+        client.garth.login(username, password)
+        # Finish garminconnect's session setup (profile, settings) from the new tokens
+        client.login(client.garth.dumps())
+        save_garmin_tokens(client, token_dir)
+    logger.info("Successfully logged into Garmin Connect.")
+    return client
+
+
+def iter_garmin_activity_pages(
+    client: Garmin,
+    start_date: date,
+    end_date: date,
+    window_days: int = GARMIN_WINDOW_DAYS
+) -> Iterator[Tuple[date, date, List[dict]]]:
+    """
+    Yield (window_start, window_end, activities) for consecutive date windows
+    covering [start_date, end_date). Only one window is held at a time.
+    """
+    window_start = start_date
+    while window_start < end_date:
+        window_end = min(window_start + timedelta(days=window_days), end_date)
+        # get_activities_by_date treats both bounds as inclusive
+        with metrics.stage("fetch"):
+            activities = client.get_activities_by_date(
+                window_start.strftime("%Y-%m-%d"),
+                (window_end - timedelta(days=1)).strftime("%Y-%m-%d")
+            ) or []
+            metrics.count("rows_in", len(activities))
+        logger.info(
+            f"Fetched {len(activities)} activities for {window_start} - {window_end}"
+        )
+        yield window_start, window_end, activities
+        window_start = window_end
+
+
+def filter_new_activities(
+    conn: connection,
+    activities: List[dict],
+    start_date: date,
+    end_date: date
+) -> List[dict]:
+    """
+    Drop activities already stored unchanged, keyed on Garmin's activityId and
+    a content hash. Only the ids inside [start_date, end_date) are loaded.
+    """
+    known_hashes = get_known_workout_hashes(conn, start_date, end_date)
+    logger.debug(f"{len(known_hashes)} known activities in fetch window")
+
+    new_activities = []
+    for activity in activities:
+        try:
+            row = activity_to_row(activity)
+        except (KeyError, TypeError, ValueError) as e:
+            logger.error(
+                f"Failed to parse activity {activity.get('activityId', 'N/A')}: {e!r}"
+            )
+            continue
+        activity_id, content_hash = row[GARMIN_ID_INDEX], row[-1]
+        if activity_id is not None and known_hashes.get(activity_id) == content_hash:
+            continue
+        new_activities.append(activity)
+    return new_activities
+
+
+def sync_garmin_range(
+    conn: connection,
+    client: Garmin,
+    start_date: date,
+    end_date: date,
+    checkpoint: Optional[str] = None,
+    window_days: int = GARMIN_WINDOW_DAYS
+) -> Dict[str, int]:
+    """
+    Fetch, dedup and bulk-store Garmin activities for [start_date, end_date).
+
+    With a checkpoint key, progress is saved in sync_state after every stored
+    window; a later call for the same range resumes after the last one and the
+    checkpoint is cleared once the range completes.
+
+    Returns:
+        Dict with 'fetched', 'stored' and 'rejected' counts.
+    """
+    totals = {"fetched": 0, "stored": 0, "rejected": 0}
+    range_key = {"start": start_date.isoformat(), "end": end_date.isoformat()}
+
+    resume_from = start_date
+    if checkpoint:
+        saved = get_sync_cursor(conn, checkpoint)
+        if saved:
+            state = json.loads(saved)
+            if all(state.get(key) == value for key, value in range_key.items()):
+                resume_from = date.fromisoformat(state["done_until"])
+                logger.info(f"Resuming Garmin sync from {resume_from}")
+
+    pages = iter_garmin_activity_pages(client, resume_from, end_date, window_days)
+    for window_start, window_end, activities in pages:
+        totals["fetched"] += len(activities)
+        spooled = outbox.spool(GARMIN_OUTBOX, activities)
+        with metrics.stage("dedup"):
+            new_activities = filter_new_activities(
+                conn, activities, window_start, window_end
+            )
         if new_activities:
-            with conn.cursor() as cursor:
-                cursor.execute(
-                    "INSERT INTO fetch_log (source, fetch_date) VALUES (%s, %s) "
-                    "ON CONFLICT (source) DO UPDATE SET fetch_date = EXCLUDED.fetch_date",
-                    ("garmin", datetime.now())
+            with metrics.stage("store"):
+                result = store_primary_workouts(conn, new_activities)
+                metrics.count("rows_out", result["stored"])
+            totals["stored"] += result["stored"]
+            totals["rejected"] += len(result["rejected"])
+            for activity, reason in result["rejected"]:
+                logger.warning(
+                    f"Skipped activity {activity.get('activityId', 'N/A')}: {reason}"
                 )
-                conn.commit()
-                logger.info("Updated last successful fetch date.")
+        # The store reports a dropped connection as rejected rows;
+        # keep those spooled rather than acking them
+        if conn.closed:
+            raise OperationalError("Connection lost while storing activities")
+        outbox.ack(spooled)
+        if checkpoint:
+            set_sync_cursor(conn, checkpoint, json.dumps(
+                dict(range_key, done_until=window_end.isoformat())
+            ))
 
-        return new_activities
+    if checkpoint:
+        clear_sync_cursor(conn, checkpoint)
+    return totals
 
-    except Exception as e:
-        logger.error(f"Failed to fetch Garmin data: {str(e)}")
-        return []
+
+def _store_spooled_activities(conn: connection, activities: List[dict]) -> None:
+    """outbox.replay handler: upsert a batch, raising if it didn't commit."""
+    result = store_primary_workouts(conn, activities)
+    metrics.count("rows_out", result["stored"])
+    if conn.closed:
+        raise OperationalError("Connection lost while replaying activities")
+
+
+def replay_garmin_outbox(conn: connection) -> int:
+    """Store activities spooled by earlier runs. Returns how many were replayed."""
+    with metrics.stage("replay"):
+        return outbox.replay(
+            GARMIN_OUTBOX, lambda batch: _store_spooled_activities(conn, batch)
+        )
+
+
+def spool_garmin_offline(days: int = GARMIN_OFFLINE_DAYS) -> int:
+    """
+    Fetch recent activities into the outbox only, for runs without a database.
+
+    Consecutive offline runs continue from where the previous one stopped, so
+    the mark always covers one contiguous range of days. Returns the number
+    of activities spooled.
+    """
+    client = get_garmin_client()
+    if client is None:
+        return 0
+    today = datetime.now().date()
+    saved = outbox.get_mark(GARMIN_OUTBOX)
+    covered = json.loads(saved) if saved else None
+    start_date = (
+        date.fromisoformat(covered["until"]) if covered
+        else today - timedelta(days=days)
+    )
+    spooled = 0
+    for _, _, activities in iter_garmin_activity_pages(
+        client, start_date, today + timedelta(days=1)
+    ):
+        spooled += len(outbox.spool(GARMIN_OUTBOX, activities))
+    save_garmin_tokens(client)
+    outbox.set_mark(GARMIN_OUTBOX, json.dumps({
+        "start": covered["start"] if covered else start_date.isoformat(),
+        "until": today.isoformat(),
+    }))
+    logger.info(f"Spooled {spooled} Garmin activities for the next run")
+    return spooled
+
+
+def sync_garmin_daily(conn: connection) -> Dict[str, int]:
+    """
+    Sync Garmin activities since the last successful fetch or 30 days ago, ensuring
+    current day's activities are included by extending end_date. Only new or
+    changed activities are stored.
+
+    Activities spooled by earlier runs are stored first; once the spool is
+    empty, days offline runs already fetched are not requested again.
+    """
+    replayed = replay_garmin_outbox(conn)
+    saved = outbox.get_mark(GARMIN_OUTBOX)
+    covered = None
+    if saved and outbox.pending_count(GARMIN_OUTBOX) == 0:
+        covered = json.loads(saved)
+
+    client = get_garmin_client()
+    if client is None:
+        return {"fetched": 0, "stored": replayed, "rejected": 0}
+
+    # Get last fetch date or default to 30 days ago
+    last_fetch = get_last_successful_fetch_date(conn)
+    start_date = last_fetch or (datetime.now().date() - timedelta(days=30))
+    # Skip the offline range only if it joins up with what the DB already has
+    if covered and last_fetch and last_fetch >= date.fromisoformat(covered["start"]):
+        start_date = max(start_date, date.fromisoformat(covered["until"]))
+
+    # Extend end_date past today for inclusivity
+    end_date = datetime.now().date() + timedelta(days=1)
+    logger.info(f"Fetching activities from {start_date} to {end_date}")
+
+    totals = sync_garmin_range(conn, client, start_date, end_date)
+    if covered:
+        # Only now is the offline range no longer needed to pick the start
+        outbox.set_mark(GARMIN_OUTBOX, None)
+    save_garmin_tokens(client)
+    logger.info(f"Stored {totals['stored']} of {totals['fetched']} fetched activities.")
+    totals["stored"] += replayed
+
+    update_last_successful_fetch_date(conn, datetime.now().date())
+    if totals["stored"]:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                "INSERT INTO fetch_log (source, fetch_date) VALUES (%s, %s) "
+                "ON CONFLICT (source) DO UPDATE SET fetch_date = EXCLUDED.fetch_date",
+                ("garmin", datetime.now())
+            )
+    return totals
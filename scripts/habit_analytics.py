@@ -0,0 +1,200 @@
+# scripts/habit_analytics.py
+"""
+Incremental per-habit streak and consistency engine.
+
+Each habit keeps a small running state in habit_streaks: current and best
+streak, the last day processed and a completion bitmap of the last 90 days.
+A run reads only habit rows newer than the oldest processed day, advances
+each state one day at a time and writes the precomputed numbers back, so the
+dashboard and the daily tweet no longer rescan every habit row.
+"""
+
+import logging
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional
+
+from scripts import metrics
+from scripts.habit_fetcher import get_supabase_client, iter_habits
+
+logger = logging.getLogger(__name__)
+
+# Synthetic habit whose day counts as done when enough habits were completed,
+# mirroring COMPLETION_THRESHOLD in web/components/ui/HabitTracker.js
+OVERALL_HABIT = "__overall__"
+OVERALL_COMPLETION_THRESHOLD = 0.8
+
+# Longest rolling window; also the bitmap length kept per habit
+ROLLING_WINDOWS = (7, 30, 90)
+HISTORY_DAYS = max(ROLLING_WINDOWS)
+
+# Where a first run (no state yet) starts reading habit_tracking
+EPOCH = date(2000, 1, 1)
+
+
+def create_habit_streaks_table_query() -> str:
+    """
+    Returns the SQL statement to create the habit_streaks table if not exists.
+    """
+    return """
+    CREATE TABLE IF NOT EXISTS habit_streaks (
+        habit_name TEXT PRIMARY KEY,
+        current_streak INTEGER NOT NULL DEFAULT 0,
+        best_streak INTEGER NOT NULL DEFAULT 0,
+        last_date DATE NOT NULL,
+        recent_days TEXT NOT NULL DEFAULT '',
+        completion_7d FLOAT,
+        completion_30d FLOAT,
+        completion_90d FLOAT,
+        updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+    );
+    """
+
+
+def new_state(habit_name: str, last_date: date) -> Dict:
+    """Empty state for a habit whose first processed day follows last_date."""
+    return {
+        "habit_name": habit_name,
+        "current_streak": 0,
+        "best_streak": 0,
+        "last_date": last_date,
+        "recent_days": "",
+    }
+
+
+def advance_state(state: Dict, completed_days: Iterable[date], through: date) -> Dict:
+    """
+    Advance a habit's state day by day up to and including `through`.
+    Days after last_date that aren't in completed_days count as missed.
+    """
+    completed = set(completed_days)
+    current = state["current_streak"]
+    best = state["best_streak"]
+    recent = state["recent_days"]
+
+    day = state["last_date"] + timedelta(days=1)
+    while day <= through:
+        if day in completed:
+            current += 1
+            best = max(best, current)
+            recent += "1"
+        else:
+            current = 0
+            recent += "0"
+        day += timedelta(days=1)
+
+    recent = recent[-HISTORY_DAYS:]
+    updated = dict(
+        state,
+        current_streak=current,
+        best_streak=best,
+        last_date=max(state["last_date"], through),
+        recent_days=recent,
+    )
+    for window in ROLLING_WINDOWS:
+        tail = recent[-window:]
+        updated[f"completion_{window}d"] = (
+            round(tail.count("1") / len(tail) * 100, 1) if tail else None
+        )
+    return updated
+
+
+def completions_by_habit(rows: Iterable[Dict]) -> Dict[str, Dict[date, bool]]:
+    """
+    Group habit rows into {habit_name: {day: completed}}, plus the overall
+    pseudo-habit (a day is done when >= 80% of that day's habits are).
+    """
+    by_habit: Dict[str, Dict[date, bool]] = {}
+    day_totals: Dict[date, List[int]] = {}
+    for row in rows:
+        day = date.fromisoformat(str(row["habit_date"])[:10])
+        name = row.get("habit_name") or "Unnamed Habit"
+        done = bool(row.get("completed"))
+        days = by_habit.setdefault(name, {})
+        days[day] = days.get(day, False) or done
+        totals = day_totals.setdefault(day, [0, 0])
+        totals[0] += 1
+        totals[1] += int(done)
+
+    by_habit[OVERALL_HABIT] = {
+        day: completed / total >= OVERALL_COMPLETION_THRESHOLD
+        for day, (total, completed) in day_totals.items()
+    }
+    return by_habit
+
+
+def load_states() -> Dict[str, Dict]:
+    """Read every habit's stored state."""
+    response = get_supabase_client().table("habit_streaks").select(
+        "habit_name,current_streak,best_streak,last_date,recent_days"
+    ).execute()
+    metrics.count("api_calls")
+    states = {}
+    for row in response.data or []:
+        row["last_date"] = date.fromisoformat(row["last_date"])
+        states[row["habit_name"]] = row
+    return states
+
+
+def save_states(states: Iterable[Dict]) -> None:
+    """Upsert habit states into habit_streaks."""
+    updated_at = datetime.now(timezone.utc).isoformat()
+    payload = [
+        dict(state, last_date=state["last_date"].isoformat(), updated_at=updated_at)
+        for state in states
+    ]
+    if payload:
+        get_supabase_client().table("habit_streaks").upsert(
+            payload, on_conflict="habit_name"
+        ).execute()
+        metrics.count("api_calls")
+        metrics.count("rows_out", len(payload))
+
+
+def update_habit_streaks(
+    through: Optional[date] = None,
+    rebuild: bool = False
+) -> Dict[str, Dict]:
+    """
+    Bring every habit's streak state up to date.
+
+    Only rows after the oldest stored last_date are read. Processing stops at
+    `through`, defaulting to yesterday: only closed days are processed, so
+    today, which may not be logged yet, isn't counted as missed. Rows arriving
+    late for already processed days are only picked up with rebuild=True.
+
+    Returns:
+        The updated states keyed by habit name.
+    """
+    through = through or date.today() - timedelta(days=1)
+    states = {} if rebuild else load_states()
+    start = min(
+        (state["last_date"] + timedelta(days=1) for state in states.values()),
+        default=EPOCH
+    )
+    if start > through:
+        logger.info("No new habit days to process")
+        return states
+
+    completions = completions_by_habit(iter_habits(start, through))
+
+    updated = {}
+    for name, days in completions.items():
+        if not days:
+            # Only the overall pseudo-habit, when the range had no rows;
+            # a stored state is still advanced below
+            continue
+        # A habit seen for the first time starts on its first logged day
+        state = states.get(name) or new_state(name, min(days) - timedelta(days=1))
+        if state["last_date"] >= through:
+            continue
+        done = [day for day, completed in days.items() if completed]
+        updated[name] = advance_state(state, done, through)
+
+    # Habits with no rows in the new range still lose their streak
+    for name, state in states.items():
+        if name not in updated and state["last_date"] < through:
+            updated[name] = advance_state(state, [], through)
+
+    save_states(updated.values())
+    logger.info(f"Updated streaks for {len(updated)} habits through {through}")
+    return updated
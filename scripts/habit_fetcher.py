@@ -1,23 +1,114 @@
 # scripts/habit_fetcher.py
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import List, Dict
+from typing import Dict, Iterator, List, Optional, Sequence
 from supabase import create_client, Client
 
 import scripts.config as config
+from scripts import metrics, outbox
 
 logger = logging.getLogger(__name__)
 
+# Columns the analysis actually uses; avoids shipping every column per row
+HABIT_COLUMNS = ("habit_date", "habit_name", "completed")
+
+# Rows per request; matches PostgREST's default max-rows cap
+HABIT_PAGE_SIZE = 1000
+
+# Outbox source name for analysis rows not yet stored
+HABIT_OUTBOX = "habits"
+
+_client: Optional[Client] = None
+_client_lock = threading.Lock()
+
+
 def get_supabase_client() -> Client:
-    """Create and return a Supabase client using config credentials."""
-    return create_client(config.SUPABASE_URL, config.SUPABASE_KEY)
+    """Return the process-wide Supabase client, creating it on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = create_client(config.SUPABASE_URL, config.SUPABASE_KEY)
+    return _client
+
+
+def _habit_query(
+    start_date: datetime.date,
+    end_date: Optional[datetime.date],
+    columns: Sequence[str],
+    count: Optional[str] = None
+):
+    """Build the ordered habit_tracking query for a date range."""
+    query = get_supabase_client().table("habit_tracking").select(
+        ",".join(columns), count=count
+    ).gte("habit_date", start_date.isoformat())
+    if end_date is not None:
+        query = query.lte("habit_date", end_date.isoformat())
+    # A total order keeps page boundaries stable
+    return query.order("habit_date").order("habit_name")
+
+
+def iter_habits(
+    start_date: datetime.date,
+    end_date: Optional[datetime.date] = None,
+    columns: Sequence[str] = HABIT_COLUMNS,
+    page_size: int = HABIT_PAGE_SIZE,
+    workers: int = 1
+) -> Iterator[Dict]:
+    """
+    Yield habit rows in [start_date, end_date] page by page, so ranges larger
+    than PostgREST's row cap aren't truncated.
+
+    With workers > 1 the first page also requests the exact row count and the
+    remaining pages are fetched concurrently; rows are still yielded in order.
+    """
+    # Worker threads have no stage of their own; attribute pages to the caller's
+    stage_name = metrics.current_stage()
+    first = _habit_query(
+        start_date, end_date, columns, count="exact" if workers > 1 else None
+    ).range(0, page_size - 1).execute()
+    rows = first.data or []
+    metrics.count("api_calls", stage_name=stage_name)
+    metrics.count("rows_in", len(rows), stage_name=stage_name)
+    yield from rows
+
+    if workers > 1 and first.count is not None:
+        offsets = range(page_size, first.count, page_size)
+
+        def fetch_page(offset: int) -> List[Dict]:
+            response = _habit_query(start_date, end_date, columns).range(
+                offset, offset + page_size - 1
+            ).execute()
+            page = response.data or []
+            metrics.count("api_calls", stage_name=stage_name)
+            metrics.count("rows_in", len(page), stage_name=stage_name)
+            return page
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for page in executor.map(fetch_page, offsets):
+                yield from page
+        return
+
+    offset = page_size
+    while len(rows) == page_size:
+        rows = _habit_query(start_date, end_date, columns).range(
+            offset, offset + page_size - 1
+        ).execute().data or []
+        metrics.count("api_calls", stage_name=stage_name)
+        metrics.count("rows_in", len(rows), stage_name=stage_name)
+        yield from rows
+        offset += page_size
+
 
-def fetch_habits(start_date: datetime.date) -> List[Dict]:
+def fetch_habits(
+    start_date: datetime.date,
+    end_date: Optional[datetime.date] = None
+) -> List[Dict]:
     """Fetch habits from Supabase for the given date range."""
     try:
-        supabase_client = get_supabase_client()
-        response = supabase_client.table("habit_tracking").select("*").gte("habit_date", start_date).execute()
-        habits = response.data if response.data else []
+        habits = list(iter_habits(start_date, end_date))
         logger.info(f"Fetched {len(habits)} habits from Supabase for date range starting {start_date}")
         return habits
     except Exception as e:
@@ -40,28 +131,127 @@ def analyze_habits(habits: List[Dict]) -> Dict:
     }
 
 
+def create_habit_analytics_date_index_query() -> str:
+    """
+    Returns the SQL adding the unique date index the habit_analytics upserts
+    conflict on. habit_analytics is optional, so nothing happens without it.
+    Duplicate rows left by earlier plain inserts make the index fail; that
+    only logs a warning, and `python -m scripts.cli schema` removes them
+    first (see dedupe_habit_analytics).
+    """
+    return """
+    DO $$
+    BEGIN
+        IF to_regclass('habit_analytics') IS NOT NULL THEN
+            CREATE UNIQUE INDEX IF NOT EXISTS habit_analytics_date_idx
+                ON habit_analytics (date);
+        END IF;
+    EXCEPTION WHEN unique_violation THEN
+        RAISE WARNING 'habit_analytics has duplicate dates; run `python -m scripts.cli schema` to remove them';
+    END
+    $$;
+    """
+
+
+def dedupe_habit_analytics(conn) -> int:
+    """
+    Delete all but the newest habit_analytics row of each date, so the
+    unique date index can be built. Returns the number of rows deleted.
+    """
+    with conn.cursor() as cur:
+        cur.execute("SELECT to_regclass('habit_analytics') IS NOT NULL")
+        if not cur.fetchone()[0]:
+            return 0
+        cur.execute(
+            """
+            DELETE FROM habit_analytics a USING habit_analytics b
+            WHERE a.date = b.date AND a.ctid < b.ctid
+            """
+        )
+        deleted = cur.rowcount
+    if not conn.autocommit:
+        conn.commit()
+    return deleted
+
+
+def _upsert_habit_analysis(rows: List[Dict]) -> None:
+    """Upsert habit_analytics rows on date in one request (the last row of a day wins)."""
+    rows = list({row["date"]: row for row in rows}.values())
+    get_supabase_client().table("habit_analytics").upsert(
+        rows, on_conflict="date"
+    ).execute()
+    metrics.count("api_calls")
+    metrics.count("rows_out", len(rows))
+
+
 def store_habit_analysis(analysis: Dict, date: datetime.date) -> None:
-    """Store habit analysis in Supabase."""
-    supabase_client = get_supabase_client()  # Assuming this retrieves your Supabase client
+    """
+    Store habit analysis in Supabase. The row is spooled to the outbox first,
+    so a failed write is retried by the next run's replay_habit_outbox(). The
+    row is upserted on date, so a replay after a lost ack doesn't add a
+    second row for the day.
+    """
+    # Convert the date object to a string in 'YYYY-MM-DD' format
+    date_str = date.isoformat()
+
+    # Prepare the data to insert, matching the table's column names
+    data = {
+        "date": date_str,
+        "habit_count": analysis["total_habits"],
+        "consistency_score": analysis["completion_rate"]
+    }
+    spooled = outbox.spool(HABIT_OUTBOX, [data])
     try:
-        # Convert the date object to a string in 'YYYY-MM-DD' format
-        date_str = date.isoformat()
-        
-        # Prepare the data to insert, matching the table's column names
-        data = {
-            "date": date_str,
-            "habit_count": analysis["total_habits"],
-            "consistency_score": analysis["completion_rate"]
-        }
-        
-        # Insert the data into the "habit_analytics" table
-        response = supabase_client.table("habit_analytics").insert(data).execute()
+        # Upsert the data into the "habit_analytics" table
+        _upsert_habit_analysis([data])
         logger.info(f"Stored habit analysis for {date_str}")
     except Exception as e:
         logger.error(f"Failed to store habit analysis: {str(e)}")
         raise  # Optionally re-raise the exception for further handling
+    outbox.ack(spooled)
+
+
+def replay_habit_outbox() -> int:
+    """Upsert analysis rows spooled by earlier runs. Returns how many were replayed."""
+    return outbox.replay(HABIT_OUTBOX, _upsert_habit_analysis)
+
+
+def backfill_habit_analysis(start_date: datetime.date, end_date: datetime.date) -> int:
+    """
+    Recompute habit_analytics for every day in [start_date, end_date) the way
+    the daily run would have: the row for day D analyzes habits dated D - 1
+    and D. Rows are upserted on date in one request, so a rerun doesn't
+    duplicate them and a failed write leaves the old rows in place. Errors
+    propagate. Returns the number of days stored.
+    """
+    habits_by_day: Dict[str, List[Dict]] = {}
+    # One paged read for the range instead of one request per day
+    for habit in iter_habits(start_date - timedelta(days=1), end_date - timedelta(days=1)):
+        habits_by_day.setdefault(str(habit["habit_date"])[:10], []).append(habit)
+
+    rows = []
+    day = start_date
+    while day < end_date:
+        habits = (
+            habits_by_day.get((day - timedelta(days=1)).isoformat(), [])
+            + habits_by_day.get(day.isoformat(), [])
+        )
+        if habits:
+            analysis = analyze_habits(habits)
+            rows.append({
+                "date": day.isoformat(),
+                "habit_count": analysis["total_habits"],
+                "consistency_score": analysis["completion_rate"]
+            })
+        day += timedelta(days=1)
+
+    if rows:
+        _upsert_habit_analysis(rows)
+    logger.info(f"Backfilled habit analysis for {len(rows)} days ({start_date} - {end_date})")
+    return len(rows)
 
 if __name__ == "__main__":
+    config.setup_logging()
     today = datetime.now().date()
     start_date = today - timedelta(days=7)  # Fetch habits from the last 7 days
     habits = fetch_habits(start_date)
@@ -0,0 +1,200 @@
+# scripts/http_client.py
+"""
+Shared HTTP client for REST sources (Toggl, and anything else that wants it).
+
+create_session() returns a requests.Session that
+  - keeps connections alive in a pooled adapter and asks for gzip,
+  - applies a default (connect, read) timeout,
+  - waits on a token bucket before every request, so a sync runs at the
+    API's sustainable rate instead of tripping its limiter,
+  - retries connection errors and retryable statuses (429, 5xx) with
+    exponential backoff and full jitter, honouring Retry-After (or another
+    configured reset header) when the server sends one.
+
+When retries run out the last response is returned unchanged, so callers
+keep checking status codes as before.
+"""
+
+import email.utils
+import logging
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Iterable, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from scripts import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIMEOUT: Tuple[float, float] = (5.0, 30.0)  # (connect, read) seconds
+DEFAULT_RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+# Methods safe to resend after a failure the server may have partly processed
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: `rate` tokens per second, holding at most
+    `capacity`. acquire() blocks until a token is available.
+    """
+
+    def __init__(self, rate: float, capacity: float = 1.0):
+        self.rate = rate
+        self.capacity = max(capacity, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """Take one token, sleeping as needed. Returns the seconds waited."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.capacity, self._tokens + (now - self._updated) * self.rate
+                )
+                self._updated = now
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return waited
+                delay = (1.0 - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    def pause(self, seconds: float) -> None:
+        """Drain the bucket so nobody sends for `seconds` (server asked us to wait)."""
+        with self._lock:
+            self._tokens = min(self._tokens, 0.0) - seconds * self.rate
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a Retry-After value (delta-seconds or HTTP date)."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+class RateLimitedSession(requests.Session):
+    """requests.Session with rate limiting, retries and a default timeout."""
+
+    def __init__(
+        self,
+        limiter: Optional[TokenBucket] = None,
+        max_retries: int = 5,
+        backoff_base: float = 0.5,
+        backoff_max: float = 60.0,
+        max_retry_after: float = 300.0,
+        retry_statuses: Iterable[int] = DEFAULT_RETRY_STATUSES,
+        retry_after_headers: Iterable[str] = ("Retry-After",),
+        timeout: Tuple[float, float] = DEFAULT_TIMEOUT
+    ):
+        super().__init__()
+        self.limiter = limiter
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_retry_after = max_retry_after
+        self.retry_statuses = frozenset(retry_statuses)
+        self.retry_after_headers = tuple(retry_after_headers)
+        self.timeout = timeout
+
+    def _backoff(self, attempt: int) -> float:
+        """Full jitter: uniform in [0, min(max, base * 2^attempt)]."""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def _server_delay(self, response: requests.Response) -> Optional[float]:
+        for header in self.retry_after_headers:
+            delay = parse_retry_after(response.headers.get(header))
+            if delay is not None:
+                return delay
+        return None
+
+    def request(self, method, url, *args, **kwargs) -> requests.Response:
+        kwargs.setdefault("timeout", self.timeout)
+        retry_errors = method.upper() in IDEMPOTENT_METHODS
+        attempt = 0
+        while True:
+            if self.limiter is not None:
+                self.limiter.acquire()
+            try:
+                response = super().request(method, url, *args, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if not retry_errors or attempt >= self.max_retries:
+                    raise
+                delay = self._backoff(attempt)
+                logger.warning(
+                    f"{method} {url} failed ({e.__class__.__name__}); "
+                    f"retry {attempt + 1}/{self.max_retries} in {delay:.1f}s"
+                )
+            else:
+                if response.status_code not in self.retry_statuses:
+                    return response
+                # Only a 429 proves a non-idempotent request wasn't processed
+                if attempt >= self.max_retries or (
+                    not retry_errors and response.status_code != 429
+                ):
+                    return response
+                server_delay = self._server_delay(response)
+                if server_delay is not None and server_delay > self.max_retry_after:
+                    logger.error(
+                        f"{method} {url}: server asked to wait {server_delay:.0f}s, "
+                        f"more than {self.max_retry_after:.0f}s; giving up"
+                    )
+                    return response
+                delay = server_delay if server_delay is not None else self._backoff(attempt)
+                logger.warning(
+                    f"{method} {url} returned {response.status_code}; "
+                    f"retry {attempt + 1}/{self.max_retries} in {delay:.1f}s"
+                )
+                response.close()
+                if server_delay is not None and self.limiter is not None:
+                    # Hold back every thread sharing the limiter, not just
+                    # this one; the next acquire() does the waiting.
+                    self.limiter.pause(server_delay)
+                    delay = 0.0
+            metrics.count("api_retries")
+            time.sleep(delay)
+            attempt += 1
+
+
+def create_session(
+    requests_per_second: Optional[float] = None,
+    burst: float = 1.0,
+    pool_size: int = 10,
+    limiter: Optional[TokenBucket] = None,
+    **retry_options
+) -> RateLimitedSession:
+    """
+    Build a pooled, rate-limited, retrying session.
+
+    Args:
+        requests_per_second: Sustained request rate (None = unlimited).
+        burst: Requests allowed back to back before the rate applies.
+        pool_size: Keep-alive connections per host (raise for threaded use).
+        limiter: Share an existing TokenBucket instead of creating one.
+        **retry_options: Passed to RateLimitedSession (max_retries, ...).
+    """
+    if limiter is None and requests_per_second:
+        limiter = TokenBucket(requests_per_second, burst)
+    session = RateLimitedSession(limiter=limiter, **retry_options)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers["Accept-Encoding"] = "gzip, deflate"
+    return metrics.instrument_session(session)
@@ -3,84 +3,272 @@
 Main script to fetch and process daily data for My Daily Proof.
 Fetches Garmin/Strava data, Toggl time entries, and habit data,
 storing results in Supabase.
+
+The sources hit independent services, so they run concurrently, each in its
+own thread with its own pooled database connection and timeout. A failing or
+slow source never blocks or breaks the others. Fetched records go through a
+local outbox (outbox.py): when the database is down the sources still fetch
+and spool, and the next run stores the spool first.
+
+Each step imports its client stack (garminconnect, requests, supabase,
+psycopg2, numpy) when it runs, so importing this module is cheap and the
+CLI (scripts/cli.py) can run single steps without loading the rest.
 """
 
 import logging
+import sys
+import threading
+import time
 from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+import scripts.config as config
+from scripts import metrics
 
-from scripts.database import (
-    get_db_connection,
-    update_last_successful_fetch_date,
-    store_workout_data
-)
-from scripts.fetcher import fetch_garmin_daily
-from scripts.toggl_integration import fetch_and_store_toggl_data
-from scripts.habit_fetcher import fetch_habits, analyze_habits, store_habit_analysis, get_supabase_client
-
-# Set up logging to console and file
-logging.basicConfig(
-    level=logging.DEBUG,  # Set to DEBUG for detailed output
-    format='%(asctime)s [%(levelname)s] %(name)s - %(message)s',
-    handlers=[
-        logging.FileHandler('script.log'),  # Save logs to script.log
-        logging.StreamHandler()             # Also print to console
-    ]
-)
 logger = logging.getLogger(__name__)
 
-def main():
-    logger.info("Starting script execution")
-    
-    # Establish database connection for Garmin/Strava/Toggl (existing)
-    try:
-        conn = get_db_connection()
-        logger.info("Database connection established")
-    except Exception as e:
-        logger.error(f"Failed to establish database connection: {str(e)}")
-        return
+# Log file written by full pipeline runs (uploaded by the workflow)
+LOG_FILE = "script.log"
 
-    # Fetch and store Garmin data (existing)
-    try:
-        activities = fetch_garmin_daily(conn)
-        if activities:
-            for activity in activities:
-                logger.debug(f"Activity data: {activity}")
-                store_workout_data(conn, activity)
-            update_last_successful_fetch_date(conn, datetime.now().date())
-            logger.info("New workout data stored successfully")
-        else:
-            logger.info("No new workout data to store")
-    except Exception as e:
-        logger.error(f"Error fetching or storing Garmin data: {str(e)}")
+# Per-source (and per-analytics-step) time budget in seconds
+SOURCE_TIMEOUTS = {
+    "garmin": 300,
+    "strava": 120,
+    "toggl": 120,
+    "habits": 60,
+    "training_load": 60,
+    "export": 60,
+}
+
+
+def sync_garmin() -> str:
+    """Stream new Garmin activities into workout_stats in bulk."""
+    from scripts.db_pool import optional_db_connection
+    from scripts.fetcher import spool_garmin_offline, sync_garmin_daily
+
+    with optional_db_connection() as conn:
+        if conn is None:
+            return f"database unavailable; {spool_garmin_offline()} activities spooled"
+        totals = sync_garmin_daily(conn)
+    if not totals["fetched"]:
+        return "no new workouts"
+    return (
+        f"{totals['stored']} of {totals['fetched']} workouts stored, "
+        f"{totals['rejected']} rejected"
+    )
+
+
+def sync_strava() -> str:
+    """Store Strava workouts Garmin hasn't stored (hot standby)."""
+    from scripts.db_pool import optional_db_connection
+    from scripts.strava_fallback import sync_strava_daily
+
+    with optional_db_connection() as conn:
+        if conn is None:
+            return "database unavailable; skipped"
+        totals = sync_strava_daily(conn)
+    if totals is None:
+        return "Strava unavailable"
+    return (
+        f"{totals['stored']} of {totals['fetched']} workouts stored, "
+        f"{totals['duplicates']} already stored, {totals['rejected']} rejected"
+    )
+
+
+def sync_toggl() -> str:
+    """Fetch Toggl entries changed since the last sync and store them."""
+    from scripts.db_pool import optional_db_connection
+    from scripts.toggl_integration import fetch_and_store_toggl_data, spool_toggl_offline
+
+    with optional_db_connection() as conn:
+        if conn is None:
+            return f"database unavailable; {spool_toggl_offline(since_days=7)} entries spooled"
+        counts = fetch_and_store_toggl_data(conn, since_days=7)
+        if not counts:
+            return "no entries stored"
+        return (
+            f"{counts['inserted']} inserted, {counts['updated']} updated, "
+            f"{counts['deleted']} deleted, {counts['skipped']} skipped"
+        )
+
+
+def sync_habits() -> str:
+    """Store yesterday's habit analysis and advance per-habit streaks."""
+    from scripts.habit_analytics import update_habit_streaks
+    from scripts.habit_fetcher import (
+        analyze_habits, fetch_habits, replay_habit_outbox, store_habit_analysis
+    )
+
+    with metrics.stage("replay"):
+        replay_habit_outbox()
+    today = datetime.now().date()
+    start_date = today - timedelta(days=1)  # Fetch habits from the last day
+    with metrics.stage("fetch"):
+        habits = fetch_habits(start_date)
+    if not habits:
+        return "no new habit data"
+    analysis = analyze_habits(habits)
+    with metrics.stage("store"):
+        store_habit_analysis(analysis, today)
+    with metrics.stage("streaks"):
+        streaks = update_habit_streaks()
+    return f"{analysis['total_habits']} habits analyzed, {len(streaks)} streaks updated"
+
+
+def analyze_training_load() -> str:
+    """Recompute ATL/CTL/TSB from workout_stats."""
+    from scripts.db_pool import db_connection
+    from scripts.training_load import update_training_load
+
+    with db_connection() as conn:
+        result = update_training_load(conn)
+    if result is None:
+        return "no workouts"
+    return f"{len(result['day'])} days, CTL {result['ctl'][-1]:.1f}, TSB {result['tsb'][-1]:.1f}"
 
-    # Fetch and store Toggl data (existing)
-    try:
-        fetch_and_store_toggl_data(conn, since_days=7)
-        logger.info("Toggl data fetched and stored successfully")
-    except Exception as e:
-        logger.error(f"Error fetching or storing Toggl data: {str(e)}")
 
-    # Fetch and analyze habit data (corrected)
+SOURCES: Dict[str, Callable[[], str]] = {
+    "garmin": sync_garmin,
+    "strava": sync_strava,
+    "toggl": sync_toggl,
+    "habits": sync_habits,
+}
+
+def export_dashboard_snapshots() -> str:
+    """Write changed static JSON snapshots for the dashboard."""
+    from scripts.db_pool import db_connection
+    from scripts.snapshot_export import export_snapshots
+
+    with db_connection() as conn:
+        counts = export_snapshots(conn)
+    return (
+        f"{counts['written']} written, {counts['unchanged']} unchanged, "
+        f"{counts['failed']} failed"
+    )
+
+
+# Derived data; runs once ingestion has finished
+ANALYTICS: Dict[str, Callable[[], str]] = {
+    "training_load": analyze_training_load,
+}
+
+# Publishing; runs last so it sees the fresh analytics
+PUBLISH: Dict[str, Callable[[], str]] = {
+    "export": export_dashboard_snapshots,
+}
+
+
+def run_sources(
+    sources: Dict[str, Callable[[], str]],
+    timeouts: Optional[Dict[str, float]] = None
+) -> Dict[str, Dict]:
+    """
+    Run each source in its own daemon thread and wait for all of them.
+
+    A source that exceeds its timeout is reported as timed out and abandoned;
+    daemon threads don't keep the process alive once main() returns.
+
+    Returns:
+        Mapping of source name to {'status', 'detail', 'seconds'}.
+    """
+    timeouts = timeouts or {}
+    results: Dict[str, Dict] = {}
+    threads: Dict[str, threading.Thread] = {}
+
+    def run(name: str, func: Callable[[], str]) -> None:
+        start = time.perf_counter()
+        try:
+            with metrics.stage(name):
+                detail = func()
+            status = "ok"
+        except Exception as e:
+            logger.error(f"Source {name} failed: {str(e)}")
+            detail, status = str(e), "failed"
+        results[name] = {
+            "status": status,
+            "detail": detail,
+            "seconds": time.perf_counter() - start,
+        }
+
+    started = time.perf_counter()
+    for name, func in sources.items():
+        thread = threading.Thread(
+            target=run, args=(name, func), name=f"ingest-{name}", daemon=True
+        )
+        threads[name] = thread
+        thread.start()
+
+    for name, thread in threads.items():
+        timeout = timeouts.get(name)
+        remaining = None
+        if timeout is not None:
+            remaining = max(0.0, timeout - (time.perf_counter() - started))
+        thread.join(remaining)
+        if thread.is_alive():
+            logger.error(f"Source {name} timed out after {timeout}s")
+            results[name] = {
+                "status": "timeout",
+                "detail": f"exceeded {timeout}s",
+                "seconds": time.perf_counter() - started,
+            }
+
+    return {name: results[name] for name in sources}
+
+
+def log_summary(results: Dict[str, Dict], total_seconds: float) -> None:
+    """Log a per-source wall time summary."""
+    logger.info("Ingestion summary:")
+    for name, result in results.items():
+        logger.info(
+            f"  {name:<14} {result['status']:<8} {result['seconds']:7.2f}s  "
+            f"{result['detail']}"
+        )
+    logger.info(f"  {'total':<14} {'':<8} {total_seconds:7.2f}s")
+
+
+def ensure_database_schema() -> None:
+    """Create missing tables/columns; failures are logged, not raised."""
+    from scripts.db_pool import db_connection
+    from scripts.schema import ensure_schema
+
     try:
-        supabase_client = get_supabase_client()
-        today = datetime.now().date()
-        start_date = today - timedelta(days=1)  # Fetch habits from the last day
-        habits = fetch_habits(start_date)  # Fetch habits with a date object
-        if habits:
-            analysis = analyze_habits(habits)  # Analyze the fetched habits
-            store_habit_analysis(analysis, today)  # Store the analysis with the date
-            logger.info("Habit data fetched and analyzed successfully")
-        else:
-            logger.info("No new habit data to fetch")
+        with metrics.stage("schema"), db_connection() as conn:
+            ensure_schema(conn)
     except Exception as e:
-        logger.error(f"Error fetching or analyzing habit data: {str(e)}")
+        logger.error(f"Failed to ensure schema: {str(e)}")
+
 
-    # Close database connection (existing)
+def run_pipeline(
+    groups: List[Dict[str, Callable[[], str]]],
+    ensure_tables: bool = True,
+    metrics_name: str = "daily_pipeline"
+) -> Dict[str, Dict]:
+    """
+    Run step groups in order (steps within a group run concurrently), then
+    log the summary and write the run metrics.
+    """
+    started = time.perf_counter()
     try:
-        conn.close()
-        logger.info("Database connection closed")
-    except Exception as e:
-        logger.error(f"Error closing database connection: {str(e)}")
+        if ensure_tables:
+            ensure_database_schema()
+        results: Dict[str, Dict] = {}
+        for group in groups:
+            results.update(run_sources(group, SOURCE_TIMEOUTS))
+        log_summary(results, time.perf_counter() - started)
+        metrics.write_metrics(config.METRICS_DIR, name=metrics_name, results=results)
+        return results
+    finally:
+        # Only a job that touched Postgres has a pool (and psycopg2) loaded
+        db_pool = sys.modules.get("scripts.db_pool")
+        if db_pool is not None:
+            db_pool.close_pool()
+
+
+def main():
+    config.setup_logging(log_file=LOG_FILE)
+    logger.info("Starting script execution")
+    run_pipeline([SOURCES, ANALYTICS, PUBLISH])
+
 
 if __name__ == "__main__":
     main()
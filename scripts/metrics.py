@@ -0,0 +1,232 @@
+# scripts/metrics.py
+"""
+Per-stage timing and counters for the daily pipeline.
+
+Code runs inside named stages (stages nest, so "fetch" inside "garmin"
+records as "garmin.fetch"). Each stage accumulates wall time plus counters:
+rows in/out, API calls, DB round-trips and bytes received. The current stage
+is tracked per thread, matching main.py's one-thread-per-source layout;
+pool workers use attach() to report into the stage that started them.
+
+Counting is automatic for
+  - DB round-trips: pooled connections use db_pool.InstrumentedCursor,
+  - API calls / bytes: requests sessions passed to instrument_session(),
+and explicit via count() elsewhere. At the end of a run write_metrics()
+produces a JSON file and a Prometheus textfile-collector file.
+
+Only the standard library is imported here, so any job can use it cheaply.
+
+Usage:
+    with metrics.stage("garmin"):
+        with metrics.stage("fetch"):
+            ...
+        metrics.count("rows_in", len(activities))
+"""
+
+import json
+import logging
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Counters every stage reports, even when zero
+COUNTERS = (
+    "rows_in", "rows_out", "api_calls", "api_retries", "api_bytes",
+    "db_round_trips", "db_seconds",
+)
+
+# Queries slower than this are logged with their first line
+SLOW_QUERY_SECONDS = 5.0
+
+# Prometheus metric name prefix
+PROM_PREFIX = "mydailyproof"
+
+# Stage that collects work done outside any stage()
+UNATTRIBUTED = "other"
+
+_lock = threading.Lock()
+_local = threading.local()
+_stages: Dict[str, Dict[str, float]] = {}
+_started_at = datetime.now(timezone.utc)
+
+
+def _entry(name: str) -> Dict[str, float]:
+    """The accumulator for a stage; caller holds _lock."""
+    entry = _stages.get(name)
+    if entry is None:
+        entry = _stages[name] = dict.fromkeys(("seconds", "runs") + COUNTERS, 0)
+    return entry
+
+
+def current_stage() -> str:
+    """Full name of the innermost stage active in this thread."""
+    stack = getattr(_local, "stack", None)
+    return stack[-1] if stack else UNATTRIBUTED
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Time a block as a stage nested under the thread's current stage."""
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    full_name = f"{stack[-1]}.{name}" if stack else name
+    stack.append(full_name)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        stack.pop()
+        with _lock:
+            entry = _entry(full_name)
+            entry["seconds"] += elapsed
+            entry["runs"] += 1
+
+
+@contextmanager
+def attach(full_name: str) -> Iterator[None]:
+    """
+    Attribute this thread's work to an existing stage without timing it;
+    for pool workers running on behalf of a stage in another thread.
+    """
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    stack.append(full_name)
+    try:
+        yield
+    finally:
+        stack.pop()
+
+
+def count(counter: str, value: float = 1, stage_name: Optional[str] = None) -> None:
+    """Add `value` to a counter of the current (or given) stage."""
+    with _lock:
+        entry = _entry(stage_name or current_stage())
+        entry[counter] = entry.get(counter, 0) + value
+
+
+def record_query(seconds: float, query) -> None:
+    """Count one DB round-trip; the timing hook used by instrumented cursors."""
+    with _lock:
+        entry = _entry(current_stage())
+        entry["db_round_trips"] += 1
+        entry["db_seconds"] += seconds
+    if seconds >= SLOW_QUERY_SECONDS:
+        first_line = str(query).strip().splitlines()[0] if query else ""
+        logger.warning(f"Slow query ({seconds:.2f}s) in {current_stage()}: {first_line}")
+
+
+def _record_response(response, *args, **kwargs) -> None:
+    """requests response hook: one API call plus its body size."""
+    size = response.headers.get("Content-Length")
+    with _lock:
+        entry = _entry(current_stage())
+        entry["api_calls"] += 1
+        entry["api_bytes"] += int(size) if size and size.isdigit() else len(response.content)
+
+
+def instrument_session(session):
+    """Count API calls and bytes for every response a requests session gets."""
+    hooks = session.hooks.setdefault("response", [])
+    if _record_response not in hooks:
+        hooks.append(_record_response)
+    return session
+
+
+def snapshot() -> Dict[str, Dict[str, float]]:
+    """Copy of every stage's totals, rounded for output."""
+    with _lock:
+        return {
+            name: {key: round(value, 6) if isinstance(value, float) else value
+                   for key, value in entry.items()}
+            for name, entry in sorted(_stages.items())
+        }
+
+
+def reset() -> None:
+    """Forget everything recorded so far (e.g. between runs in one process)."""
+    global _started_at
+    with _lock:
+        _stages.clear()
+        _started_at = datetime.now(timezone.utc)
+
+
+def _prom_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def render_prometheus(
+    stages: Dict[str, Dict[str, float]],
+    results: Optional[Dict[str, Dict]] = None
+) -> str:
+    """Prometheus text exposition format for the stage totals and results."""
+    lines: List[str] = []
+    metric_names = ("seconds", "runs") + COUNTERS
+    for metric in metric_names:
+        name = f"{PROM_PREFIX}_stage_{re.sub(r'[^a-zA-Z0-9_]', '_', metric)}"
+        lines.append(f"# TYPE {name} gauge")
+        for stage_name, entry in stages.items():
+            lines.append(f'{name}{{stage="{_prom_label(stage_name)}"}} {entry.get(metric, 0)}')
+    if results:
+        name = f"{PROM_PREFIX}_step_success"
+        lines.append(f"# TYPE {name} gauge")
+        for step, result in results.items():
+            ok = 1 if result.get("status") == "ok" else 0
+            lines.append(f'{name}{{step="{_prom_label(step)}"}} {ok}')
+    lines.append(f"# TYPE {PROM_PREFIX}_last_run_timestamp_seconds gauge")
+    lines.append(f"{PROM_PREFIX}_last_run_timestamp_seconds {int(time.time())}")
+    return "\n".join(lines) + "\n"
+
+
+def _write_atomic(path: str, text: str) -> None:
+    """Write via rename so collectors never read a partial file."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def write_metrics(
+    output_dir: str,
+    name: str = "daily_pipeline",
+    results: Optional[Dict[str, Dict]] = None
+) -> Optional[Dict]:
+    """
+    Write <name>.json and <name>.prom into output_dir.
+
+    `results` is main.run_sources' per-step status mapping. Failures are
+    logged, never raised, so metrics can't break a run.
+    """
+    stages = snapshot()
+    report = {
+        "started_at": _started_at.isoformat(timespec="seconds"),
+        "finished_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "stages": stages,
+        "steps": {
+            step: {"status": result["status"], "seconds": round(result["seconds"], 3)}
+            for step, result in (results or {}).items()
+        },
+    }
+    try:
+        os.makedirs(output_dir, exist_ok=True)
+        _write_atomic(
+            os.path.join(output_dir, f"{name}.json"),
+            json.dumps(report, indent=1, sort_keys=True)
+        )
+        _write_atomic(
+            os.path.join(output_dir, f"{name}.prom"),
+            render_prometheus(stages, results)
+        )
+    except OSError as e:
+        logger.error(f"Failed to write metrics: {str(e)}")
+        return None
+    logger.info(f"Wrote metrics for {len(stages)} stages to {output_dir}")
+    return report
@@ -0,0 +1,259 @@
+# scripts/outbox.py
+"""
+Local durable outbox for fetched records.
+
+Every batch fetched from a rate-limited API is appended to a local SQLite
+spool before it is written to the database, and deleted (acked) once that
+write has committed. If the database is down, or a store fails halfway, the
+records stay in the spool and the next run replays them in bulk instead of
+fetching them again.
+
+Each call opens its own short-lived SQLite connection (WAL mode), so the
+source threads in main.py can spool concurrently. Only the standard library
+is used. Spool failures are logged, never raised: losing the safety net must
+not stop a sync that could still reach the database.
+
+Records spooled with a key (e.g. key="id") replace the pending record with
+the same key instead of adding another copy, so re-fetching a range that
+is still spooled doesn't grow the spool.
+
+Usage:
+    spooled = outbox.spool("garmin", activities)
+    store_workout_batch(conn, activities)
+    outbox.ack(spooled)
+
+    outbox.replay("garmin", lambda batch: store_workout_batch(conn, batch))
+"""
+
+import json
+import logging
+import sqlite3
+from contextlib import closing
+from datetime import date, datetime
+from typing import Callable, List, Optional, Tuple
+
+import scripts.config as config
+
+logger = logging.getLogger(__name__)
+
+# Records handed to a replay handler at once
+OUTBOX_BATCH_SIZE = 500
+
+# SQLite caps bound parameters per statement (999 on older builds)
+_DELETE_CHUNK = 500
+
+OUTBOX_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    source TEXT NOT NULL,
+    record_key TEXT,
+    payload TEXT NOT NULL,
+    created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS outbox_source_idx ON outbox (source, id);
+CREATE TABLE IF NOT EXISTS outbox_marks (
+    source TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+def _encode(value):
+    """json default: tag dates so they decode back to date objects."""
+    if isinstance(value, datetime):
+        return {"$datetime": value.isoformat()}
+    if isinstance(value, date):
+        return {"$date": value.isoformat()}
+    raise TypeError(f"Cannot spool {type(value).__name__}")
+
+
+def _decode(obj: dict):
+    """json object_hook reversing _encode."""
+    if len(obj) == 1:
+        if "$date" in obj:
+            return date.fromisoformat(obj["$date"])
+        if "$datetime" in obj:
+            return datetime.fromisoformat(obj["$datetime"])
+    return obj
+
+
+def _connect(path: Optional[str] = None) -> sqlite3.Connection:
+    conn = sqlite3.connect(path or config.OUTBOX_PATH, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=FULL")
+    conn.executescript(OUTBOX_SCHEMA)
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(outbox)")]
+    if "record_key" not in columns:
+        # Spool files written before keyed records existed
+        conn.execute("ALTER TABLE outbox ADD COLUMN record_key TEXT")
+    conn.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS outbox_record_key_idx "
+        "ON outbox (source, record_key)"
+    )
+    return conn
+
+
+def spool(
+    source: str,
+    records: List[dict],
+    path: Optional[str] = None,
+    key: Optional[str] = None
+) -> List[int]:
+    """
+    Durably append records for a source in one transaction.
+
+    With a key, each record is stored under str(record[key]); a pending
+    record of the same source and key is overwritten and keeps its id.
+
+    Returns:
+        List[int]: Outbox ids to ack() once the records are stored, or an
+                   empty list if nothing was spooled.
+    """
+    if not records:
+        return []
+    try:
+        with closing(_connect(path)) as conn, conn:
+            ids = []
+            for record in records:
+                payload = json.dumps(record, default=_encode)
+                if key is None:
+                    cursor = conn.execute(
+                        "INSERT INTO outbox (source, payload) VALUES (?, ?)",
+                        (source, payload),
+                    )
+                    ids.append(cursor.lastrowid)
+                    continue
+                row = conn.execute(
+                    "INSERT INTO outbox (source, record_key, payload) VALUES (?, ?, ?) "
+                    "ON CONFLICT (source, record_key) DO UPDATE SET "
+                    "payload = excluded.payload, created_at = CURRENT_TIMESTAMP "
+                    "RETURNING id",
+                    (source, str(record[key]), payload),
+                ).fetchone()
+                ids.append(row[0])
+    except (sqlite3.Error, KeyError, TypeError, ValueError) as e:
+        logger.error(f"Failed to spool {len(records)} {source} records: {str(e)}")
+        return []
+    logger.debug(f"Spooled {len(ids)} {source} records")
+    return ids
+
+
+def ack(ids: List[int], path: Optional[str] = None) -> int:
+    """Delete records whose database write has committed."""
+    if not ids:
+        return 0
+    deleted = 0
+    try:
+        with closing(_connect(path)) as conn, conn:
+            for offset in range(0, len(ids), _DELETE_CHUNK):
+                chunk = ids[offset:offset + _DELETE_CHUNK]
+                cursor = conn.execute(
+                    f"DELETE FROM outbox WHERE id IN ({', '.join('?' * len(chunk))})",
+                    chunk,
+                )
+                deleted += cursor.rowcount
+    except sqlite3.Error as e:
+        logger.error(f"Failed to ack {len(ids)} outbox records: {str(e)}")
+    return deleted
+
+
+def pending(
+    source: str,
+    limit: Optional[int] = None,
+    after_id: int = 0,
+    path: Optional[str] = None
+) -> List[Tuple[int, dict]]:
+    """Spooled (id, record) pairs for a source, oldest first."""
+    query = "SELECT id, payload FROM outbox WHERE source = ? AND id > ? ORDER BY id"
+    params: tuple = (source, after_id)
+    if limit is not None:
+        query += " LIMIT ?"
+        params += (limit,)
+    with closing(_connect(path)) as conn:
+        rows = conn.execute(query, params).fetchall()
+    return [(record_id, json.loads(payload, object_hook=_decode)) for record_id, payload in rows]
+
+
+def pending_count(source: Optional[str] = None, path: Optional[str] = None) -> int:
+    """Number of records waiting in the spool (for one source or all)."""
+    try:
+        with closing(_connect(path)) as conn:
+            if source is None:
+                return conn.execute("SELECT count(*) FROM outbox").fetchone()[0]
+            return conn.execute(
+                "SELECT count(*) FROM outbox WHERE source = ?", (source,)
+            ).fetchone()[0]
+    except sqlite3.Error as e:
+        logger.error(f"Failed to read outbox: {str(e)}")
+        return 0
+
+
+def replay(
+    source: str,
+    store: Callable[[List[dict]], object],
+    batch_size: int = OUTBOX_BATCH_SIZE,
+    path: Optional[str] = None
+) -> int:
+    """
+    Hand spooled records to `store` in batches, acking each batch it accepts.
+
+    `store` must raise if the batch was not committed; replay then stops and
+    leaves that batch and everything after it for the next run.
+
+    Returns:
+        int: Number of records replayed and removed from the spool.
+    """
+    replayed = 0
+    last_id = 0
+    while True:
+        try:
+            batch = pending(source, limit=batch_size, after_id=last_id, path=path)
+        except sqlite3.Error as e:
+            logger.error(f"Failed to read {source} outbox: {str(e)}")
+            break
+        if not batch:
+            break
+        ids = [record_id for record_id, _ in batch]
+        try:
+            store([record for _, record in batch])
+        except Exception as e:
+            logger.error(
+                f"Replaying {len(batch)} spooled {source} records failed: {str(e)}"
+            )
+            break
+        ack(ids, path=path)
+        replayed += len(batch)
+        last_id = ids[-1]
+
+    if replayed:
+        logger.info(f"Replayed {replayed} spooled {source} records")
+    return replayed
+
+
+def get_mark(source: str, path: Optional[str] = None) -> Optional[str]:
+    """A per-source value kept next to the spool, e.g. how far an offline fetch got."""
+    try:
+        with closing(_connect(path)) as conn:
+            row = conn.execute(
+                "SELECT value FROM outbox_marks WHERE source = ?", (source,)
+            ).fetchone()
+    except sqlite3.Error as e:
+        logger.error(f"Failed to read outbox mark for {source}: {str(e)}")
+        return None
+    return row[0] if row else None
+
+
+def set_mark(source: str, value: Optional[str], path: Optional[str] = None) -> None:
+    """Store (or with None, clear) a source's mark."""
+    try:
+        with closing(_connect(path)) as conn, conn:
+            if value is None:
+                conn.execute("DELETE FROM outbox_marks WHERE source = ?", (source,))
+            else:
+                conn.execute(
+                    "INSERT INTO outbox_marks (source, value) VALUES (?, ?) "
+                    "ON CONFLICT (source) DO UPDATE SET value = excluded.value",
+                    (source, value),
+                )
+    except sqlite3.Error as e:
+        logger.error(f"Failed to save outbox mark for {source}: {str(e)}")
@@ -2,13 +2,15 @@
 import os
 import logging
 import argparse
-from tweepy import API, OAuthHandler
-from instagram_graph_api import InstagramGraphAPI
 
 logger = logging.getLogger(__name__)
 
 
 def post_twitter(image_path, message):
+    # Imported here so loading this module (e.g. for `cli post`) doesn't
+    # need every client library installed
+    from tweepy import API, OAuthHandler
+
     auth = OAuthHandler(
         os.getenv("TWITTER_API_KEY"),
         os.getenv("TWITTER_API_SECRET")
@@ -27,6 +29,8 @@ def post_twitter(image_path, message):
 
 
 def post_instagram(image_path, message):
+    from instagram_graph_api import InstagramGraphAPI
+
     api = InstagramGraphAPI(
         user_id=os.getenv("INSTAGRAM_USER_ID"),
         access_token=os.getenv("INSTAGRAM_PAGE_ACCESS_TOKEN")
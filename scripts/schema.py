@@ -0,0 +1,47 @@
+# scripts/schema.py
+"""
+Idempotent schema setup for tables and columns added by the scripts.
+Each module owns its DDL (see create_*_query functions); this just runs them.
+"""
+
+import logging
+from typing import Callable, List
+
+from psycopg2.extensions import connection
+
+from scripts.backfill import create_backfill_checkpoints_table_query
+from scripts.database import (
+    create_sync_state_table_query,
+    create_workout_dedup_query
+)
+from scripts.habit_analytics import create_habit_streaks_table_query
+from scripts.habit_fetcher import create_habit_analytics_date_index_query
+from scripts.toggl_integration import create_toggl_sync_tables_query
+from scripts.toggl_projects import create_toggl_projects_table_query
+from scripts.toggl_rollups import create_toggl_rollups_table_query
+from scripts.training_load import create_training_load_tables_query
+from scripts.vo2max import create_vo2max_table_query
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_QUERIES: List[Callable[[], str]] = [
+    create_vo2max_table_query,
+    create_workout_dedup_query,
+    create_sync_state_table_query,
+    create_toggl_sync_tables_query,
+    create_toggl_projects_table_query,
+    create_habit_streaks_table_query,
+    create_habit_analytics_date_index_query,
+    create_training_load_tables_query,
+    create_toggl_rollups_table_query,
+    create_backfill_checkpoints_table_query,
+]
+
+
+def ensure_schema(conn: connection) -> None:
+    """Run every CREATE/ALTER ... IF NOT EXISTS statement in one round-trip."""
+    with conn.cursor() as cur:
+        cur.execute("\n".join(query() for query in SCHEMA_QUERIES))
+    if not conn.autocommit:
+        conn.commit()
+    logger.info(f"Schema ensured ({len(SCHEMA_QUERIES)} definitions)")
@@ -0,0 +1,277 @@
+# scripts/serializer.py
+"""
+Column-typed JSON serialization for query results.
+
+Instead of checking every value of every row (isinstance/hasattr per cell),
+a RowPlan is compiled once per result set: each column gets a converter
+picked from cursor.description type codes or, for plain dicts, from the
+first rows' values (dates/timestamps -> ISO strings, numerics -> float,
+everything else passed through). Converting a row then walks that short
+(column, key, converter) list, with no per-cell type checks.
+
+Rows are written straight to a JSON byte stream in batches, either as an
+array of objects (layout="rows") or one array per field (layout="columns",
+which drops the repeated keys). orjson is used when installed; otherwise
+the stdlib encoder with compact separators. Both produce equivalent JSON,
+though float formatting can differ (e.g. 1e+16 vs 1e16). NaN and Infinity
+aren't valid JSON; both backends write them as null.
+
+Columns are assumed to hold one type each, as database columns do. A row
+that doesn't fit the plan (different keys, unexpected type) is converted
+value by value instead.
+"""
+
+import datetime
+import json
+import logging
+import math
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence
+
+try:
+    import orjson
+except ImportError:  # optional fast backend
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+Converter = Optional[Callable[[Any], Any]]
+
+# Rows encoded per backend call
+ENCODE_BATCH_ROWS = 1000
+
+# Rows inspected to type columns whose first value is None
+PLAN_SAMPLE_ROWS = 100
+
+LAYOUTS = ("rows", "columns")
+
+# psycopg2 type OIDs (cursor.description type_code)
+_TEMPORAL_OIDS = frozenset({1082, 1114, 1184})  # date, timestamp, timestamptz
+_NUMERIC_OIDS = frozenset({1700})  # numeric -> Decimal
+
+
+def convert_value(value: Any) -> Any:
+    """Per-value conversion (the uncompiled path)."""
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    if hasattr(value, "is_finite") and callable(getattr(value, "is_finite")):
+        return float(value)
+    return value
+
+
+def _iso(value: Any) -> Any:
+    return None if value is None else value.isoformat()
+
+
+def _to_float(value: Any) -> Any:
+    return None if value is None else float(value)
+
+
+def converter_for_value(value: Any) -> Converter:
+    """Converter for a column whose sample value is `value` (None = as is)."""
+    if value is None:
+        return convert_value
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return _iso
+    if hasattr(value, "is_finite") and callable(getattr(value, "is_finite")):
+        return _to_float
+    return None
+
+
+def converter_for_type_code(type_code: Any) -> Converter:
+    """Converter for a Postgres column type OID (None = as is)."""
+    if type_code in _TEMPORAL_OIDS:
+        return _iso
+    if type_code in _NUMERIC_OIDS:
+        return _to_float
+    return None
+
+
+def _compile(
+    columns: Sequence[str],
+    converters: Sequence[Converter],
+    keys: Sequence[Any],
+    as_dict: bool
+) -> Callable[[Any], Any]:
+    """
+    Row function `row -> {column: converter(row[key]), ...}` (or a tuple of
+    the values); columns without a converter are copied as is. Keys are
+    column names for dict rows or positions for tuple rows.
+    """
+    steps = list(zip(columns, keys, converters))
+    if as_dict:
+        return lambda row: {
+            column: row[key] if converter is None else converter(row[key])
+            for column, key, converter in steps
+        }
+    return lambda row: tuple([
+        row[key] if converter is None else converter(row[key])
+        for _, key, converter in steps
+    ])
+
+
+class RowPlan:
+    """
+    Compiled per-column conversion for one result set. With sort_keys the
+    output columns are sorted like json.dumps(sort_keys=True); tuple rows
+    are read in their original positions.
+    """
+
+    def __init__(
+        self,
+        columns: Sequence[str],
+        converters: Sequence[Converter],
+        sort_keys: bool = False
+    ):
+        order = sorted(range(len(columns)), key=lambda i: columns[i]) if sort_keys \
+            else list(range(len(columns)))
+        self.columns = [columns[i] for i in order]
+        self.converters = [converters[i] for i in order]
+        self._width = len(columns)
+        self._dict_from_mapping = _compile(self.columns, self.converters, self.columns, True)
+        self._values_from_mapping = _compile(self.columns, self.converters, self.columns, False)
+        self._dict_from_tuple = _compile(self.columns, self.converters, order, True)
+        self._values_from_tuple = _compile(self.columns, self.converters, order, False)
+
+    @classmethod
+    def from_rows(cls, rows: Sequence[Dict], sort_keys: bool = False) -> "RowPlan":
+        """Plan for dict rows, typed from the first row (None columns from a sample)."""
+        first = rows[0]
+        columns = list(first)
+        converters = [converter_for_value(first[column]) for column in columns]
+        for index, column in enumerate(columns):
+            if converters[index] is not convert_value:
+                continue
+            for row in rows[1:PLAN_SAMPLE_ROWS]:
+                value = row.get(column)
+                if value is not None:
+                    converters[index] = converter_for_value(value)
+                    break
+        return cls(columns, converters, sort_keys)
+
+    @classmethod
+    def from_description(cls, description: Sequence, sort_keys: bool = False) -> "RowPlan":
+        """Plan from psycopg2 cursor.description (name, type_code, ...)."""
+        columns = [column[0] for column in description]
+        converters = [converter_for_type_code(column[1]) for column in description]
+        return cls(columns, converters, sort_keys)
+
+    def to_dict(self, row: Any) -> Dict:
+        """Converted row as a dict in output column order."""
+        if isinstance(row, dict):
+            if len(row) == self._width:
+                try:
+                    return self._dict_from_mapping(row)
+                except (KeyError, AttributeError, TypeError, ValueError):
+                    pass
+            return {key: convert_value(value) for key, value in row.items()}
+        return self._dict_from_tuple(row)
+
+    def to_values(self, row: Any) -> tuple:
+        """Converted row values in output column order."""
+        if isinstance(row, dict):
+            if len(row) == self._width:
+                try:
+                    return self._values_from_mapping(row)
+                except (KeyError, AttributeError, TypeError, ValueError):
+                    pass
+            return tuple(convert_value(row.get(column)) for column in self.columns)
+        return self._values_from_tuple(row)
+
+
+def format_rows(rows: Sequence[Dict], sort_keys: bool = False) -> List[Dict]:
+    """Convert dict rows for JSON with a compiled plan."""
+    if not rows:
+        return []
+    plan = RowPlan.from_rows(rows, sort_keys)
+    to_dict = plan.to_dict
+    return [to_dict(row) for row in rows]
+
+
+def _finite(obj: Any) -> Any:
+    """Replace NaN/Infinity floats with None, as orjson writes them (null)."""
+    if isinstance(obj, float):
+        return obj if math.isfinite(obj) else None
+    if isinstance(obj, dict):
+        return {key: _finite(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_finite(value) for value in obj]
+    return obj
+
+
+def _encode(obj: Any) -> bytes:
+    """Compact JSON bytes of already-converted values."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    try:
+        text = json.dumps(obj, separators=(",", ":"), ensure_ascii=False, allow_nan=False)
+    except ValueError:
+        # Only rescan for non-finite floats when there are some
+        text = json.dumps(_finite(obj), separators=(",", ":"), ensure_ascii=False)
+    return text.encode("utf-8")
+
+
+def iter_json(
+    batches: Iterable[Sequence],
+    description: Optional[Sequence] = None,
+    layout: str = "rows",
+    sort_keys: bool = False
+) -> Iterator[bytes]:
+    """
+    Encode batches of rows (dicts, or tuples with a cursor description) as
+    one JSON document, yielding byte chunks as it goes.
+
+    layout="rows" writes [{...}, ...]; layout="columns" writes
+    {"column": [values...], ...}, which has to collect every converted value
+    before writing (still no per-row dicts).
+    """
+    if layout not in LAYOUTS:
+        raise ValueError(f"Unknown layout {layout!r}; expected one of {LAYOUTS}")
+    plan: Optional[RowPlan] = None
+    if description is not None:
+        plan = RowPlan.from_description(description, sort_keys)
+
+    def batched() -> Iterator[Sequence]:
+        # Re-chunk to ENCODE_BATCH_ROWS so backend calls stay large but bounded
+        for batch in batches:
+            for offset in range(0, len(batch), ENCODE_BATCH_ROWS):
+                yield batch[offset:offset + ENCODE_BATCH_ROWS]
+
+    if layout == "rows":
+        yield b"["
+        first = True
+        for batch in batched():
+            if not batch:
+                continue
+            if plan is None:
+                plan = RowPlan.from_rows(batch, sort_keys)
+            chunk = _encode([plan.to_dict(row) for row in batch])[1:-1]
+            yield chunk if first else b"," + chunk
+            first = False
+        yield b"]"
+        return
+
+    columns: Optional[List[List]] = None
+    for batch in batched():
+        if not batch:
+            continue
+        if plan is None:
+            plan = RowPlan.from_rows(batch, sort_keys)
+        if columns is None:
+            columns = [[] for _ in plan.columns]
+        for values, converted in zip(columns, zip(*(plan.to_values(row) for row in batch))):
+            values.extend(converted)
+    if plan is None:
+        yield b"{}"
+        return
+    yield _encode(dict(zip(plan.columns, columns or [[] for _ in plan.columns])))
+
+
+def dumps(
+    rows: Sequence,
+    description: Optional[Sequence] = None,
+    layout: str = "rows",
+    sort_keys: bool = False
+) -> bytes:
+    """JSON bytes for a list of rows (see iter_json)."""
+    return b"".join(iter_json([rows], description, layout, sort_keys))
+
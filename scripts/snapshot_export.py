@@ -0,0 +1,249 @@
+# scripts/snapshot_export.py
+"""
+Static JSON snapshot exporter for the dashboard.
+
+Writes one compact, content-hashed JSON file per panel and date range into
+the Next.js public directory, plus a manifest.json mapping each panel/range
+to its current file. The site can then load a single cached static file per
+panel instead of querying Supabase from the browser, and keeps working when
+the database is down.
+
+A snapshot is only rewritten when its content hash changes; the file it
+replaces is removed once the manifest pointing at its successor is saved.
+In CI the export runs before the Next.js build, which copies public/ into
+the static export, so the snapshots are deployed to GitHub Pages with the
+site and served from /data/.
+
+Rows are streamed from a server-side cursor through the column-typed
+serializer straight into a temp file that is hashed as it is written, so
+memory stays bounded by one fetch batch however large a range is. With
+SNAPSHOT_LAYOUT=columns snapshots hold one array per field instead of an
+array of objects; the manifest records each snapshot's layout.
+"""
+
+import hashlib
+import json
+import logging
+import os
+from datetime import date, datetime, timedelta, timezone
+from itertools import chain
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from psycopg2.extensions import connection
+
+import scripts.config as config
+from scripts import serializer
+from scripts.database_utils import fetch_batches, server_cursor
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = "manifest.json"
+
+# Range label -> days back from today (None = all history)
+RANGES: Dict[str, Optional[int]] = {"7d": 7, "30d": 30, "90d": 90, "365d": 365}
+
+# Panel -> (query, date-filtered?). Queries select only the columns the
+# panels render and take (start_date, end_date) when date-filtered.
+PANEL_QUERIES: Dict[str, Tuple[str, bool]] = {
+    "workouts": ("""
+        SELECT date, activity_type, title, distance, calories, time,
+               avg_hr, max_hr, favorite
+        FROM workout_stats
+        WHERE date >= %s AND date < %s
+        ORDER BY date DESC
+    """, True),
+    "habits": ("""
+        SELECT habit_date, habit_name, completed
+        FROM habit_tracking
+        WHERE habit_date >= %s AND habit_date < %s
+        ORDER BY habit_date, habit_name
+    """, True),
+    "toggl": ("""
+        SELECT bucket_start AS date, key AS project_name,
+               total_seconds AS duration_seconds
+        FROM toggl_rollups
+        WHERE period = 'day' AND dimension = 'project'
+          AND bucket_start >= %s AND bucket_start < %s
+        ORDER BY bucket_start, key
+    """, True),
+    "vo2max": ("""
+        SELECT test_date, vo2max_value, notes
+        FROM vo2max_tests
+        ORDER BY test_date
+    """, False),
+}
+
+
+def encode_snapshot(rows: List[Dict], layout: Optional[str] = None) -> bytes:
+    """Compact, deterministic JSON encoding of a snapshot."""
+    return serializer.dumps(rows, layout=layout or config.SNAPSHOT_LAYOUT, sort_keys=True)
+
+
+def _snapshot_chunks(cur: Any, meta: Dict, layout: str) -> Iterator[bytes]:
+    """
+    Encode an executed cursor's rows as snapshot JSON, counting them into
+    meta["rows"] as they stream past.
+    """
+    batches = fetch_batches(cur)
+    # A named cursor only has a description after its first fetch
+    first = next(batches, [])
+    meta["rows"] = 0
+
+    def counted() -> Iterator[List[tuple]]:
+        for batch in chain([first], batches):
+            meta["rows"] += len(batch)
+            yield batch
+
+    yield from serializer.iter_json(
+        counted(), cur.description, layout=layout, sort_keys=True
+    )
+
+
+def load_manifest(output_dir: str) -> Dict:
+    """Read the existing manifest, or an empty one."""
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {"snapshots": {}}
+
+
+def _write_atomic(path: str, payload: bytes) -> None:
+    """Write via a temp file and rename so readers never see partial files."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(payload)
+    os.replace(tmp_path, path)
+
+
+def write_snapshot(
+    output_dir: str,
+    manifest: Dict,
+    panel: str,
+    range_label: str,
+    payload: Union[bytes, Iterable[bytes]],
+    meta: Dict,
+    stale: Optional[List[str]] = None
+) -> bool:
+    """
+    Store a snapshot under a content-hashed name unless the manifest already
+    points at identical content. Returns True if a file was written; the
+    manifest entry's meta is refreshed either way.
+
+    The payload may be a stream of chunks; it is written to a temp file and
+    hashed on the way, then renamed into place or discarded if unchanged.
+    The file a new snapshot replaces is not deleted here but appended to
+    `stale`, to be removed once the updated manifest is saved.
+    """
+    if isinstance(payload, bytes):
+        payload = [payload]
+    tmp_path = os.path.join(output_dir, f".{panel}-{range_label}.json.tmp")
+    hasher = hashlib.sha256()
+    size = 0
+    try:
+        with open(tmp_path, "wb") as f:
+            for chunk in payload:
+                f.write(chunk)
+                hasher.update(chunk)
+                size += len(chunk)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+    digest = hasher.hexdigest()[:16]
+    panel_entries = manifest["snapshots"].setdefault(panel, {})
+    current = panel_entries.get(range_label)
+    file_name = f"{panel}-{range_label}.{digest}.json"
+
+    if current and current["hash"] == digest and os.path.exists(
+        os.path.join(output_dir, current["file"])
+    ):
+        os.remove(tmp_path)
+        current.update(meta)
+        return False
+
+    os.replace(tmp_path, os.path.join(output_dir, file_name))
+    if current and current["file"] != file_name and stale is not None:
+        stale.append(current["file"])
+
+    panel_entries[range_label] = dict(
+        meta,
+        file=file_name,
+        hash=digest,
+        bytes=size,
+        updated_at=datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    )
+    return True
+
+
+def export_snapshots(
+    conn: connection,
+    output_dir: Optional[str] = None,
+    today: Optional[date] = None
+) -> Dict[str, int]:
+    """
+    Export every panel/range snapshot and update the manifest.
+
+    A panel whose query fails keeps its previous snapshot. The manifest is
+    only rewritten when a snapshot or its meta changed, and replaced files
+    are deleted after it is saved.
+
+    Returns:
+        Counts of 'written', 'unchanged' and 'failed' snapshots.
+    """
+    output_dir = output_dir or config.SNAPSHOT_DIR
+    layout = config.SNAPSHOT_LAYOUT
+    today = today or datetime.now().date()
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = load_manifest(output_dir)
+    saved = json.dumps(manifest, sort_keys=True)
+    stale: List[str] = []
+    counts = {"written": 0, "unchanged": 0, "failed": 0}
+
+    for panel, (query, dated) in PANEL_QUERIES.items():
+        ranges = RANGES if dated else {"all": None}
+        for range_label, days in ranges.items():
+            meta: Dict[str, Any] = {"layout": layout}
+            params = None
+            if days is not None:
+                start = today - timedelta(days=days)
+                end = today + timedelta(days=1)
+                params = (start, end)
+                meta.update(start=start.isoformat(), end=today.isoformat())
+            try:
+                with server_cursor(conn) as cur:
+                    cur.execute(query, params)
+                    written = write_snapshot(
+                        output_dir, manifest, panel, range_label,
+                        _snapshot_chunks(cur, meta, layout), meta, stale
+                    )
+            except Exception as e:
+                logger.error(f"Snapshot {panel}/{range_label} failed: {str(e)}")
+                counts["failed"] += 1
+                if not conn.autocommit:
+                    conn.rollback()
+                continue
+            if written:
+                counts["written"] += 1
+            else:
+                counts["unchanged"] += 1
+
+    if json.dumps(manifest, sort_keys=True) != saved:
+        manifest["generated_at"] = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        _write_atomic(
+            os.path.join(output_dir, MANIFEST_NAME),
+            json.dumps(manifest, indent=1, sort_keys=True).encode("utf-8")
+        )
+    # Only now does no saved manifest point at the replaced files
+    for file_name in stale:
+        try:
+            os.remove(os.path.join(output_dir, file_name))
+        except FileNotFoundError:
+            pass
+
+    logger.info(
+        f"Snapshots: {counts['written']} written, {counts['unchanged']} unchanged, "
+        f"{counts['failed']} failed"
+    )
+    return counts
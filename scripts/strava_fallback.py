@@ -1,42 +1,248 @@
 # scripts/strava_fallback.py
 """
-Strava fallback fetch if Garmin fails.
-Requires 'stravalib': pip install stravalib
+Strava as a hot standby workout source.
+
+Activities are paged from the Strava REST API (GET /athlete/activities,
+STRAVA_PAGE_SIZE per page) through the shared rate-limited HTTP client and
+normalized into the Garmin activity shape, so they are stored through
+database.activity_to_row like Garmin's. The sync runs alongside the Garmin
+one: workout_dedup.store_standby_workouts skips every workout already
+stored (matched on start time, duration and distance), and a later Garmin
+store replaces the Strava-only rows it matches, so a workout recorded by
+both services is stored once.
 """
 
+import json
 import logging
-from typing import Dict, Optional
-from datetime import datetime
-from stravalib.client import Client
+import re
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Dict, Iterator, List, Optional
+
+import requests
+from psycopg2.extensions import connection
+
 import scripts.config as config
+from scripts import metrics
+from scripts.database import get_sync_cursor, set_sync_cursor
+from scripts.http_client import create_session
+from scripts.workout_dedup import store_standby_workouts
 
 logger = logging.getLogger(__name__)
 
+STRAVA_API_URL = "https://www.strava.com/api/v3"
+STRAVA_TOKEN_URL = "https://www.strava.com/oauth/token"
+
+# Strava's largest allowed per_page
+STRAVA_PAGE_SIZE = 200
+
+# sync_state key holding the last day synced
+STRAVA_SYNC_CURSOR = "strava"
+
+# Strava sport_type -> Garmin activityType.typeKey
+STRAVA_TYPE_KEYS = {
+    "Run": "running",
+    "TrailRun": "trail_running",
+    "VirtualRun": "treadmill_running",
+    "Ride": "cycling",
+    "VirtualRide": "virtual_ride",
+    "MountainBikeRide": "mountain_biking",
+    "GravelRide": "gravel_cycling",
+    "EBikeRide": "e_bike_fitness",
+    "Walk": "walking",
+    "Hike": "hiking",
+    "Swim": "lap_swimming",
+    "Rowing": "rowing",
+    "WeightTraining": "strength_training",
+    "Workout": "other",
+    "Yoga": "yoga",
+    "Elliptical": "elliptical",
+    "StairStepper": "stair_climbing",
+}
+
+_CAMEL_RE = re.compile(r"(?<!^)(?=[A-Z])")
 
-def strava_fetch_daily() -> Optional[Dict]:
-    client = Client()
-    refresh_resp = client.refresh_access_token(
-        client_id=config.STRAVA_CLIENT_ID,
-        client_secret=config.STRAVA_CLIENT_SECRET,
-        refresh_token=config.STRAVA_REFRESH_TOKEN
+
+def create_strava_session() -> Optional[requests.Session]:
+    """
+    Rate-limited session authorized with a fresh access token, or None if
+    credentials are missing or the token refresh fails.
+    """
+    if not (config.STRAVA_CLIENT_ID and config.STRAVA_CLIENT_SECRET
+            and config.STRAVA_REFRESH_TOKEN):
+        logger.warning("Strava credentials not found.")
+        return None
+    session = create_session(
+        requests_per_second=config.STRAVA_REQUESTS_PER_SECOND, burst=5
     )
-    client.access_token = refresh_resp["access_token"]
-    activities = client.get_activities(limit=1)
-    latest = next(activities, None)
-    if not latest:
+    try:
+        resp = session.post(STRAVA_TOKEN_URL, data={
+            "client_id": config.STRAVA_CLIENT_ID,
+            "client_secret": config.STRAVA_CLIENT_SECRET,
+            "grant_type": "refresh_token",
+            "refresh_token": config.STRAVA_REFRESH_TOKEN,
+        })
+        if resp.status_code != 200:
+            logger.error(f"Strava token refresh failed: {resp.status_code} - {resp.text}")
+            return None
+        access_token = resp.json()["access_token"]
+    except (requests.RequestException, KeyError, ValueError) as e:
+        logger.error(f"Strava token refresh failed: {str(e)}")
         return None
-    distance_m = latest.distance.num  # meters
-    moving_time_s = latest.moving_time.total_seconds()
-    duration_h = moving_time_s / 3600.0
-    met = 7.0
-    avg_speed = distance_m / moving_time_s if moving_time_s > 0 else 0
-    if avg_speed > 2.8:  # ~10 km/h
-        met = 10.0
-    return {
-        "date": datetime.now().strftime("%Y-%m-%d"),
-        "steps": None,
-        "distance": distance_m,
-        "calories": getattr(latest, "calories", None),
-        "resting_hr": None,
-        "met_hours": met * duration_h
+    session.headers["Authorization"] = f"Bearer {access_token}"
+    return session
+
+
+def normalize_strava_activity(activity: dict) -> dict:
+    """
+    Map a Strava SummaryActivity to the Garmin activity dict fields that
+    activity_to_row reads. Raises KeyError/ValueError on bad input.
+    """
+    sport = activity.get("sport_type") or activity.get("type") or "Workout"
+    type_key = STRAVA_TYPE_KEYS.get(sport) or _CAMEL_RE.sub("_", sport).lower()
+    # start_date_local is local wall time despite its 'Z' suffix
+    start = datetime.strptime(activity["start_date_local"], "%Y-%m-%dT%H:%M:%SZ")
+
+    calories = activity.get("calories")
+    if calories is None and activity.get("kilojoules"):
+        # Summary activities carry work, not calories; kcal ~ kJ for cycling
+        calories = round(activity["kilojoules"])
+
+    normalized = {
+        "activityType": {"typeKey": type_key},
+        "startTimeLocal": start.strftime("%Y-%m-%d %H:%M:%S"),
+        "favorite": False,
+        "activityName": activity.get("name") or sport,
+        "distance": float(activity.get("distance") or 0),  # meters
+        "calories": calories,
+        # Garmin's duration is timer time, which includes stops like elapsed_time
+        "duration": float(activity.get("elapsed_time") or activity.get("moving_time") or 0),
+        "stravaActivityId": activity["id"],
     }
+    if activity.get("average_heartrate") is not None:
+        normalized["averageHR"] = activity["average_heartrate"]
+    if activity.get("max_heartrate") is not None:
+        normalized["maxHR"] = activity["max_heartrate"]
+    cadence = activity.get("average_cadence")
+    if cadence:
+        if type_key == "running":
+            # Strava counts strides (one foot), Garmin steps
+            normalized["averageRunningCadenceInStepsPerMinute"] = cadence * 2
+        else:
+            normalized["averageCadence"] = cadence
+    return normalized
+
+
+def _epoch(day: date) -> int:
+    return int(datetime.combine(day, time.min, tzinfo=timezone.utc).timestamp())
+
+
+# Strava filters on UTC start times while ranges are local days; a day of
+# slack each way covers every UTC offset
+_UTC_SLACK = timedelta(days=1)
+
+
+def iter_strava_activity_pages(
+    session: requests.Session,
+    start_date: date,
+    end_date: date,
+    per_page: int = STRAVA_PAGE_SIZE
+) -> Iterator[List[dict]]:
+    """
+    Yield pages of normalized activities starting in [start_date, end_date)
+    (local days), oldest first, until a short page ends the range. Activities
+    that can't be normalized are logged and skipped; a failed request is
+    logged and raised as requests.HTTPError.
+    """
+    first_start = datetime.combine(start_date, time.min)
+    end_start = datetime.combine(end_date, time.min)
+    page = 1
+    while True:
+        with metrics.stage("fetch"):
+            resp = session.get(f"{STRAVA_API_URL}/athlete/activities", params={
+                "after": _epoch(start_date - _UTC_SLACK),
+                "before": _epoch(end_date + _UTC_SLACK),
+                "page": page,
+                "per_page": per_page,
+            })
+            if not resp.ok:
+                logger.error(f"Strava fetch failed: {resp.status_code} - {resp.text}")
+                resp.raise_for_status()
+            data = resp.json()
+            metrics.count("rows_in", len(data))
+        activities = []
+        for activity in data:
+            try:
+                normalized = normalize_strava_activity(activity)
+            except (KeyError, TypeError, ValueError) as e:
+                logger.error(f"Failed to parse Strava activity {activity.get('id', 'N/A')}: {e!r}")
+                continue
+            start = datetime.strptime(normalized["startTimeLocal"], "%Y-%m-%d %H:%M:%S")
+            if first_start <= start < end_start:
+                activities.append(normalized)
+        logger.info(f"Fetched {len(data)} Strava activities (page {page})")
+        if activities:
+            yield activities
+        if len(data) < per_page:
+            return
+        page += 1
+
+
+def sync_strava_range(
+    conn: connection,
+    session: requests.Session,
+    start_date: date,
+    end_date: date
+) -> Dict[str, int]:
+    """
+    Fetch Strava activities for [start_date, end_date) page by page and store
+    those no stored workout matches. Fetch errors propagate; pages stored
+    before them stay stored.
+
+    Returns:
+        Dict with 'fetched', 'stored', 'duplicates' and 'rejected' counts.
+    """
+    totals = {"fetched": 0, "stored": 0, "duplicates": 0, "rejected": 0}
+    for activities in iter_strava_activity_pages(session, start_date, end_date):
+        totals["fetched"] += len(activities)
+        with metrics.stage("store"):
+            result = store_standby_workouts(conn, activities)
+            metrics.count("rows_out", result["stored"])
+        totals["stored"] += result["stored"]
+        totals["duplicates"] += result["duplicates"]
+        totals["rejected"] += len(result["rejected"])
+        for activity, reason in result["rejected"]:
+            logger.warning(
+                f"Skipped Strava activity {activity.get('stravaActivityId', 'N/A')}: {reason}"
+            )
+    return totals
+
+
+def sync_strava_daily(conn: connection) -> Optional[Dict[str, int]]:
+    """
+    Sync Strava activities since the last sync (re-reading its last day, as
+    uploads can arrive late) or STRAVA_LOOKBACK_DAYS ago. Returns the
+    sync_strava_range totals, or None if Strava couldn't be reached.
+    """
+    session = create_strava_session()
+    if session is None:
+        return None
+    today = date.today()
+    saved = get_sync_cursor(conn, STRAVA_SYNC_CURSOR)
+    if saved:
+        start_date = date.fromisoformat(json.loads(saved)["synced_until"]) - timedelta(days=1)
+    else:
+        start_date = today - timedelta(days=config.STRAVA_LOOKBACK_DAYS)
+    end_date = today + timedelta(days=1)
+    logger.info(f"Fetching Strava activities from {start_date} to {end_date}")
+
+    try:
+        totals = sync_strava_range(conn, session, start_date, end_date)
+    except requests.RequestException as e:
+        logger.error(f"Strava sync failed: {str(e)}")
+        return None
+    set_sync_cursor(conn, STRAVA_SYNC_CURSOR, json.dumps({"synced_until": today.isoformat()}))
+    logger.info(
+        f"Stored {totals['stored']} of {totals['fetched']} Strava activities, "
+        f"{totals['duplicates']} already stored"
+    )
+    return totals
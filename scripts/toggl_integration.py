@@ -1,54 +1,93 @@
+import argparse
 import logging
-from datetime import datetime, timedelta
-import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+import json
 import requests
-from typing import List, Dict
+from typing import Iterable, List, Dict, Optional, Tuple
 import psycopg2
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
+import scripts.config as config
+from scripts import db_pool, metrics, outbox
+from scripts.http_client import DEFAULT_RETRY_STATUSES, create_session
+from scripts.database import get_sync_cursor, set_sync_cursor, values_placeholders
+from scripts.toggl_projects import get_project_mapping, resolve_workspace_id
+from scripts.toggl_rollups import affected_dates, refresh_rollup_buckets
+
 logger = logging.getLogger(__name__)
 
 
-def fetch_toggl_entries(session: requests.Session, since_days: int = 7) -> List[dict]:
+def fetch_toggl_entries(
+    session: requests.Session,
+    since_days: int = 7,
+    modified_since: Optional[int] = None,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None
+) -> Optional[List[dict]]:
     """
-    Fetch time entries from the Toggl API for the specified number of days.
+    Fetch time entries from the Toggl API for the specified number of days,
+    an explicit [start_date, end_date) range, or every entry modified after
+    a Unix timestamp.
 
     Args:
         session: Authenticated requests.Session object.
         since_days (int, optional): Number of days to look back for entries.
                                     Defaults to 7.
+        modified_since (int, optional): Unix timestamp for Toggl's `since`
+                                        parameter. When set, since_days is
+                                        ignored and deleted entries are
+                                        returned too.
+        start_date (date, optional): First day of an explicit range; takes
+                                     precedence over since_days.
+        end_date (date, optional): Day after the range. Defaults to tomorrow.
 
     Returns:
-        List[dict]: List of time entries with id, date, duration_seconds,
-                    project_id, tags, and description.
+        Optional[List[dict]]: List of time entries with id, date,
+                              duration_seconds, project_id, tags, description
+                              and deleted, or None if the request failed.
     """
-    start_date = (datetime.utcnow() - timedelta(days=since_days)).strftime(
-        "%Y-%m-%dT00:00:00Z"
-    )
-    end_date = datetime.utcnow().strftime("%Y-%m-%dT23:59:59Z")
-    url = (
-        f"https://api.track.toggl.com/api/v9/me/time_entries?"
-        f"start_date={start_date}&end_date={end_date}"
-    )
+    if modified_since is not None:
+        url = (
+            f"https://api.track.toggl.com/api/v9/me/time_entries?"
+            f"since={modified_since}"
+        )
+    elif start_date is not None:
+        end_date = end_date or (datetime.utcnow().date() + timedelta(days=1))
+        url = (
+            f"https://api.track.toggl.com/api/v9/me/time_entries?"
+            f"start_date={start_date.isoformat()}T00:00:00Z&"
+            f"end_date={end_date.isoformat()}T00:00:00Z"
+        )
+    else:
+        start_date = (datetime.utcnow() - timedelta(days=since_days)).strftime(
+            "%Y-%m-%dT00:00:00Z"
+        )
+        end_date = datetime.utcnow().strftime("%Y-%m-%dT23:59:59Z")
+        url = (
+            f"https://api.track.toggl.com/api/v9/me/time_entries?"
+            f"start_date={start_date}&end_date={end_date}"
+        )
 
     try:
-        resp = session.get(url, timeout=10)
+        resp = session.get(url)
         if resp.status_code != 200:
             logger.error(f"Toggl fetch failed: {resp.status_code} - {resp.text}")
-            return []
+            return None
         data = resp.json()
         if not isinstance(data, list):
             logger.error(f"Expected list, got {type(data)}")
-            return []
+            return None
     except Exception as e:
         logger.error(f"Error fetching entries: {str(e)}")
-        return []
+        return None
 
     entries = []
     for entry in data:
+        if entry.get("server_deleted_at") and "id" in entry:
+            entries.append({"id": entry["id"], "deleted": True})
+            continue
         if "id" not in entry or "start" not in entry:
-            logger.warning(f"Skipping invalid entry: {entry}")
+            logger.warning(f"Skipping invalid entry: {entry.get('id', 'N/A')}")
             continue
         try:
             dt = datetime.fromisoformat(entry["start"].replace("Z", "+00:00"))
@@ -71,135 +110,575 @@ def fetch_toggl_entries(session: requests.Session, since_days: int = 7) -> List[
             "duration_seconds": duration_s,
             "project_id": entry.get("project_id"),
             "tags": tags,
-            "description": entry.get("description", "")
+            "description": entry.get("description", ""),
+            "deleted": False
         })
 
     logger.info(f"Fetched {len(entries)} time entries")
     return entries
 
 
-def fetch_toggl_projects(session: requests.Session, workspace_id: str) -> Dict[int, str]:
+def toggl_date_windows(
+    start_date: date,
+    end_date: date,
+    window_days: int = config.TOGGL_WINDOW_DAYS
+) -> List[Tuple[date, date]]:
+    """Split [start_date, end_date) into consecutive half-open windows."""
+    windows = []
+    window_start = start_date
+    while window_start < end_date:
+        window_end = min(window_start + timedelta(days=window_days), end_date)
+        windows.append((window_start, window_end))
+        window_start = window_end
+    return windows
+
+
+def fetch_toggl_entries_windowed(
+    session: requests.Session,
+    start_date: date,
+    end_date: Optional[date] = None,
+    window_days: int = config.TOGGL_WINDOW_DAYS,
+    workers: int = config.TOGGL_BACKFILL_WORKERS
+) -> Optional[List[dict]]:
     """
-    Fetch project data from Toggl API and return a mapping of project_id to
-    project_name.
+    Fetch a long range as date windows requested concurrently.
 
-    Args:
-        session: Authenticated requests.Session object.
-        workspace_id (str): Toggl workspace ID.
+    A single time_entries request is capped in how much it returns, so the
+    range is split into window_days chunks fetched by `workers` threads. The
+    session's rate limiter is shared, so concurrency only overlaps latency;
+    the request rate stays within Toggl's limit. Entries are merged in window
+    order and deduplicated by id (boundaries can return an entry twice).
 
     Returns:
-        Dict[int, str]: Mapping of project_id to project_name.
+        Optional[List[dict]]: Merged entries, or None if any window failed
+                              (each failed window is logged). A partial
+                              range is never returned: stored as complete,
+                              it would let the caller move its cursor past
+                              the missing days.
     """
-    url = f"https://api.track.toggl.com/api/v9/workspaces/{workspace_id}/projects"
-    try:
-        resp = session.get(url, timeout=10)
-        if resp.status_code != 200:
-            logger.error(f"Failed to fetch projects: {resp.status_code} - "
-                         f"{resp.text}")
-            return {}
-        projects = resp.json()
-        return {p["id"]: p["name"] for p in projects if "id" in p and "name" in p}
-    except Exception as e:
-        logger.error(f"Error fetching projects: {str(e)}")
-        return {}
+    end_date = end_date or (datetime.utcnow().date() + timedelta(days=1))
+    windows = toggl_date_windows(start_date, end_date, window_days)
+    if not windows:
+        return []
+    # Worker threads have no stage of their own; attribute calls to the caller's
+    stage_name = metrics.current_stage()
+
+    def fetch_window(window: Tuple[date, date]) -> Optional[List[dict]]:
+        with metrics.attach(stage_name):
+            return fetch_toggl_entries(session, start_date=window[0], end_date=window[1])
+
+    entries_by_id: Dict[int, dict] = {}
+    failed = 0
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        for window, entries in zip(windows, executor.map(fetch_window, windows)):
+            if entries is None:
+                logger.error(f"Toggl window {window[0]} - {window[1]} failed")
+                failed += 1
+                continue
+            for entry in entries:
+                entries_by_id.setdefault(entry["id"], entry)
+
+    if failed:
+        logger.error(f"{failed} of {len(windows)} Toggl windows failed; discarding the fetch")
+        return None
+    logger.info(
+        f"Fetched {len(entries_by_id)} time entries from {len(windows)} "
+        f"windows ({start_date} - {end_date})"
+    )
+    return list(entries_by_id.values())
+
+
+def create_toggl_sync_tables_query() -> str:
+    """
+    Returns the SQL for the incremental-sync additions: a modified-at column
+    on toggl_entries, a log of entries deleted in Toggl and the entries the
+    store rejected (kept for inspection instead of blocking the sync).
+    """
+    return """
+    ALTER TABLE toggl_entries ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ;
+    CREATE TABLE IF NOT EXISTS toggl_deleted_entries (
+        id BIGINT PRIMARY KEY,
+        deleted_at TIMESTAMPTZ NOT NULL DEFAULT now()
+    );
+    CREATE TABLE IF NOT EXISTS toggl_rejected_entries (
+        id BIGINT PRIMARY KEY,
+        entry JSONB NOT NULL,
+        reason TEXT NOT NULL,
+        rejected_at TIMESTAMPTZ NOT NULL DEFAULT now()
+    );
+    """
+
+
+# Only rows whose content actually differs are rewritten; RETURNING reports
+# inserted rows (xmax = 0) and updated rows, so unchanged ones are implicit.
+TOGGL_UPSERT_SQL = """
+    INSERT INTO toggl_entries (
+        id, date, duration_seconds, project_id, project_name, tags,
+        description, updated_at
+    )
+    VALUES {values}
+    ON CONFLICT (id) DO UPDATE SET
+        date = EXCLUDED.date,
+        duration_seconds = EXCLUDED.duration_seconds,
+        project_id = EXCLUDED.project_id,
+        project_name = EXCLUDED.project_name,
+        tags = EXCLUDED.tags,
+        description = EXCLUDED.description,
+        updated_at = EXCLUDED.updated_at
+    WHERE (
+        toggl_entries.date, toggl_entries.duration_seconds,
+        toggl_entries.project_id, toggl_entries.project_name,
+        toggl_entries.tags, toggl_entries.description
+    ) IS DISTINCT FROM (
+        EXCLUDED.date, EXCLUDED.duration_seconds,
+        EXCLUDED.project_id, EXCLUDED.project_name,
+        EXCLUDED.tags, EXCLUDED.description
+    )
+    RETURNING (xmax = 0) AS inserted
+"""
+
+TOGGL_COLUMN_COUNT = 8
+
+# sync_state key holding the incremental (modified-since) cursor
+TOGGL_SYNC_CURSOR = "toggl"
+
+# Toggl only accepts `since` values within roughly the last three months
+TOGGL_SINCE_MAX_AGE = timedelta(days=90)
+
+# Entries per multi-row INSERT / savepoint
+TOGGL_BATCH_SIZE = 500
+
+# Outbox source name for fetched entries not yet stored
+TOGGL_OUTBOX = "toggl"
+
+
+def _entry_to_row(entry: dict, project_mapping: Dict[int, str]) -> tuple:
+    """Map a fetched time entry to a toggl_entries row tuple."""
+    return (
+        entry["id"],
+        entry["date"],
+        entry["duration_seconds"],
+        entry["project_id"],
+        project_mapping.get(entry["project_id"], "No Project"),
+        entry["tags"],
+        entry["description"],
+        datetime.now(timezone.utc),
+    )
+
+
+def _upsert_rows(cursor, rows: List[tuple]) -> Tuple[int, int]:
+    """Upsert rows in one statement and return (inserted, updated) counts."""
+    cursor.execute(
+        TOGGL_UPSERT_SQL.format(
+            values=values_placeholders(len(rows), TOGGL_COLUMN_COUNT)
+        ),
+        [value for row in rows for value in row],
+    )
+    written = cursor.fetchall()
+    inserted = sum(1 for (is_insert,) in written if is_insert)
+    return inserted, len(written) - inserted
+
 
+def _delete_entries(cursor, entry_ids: List[int]) -> int:
+    """Remove entries deleted in Toggl and record their ids."""
+    cursor.execute(
+        """
+        INSERT INTO toggl_deleted_entries (id)
+        SELECT unnest(%s::bigint[])
+        ON CONFLICT (id) DO NOTHING
+        """,
+        (entry_ids,),
+    )
+    cursor.execute("DELETE FROM toggl_entries WHERE id = ANY(%s)", (entry_ids,))
+    return cursor.rowcount
+
+
+def _record_rejected(cursor, rejected: List[Tuple[dict, str]]) -> None:
+    """Save entries the store rejected, with the reason, by entry id."""
+    cursor.execute(
+        """
+        INSERT INTO toggl_rejected_entries (id, entry, reason)
+        VALUES {values}
+        ON CONFLICT (id) DO UPDATE SET
+            entry = EXCLUDED.entry,
+            reason = EXCLUDED.reason,
+            rejected_at = now()
+        """.format(values=", ".join(["(%s, %s::jsonb, %s)"] * len(rejected))),
+        [
+            value for entry, reason in rejected
+            for value in (entry["id"], json.dumps(entry, default=str), reason)
+        ],
+    )
 
-def store_toggl_entries(conn, entries: List[dict], project_mapping: Dict[int, str]) -> None:
+
+def store_toggl_entries(
+    conn,
+    entries: List[dict],
+    project_mapping: Dict[int, str],
+    batch_size: int = TOGGL_BATCH_SIZE,
+    rollup_dates: Optional[Iterable[date]] = None
+) -> Dict[str, int]:
     """
     Store Toggl entries in the Supabase database, including project names.
 
+    Entries are upserted in multi-row batches inside a single transaction;
+    existing rows are only rewritten when their content changed. Each batch
+    runs under a savepoint: if it fails, only that batch is rolled back and
+    retried row by row, so one bad entry is skipped without losing the rows
+    written before it. Skipped entries are saved to toggl_rejected_entries
+    in the same transaction, and leave it once they are stored. Entries
+    flagged as deleted are removed and recorded in toggl_deleted_entries.
+    With rollup_dates (see toggl_rollups.affected_dates), the rollup buckets
+    of those dates are refreshed in the same transaction, so a sync never
+    commits entries without their rollups.
+
     Args:
         conn: psycopg2 connection to Supabase.
         entries (List[dict]): List of time entries.
         project_mapping (Dict[int, str]): Mapping of project_id to project_name.
+        batch_size (int, optional): Entries per INSERT. Defaults to 500.
+        rollup_dates (Iterable[date], optional): Dates whose rollups to
+                                                 refresh before committing.
+
+    Returns:
+        Dict[str, int]: Counts of 'inserted', 'updated', 'conflicted'
+                        (already stored unchanged), 'deleted' and 'skipped'
+                        (invalid or rejected) entries.
     """
-    cursor = conn.cursor()
+    counts = {"inserted": 0, "updated": 0, "conflicted": 0, "deleted": 0, "skipped": 0}
+
+    # Keyed by id: Postgres can't upsert the same row twice in one statement
+    rows_by_id: Dict[int, tuple] = {}
+    entries_by_id: Dict[int, dict] = {}
+    deleted_ids = []
+    rejected: List[Tuple[dict, str]] = []
     for entry in entries:
-        project_name = project_mapping.get(entry["project_id"], "No Project")
+        if entry.get("deleted"):
+            deleted_ids.append(entry["id"])
+            continue
         try:
-            cursor.execute(
-                """
-                INSERT INTO toggl_entries (
-                    id, date, duration_seconds, project_id, project_name, tags,
-                    description
+            rows_by_id[entry["id"]] = _entry_to_row(entry, project_mapping)
+            entries_by_id[entry["id"]] = entry
+        except KeyError as e:
+            logger.error(f"Skipping malformed entry {entry.get('id')}: missing {e}")
+            counts["skipped"] += 1
+            if "id" in entry:
+                rejected.append((entry, f"missing {e}"))
+    rows = list(rows_by_id.values())
+
+    # Savepoints need an open transaction, so leave autocommit for the load.
+    previous_autocommit = conn.autocommit
+    if previous_autocommit:
+        conn.autocommit = False
+    try:
+        with conn.cursor() as cursor:
+            for offset in range(0, len(rows), batch_size):
+                batch = rows[offset:offset + batch_size]
+                cursor.execute("SAVEPOINT toggl_batch")
+                try:
+                    inserted, updated = _upsert_rows(cursor, batch)
+                    cursor.execute("RELEASE SAVEPOINT toggl_batch")
+                    counts["inserted"] += inserted
+                    counts["updated"] += updated
+                    counts["conflicted"] += len(batch) - inserted - updated
+                    continue
+                except Exception as e:
+                    logger.warning(
+                        f"Batch of {len(batch)} entries failed ({e}); "
+                        f"retrying row by row"
+                    )
+                    cursor.execute("ROLLBACK TO SAVEPOINT toggl_batch")
+
+                for row in batch:
+                    cursor.execute("SAVEPOINT toggl_row")
+                    try:
+                        inserted, updated = _upsert_rows(cursor, [row])
+                        cursor.execute("RELEASE SAVEPOINT toggl_row")
+                        counts["inserted"] += inserted
+                        counts["updated"] += updated
+                        counts["conflicted"] += 1 - inserted - updated
+                    except Exception as e:
+                        logger.error(f"Failed to store entry {row[0]}: {str(e)}")
+                        cursor.execute("ROLLBACK TO SAVEPOINT toggl_row")
+                        counts["skipped"] += 1
+                        rejected.append((entries_by_id[row[0]], str(e)))
+                cursor.execute("RELEASE SAVEPOINT toggl_batch")
+            if deleted_ids:
+                counts["deleted"] = _delete_entries(cursor, deleted_ids)
+            rejected_ids = {entry["id"] for entry, _ in rejected}
+            settled = [
+                entry_id for entry_id in list(rows_by_id) + deleted_ids
+                if entry_id not in rejected_ids
+            ]
+            if settled:
+                cursor.execute(
+                    "DELETE FROM toggl_rejected_entries WHERE id = ANY(%s)", (settled,)
                 )
-                VALUES (%s, %s, %s, %s, %s, %s, %s)
-                ON CONFLICT (id) DO NOTHING
-                """,
-                (
-                    entry["id"],
-                    entry["date"],
-                    entry["duration_seconds"],
-                    entry["project_id"],
-                    project_name,
-                    entry["tags"],
-                    entry["description"],
-                ),
-            )
-        except Exception as e:
-            logger.error(f"Failed to store entry {entry['id']}: {str(e)}")
-            conn.rollback()
-            continue
-    conn.commit()
-    cursor.close()
-    logger.info(f"Stored {len(entries)} entries in Supabase")
+            if rejected:
+                _record_rejected(cursor, rejected)
+            if rollup_dates is not None:
+                refresh_rollup_buckets(cursor, rollup_dates)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        if previous_autocommit:
+            conn.autocommit = True
+
+    logger.info(
+        f"Stored Toggl entries: {counts['inserted']} inserted, "
+        f"{counts['updated']} updated, {counts['conflicted']} unchanged, "
+        f"{counts['deleted']} deleted, {counts['skipped']} skipped"
+    )
+    return counts
+
+
+def create_toggl_session(api_key: str, pool_size: int = 10) -> requests.Session:
+    """
+    Authenticated Toggl session on the shared HTTP client: limited to Toggl's
+    per-token rate, retrying 429/5xx and waiting out an exhausted hourly
+    quota (402 with X-Toggl-Quota-Resets-In) when the reset is near enough.
+    Pass a pool_size of at least the worker count when sharing it across
+    threads.
+    """
+    session = create_session(
+        requests_per_second=config.TOGGL_REQUESTS_PER_SECOND,
+        burst=2,
+        pool_size=pool_size,
+        max_retries=config.TOGGL_MAX_RETRIES,
+        max_retry_after=config.TOGGL_MAX_RETRY_AFTER,
+        retry_statuses=DEFAULT_RETRY_STATUSES | {402},
+        retry_after_headers=("Retry-After", "X-Toggl-Quota-Resets-In"),
+    )
+    session.auth = (api_key, "api_token")
+    return session
 
 
 def get_supabase_connection() -> psycopg2.extensions.connection:
     """
-    Establish a connection to Supabase.
+    Check out a connection from the shared pool (see db_pool.py).
 
     Returns:
-        psycopg2 connection object.
+        psycopg2 connection object; hand it back with db_pool.release().
     """
     try:
-        conn = psycopg2.connect(
-            dbname=os.getenv("SUPABASE_DB"),
-            user=os.getenv("SUPABASE_USER"),
-            password=os.getenv("SUPABASE_PASSWORD"),
-            host=os.getenv("SUPABASE_HOST"),
-            port=os.getenv("SUPABASE_PORT", "5432")
-        )
-        return conn
+        return db_pool.acquire(autocommit=True)
     except Exception as e:
         logger.error(f"Failed to connect to Supabase: {str(e)}")
         raise
 
 
-def fetch_and_store_toggl_data(conn, since_days: int = 7) -> None:
+def _load_modified_since(conn) -> Optional[int]:
+    """Return the stored `since` cursor if it is still within Toggl's limit."""
+    saved = get_sync_cursor(conn, TOGGL_SYNC_CURSOR)
+    if not saved:
+        return None
+    since = json.loads(saved)["since"]
+    oldest = datetime.now(timezone.utc) - TOGGL_SINCE_MAX_AGE
+    if since < oldest.timestamp():
+        logger.info("Toggl sync cursor too old for `since`; doing a window fetch")
+        return None
+    return since
+
+
+def _store_fetched_entries(
+    conn,
+    session: requests.Session,
+    entries: List[dict]
+) -> Optional[Dict[str, int]]:
+    """Resolve project names, then store entries and their rollups in one transaction."""
+    # Names come from the cached catalogue; only unknown ids hit the API
+    with metrics.stage("projects"):
+        workspace_id = resolve_workspace_id(conn, session)
+        project_mapping = {}
+        if workspace_id:
+            project_mapping = get_project_mapping(
+                conn, session, workspace_id,
+                (entry.get("project_id") for entry in entries)
+            )
+
+    # Store in Supabase using the provided conn
+    try:
+        with metrics.stage("store"):
+            touched = affected_dates(conn, entries)
+            counts = store_toggl_entries(
+                conn, entries, project_mapping, rollup_dates=touched
+            )
+            metrics.count("rows_out", counts["inserted"] + counts["updated"])
+    except Exception as e:
+        logger.error(f"Failed to store Toggl entries: {str(e)}")
+        return None
+    return counts
+
+
+def _store_spooled_entries(conn, session: requests.Session, entries: List[dict]) -> None:
+    """
+    outbox.replay handler: store a batch, raising if it didn't commit so the
+    batch stays spooled. Rejected entries are in toggl_rejected_entries and
+    don't hold the batch back.
+    """
+    counts = _store_fetched_entries(conn, session, entries)
+    if counts is None:
+        raise RuntimeError("store_toggl_entries failed")
+
+
+def replay_toggl_outbox(conn, session: requests.Session) -> int:
+    """Store entries spooled by earlier runs. Returns how many were replayed."""
+    with metrics.stage("replay"):
+        return outbox.replay(
+            TOGGL_OUTBOX, lambda batch: _store_spooled_entries(conn, session, batch)
+        )
+
+
+def spool_toggl_offline(since_days: int = 7) -> int:
+    """
+    Fetch the since_days window into the outbox only, for runs without a
+    database (the sync cursor and project cache live there). Returns the
+    number of entries spooled.
+    """
+    if not config.TOGGL_API_KEY:
+        logger.error("TOGGL_API_KEY not set")
+        return 0
+    session = create_toggl_session(config.TOGGL_API_KEY)
+    with metrics.stage("fetch"):
+        entries = fetch_toggl_entries(session, since_days)
+        metrics.count("rows_in", len(entries or []))
+    spooled = len(outbox.spool(TOGGL_OUTBOX, entries or [], key="id"))
+    logger.info(f"Spooled {spooled} Toggl entries for the next run")
+    return spooled
+
+
+def fetch_and_store_toggl_data(
+    conn,
+    since_days: int = 7,
+    incremental: bool = True
+) -> Optional[Dict[str, int]]:
     """
     Fetch Toggl data and store it in Supabase using the provided connection.
 
+    In incremental mode only entries modified since the last successful sync
+    are fetched (Toggl's `since` parameter), edits are upserted and deletions
+    applied. Without a usable cursor it falls back to a since_days window
+    (split into concurrent windows when it is long) and then starts tracking
+    one. Rollup buckets touched by the change are refreshed in the same
+    transaction. Entries spooled by earlier runs are stored first, and
+    fetched entries are spooled (by id) until their store commits. Entries
+    the store rejects go to toggl_rejected_entries; the cursor and spool move
+    on past them. Only a failed store keeps the spool and cursor.
+
     Args:
         conn: Database connection object.
-        since_days (int, optional): Number of days to fetch data for. Defaults to 7.
+        since_days (int, optional): Number of days to fetch data for when no
+                                    cursor is available. Defaults to 7.
+        incremental (bool, optional): Use and advance the stored modified-since
+                                      cursor. Defaults to True.
+
+    Returns:
+        Optional[Dict[str, int]]: Store counts from store_toggl_entries, or
+                                  None if nothing was stored.
     """
     # Set up Toggl API session
-    toggl_api_key = os.getenv("TOGGL_API_KEY")
-    if not toggl_api_key:
+    if not config.TOGGL_API_KEY:
         logger.error("TOGGL_API_KEY not set")
-        return
+        return None
+    session = create_toggl_session(config.TOGGL_API_KEY)
+    replay_toggl_outbox(conn, session)
 
-    session = requests.Session()
-    session.auth = (toggl_api_key, "api_token")
+    modified_since = _load_modified_since(conn) if incremental else None
+    # Taken before the request so edits made during the sync aren't missed
+    sync_started = int(datetime.now(timezone.utc).timestamp())
 
-    # Replace with your actual workspace ID (get it from Toggl or API)
-    workspace_id = "6918134"  # Example workspace ID
+    with metrics.stage("fetch"):
+        if modified_since is None and since_days > config.TOGGL_WINDOW_DAYS:
+            entries = fetch_toggl_entries_windowed(
+                session, datetime.utcnow().date() - timedelta(days=since_days)
+            )
+        else:
+            entries = fetch_toggl_entries(session, since_days, modified_since=modified_since)
+        metrics.count("rows_in", len(entries or []))
+    if entries is None:
+        return None
 
-    # Fetch projects and entries
-    project_mapping = fetch_toggl_projects(session, workspace_id)
-    entries = fetch_toggl_entries(session, since_days)
+    counts = None
+    if entries:
+        spooled = outbox.spool(TOGGL_OUTBOX, entries, key="id")
+        counts = _store_fetched_entries(conn, session, entries)
+        if counts is None:
+            return None
+        if counts["skipped"]:
+            logger.warning(
+                f"{counts['skipped']} Toggl entries rejected; "
+                f"see toggl_rejected_entries"
+            )
+        outbox.ack(spooled)
+    else:
+        logger.info("No entries to store")
 
+    if incremental:
+        set_sync_cursor(conn, TOGGL_SYNC_CURSOR, json.dumps({"since": sync_started}))
+    return counts
+
+
+def backfill_toggl(
+    conn,
+    start_date: date,
+    end_date: Optional[date] = None,
+    window_days: int = config.TOGGL_WINDOW_DAYS,
+    workers: int = config.TOGGL_BACKFILL_WORKERS,
+    session: Optional[requests.Session] = None
+) -> Optional[Dict[str, int]]:
+    """
+    Load Toggl history for [start_date, end_date) in concurrent windows.
+
+    The incremental cursor is left alone: a backfill only fills in history,
+    the next regular sync still picks up recent edits and deletions. Pass a
+    session to share its rate limiter between concurrent backfills.
+
+    Returns:
+        Optional[Dict[str, int]]: Store counts (all zero for a range without
+                                  entries), or None if the fetch or store
+                                  failed.
+    """
+    if session is None:
+        if not config.TOGGL_API_KEY:
+            logger.error("TOGGL_API_KEY not set")
+            return None
+        session = create_toggl_session(config.TOGGL_API_KEY, pool_size=max(10, workers))
+
+    with metrics.stage("fetch"):
+        entries = fetch_toggl_entries_windowed(
+            session, start_date, end_date, window_days=window_days, workers=workers
+        )
+        metrics.count("rows_in", len(entries or []))
+    if entries is None:
+        return None
     if not entries:
         logger.info("No entries to store")
-        return
-
-    # Store in Supabase using the provided conn
-    try:
-        store_toggl_entries(conn, entries, project_mapping)
-    except Exception as e:
-        logger.error(f"Failed to store Toggl entries: {str(e)}")
+        return {"inserted": 0, "updated": 0, "conflicted": 0, "deleted": 0, "skipped": 0}
+    spooled = outbox.spool(TOGGL_OUTBOX, entries, key="id")
+    counts = _store_fetched_entries(conn, session, entries)
+    if counts is not None:
+        outbox.ack(spooled)
+    return counts
 
 
 if __name__ == "__main__":
-    fetch_and_store_toggl_data()
+    parser = argparse.ArgumentParser(description="Sync Toggl time entries.")
+    parser.add_argument("--backfill-from", type=date.fromisoformat, metavar="YYYY-MM-DD",
+                        help="Load history from this date instead of syncing")
+    parser.add_argument("--backfill-to", type=date.fromisoformat, metavar="YYYY-MM-DD",
+                        help="Day after the last one to load (default: tomorrow)")
+    parser.add_argument("--workers", type=int, default=config.TOGGL_BACKFILL_WORKERS)
+    args = parser.parse_args()
+
+    config.setup_logging("INFO")
+    with db_pool.db_connection() as conn:
+        if args.backfill_from:
+            result = backfill_toggl(
+                conn, args.backfill_from, args.backfill_to, workers=args.workers
+            )
+        else:
+            result = fetch_and_store_toggl_data(conn)
+    if result is None:
+        raise SystemExit(1)
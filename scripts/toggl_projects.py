@@ -0,0 +1,217 @@
+# scripts/toggl_projects.py
+"""
+Cached Toggl workspace and project catalogue.
+
+Project names live in the toggl_projects table. The cache is refreshed at
+most once per TTL using Toggl's `since` filter, so only projects changed
+since the last refresh come back. Project ids seen in new entries but not yet
+cached are fetched one by one, on demand.
+"""
+
+import json
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional
+
+import requests
+from psycopg2.extensions import connection
+
+import scripts.config as config
+from scripts.database import get_sync_cursor, set_sync_cursor, values_placeholders
+
+logger = logging.getLogger(__name__)
+
+TOGGL_API_BASE = "https://api.track.toggl.com/api/v9"
+
+# sync_state keys for the catalogue refresh time and the resolved workspace
+PROJECTS_CURSOR = "toggl_projects"
+WORKSPACE_CURSOR = "toggl_workspace"
+
+
+def create_toggl_projects_table_query() -> str:
+    """
+    Returns the SQL statement to create the toggl_projects cache table.
+    """
+    return """
+    CREATE TABLE IF NOT EXISTS toggl_projects (
+        id BIGINT PRIMARY KEY,
+        workspace_id BIGINT NOT NULL,
+        name TEXT NOT NULL,
+        fetched_at TIMESTAMPTZ NOT NULL DEFAULT now()
+    );
+    """
+
+
+def fetch_toggl_projects(
+    session: requests.Session,
+    workspace_id: str,
+    since: Optional[int] = None
+) -> Optional[Dict[int, str]]:
+    """
+    Fetch project data from Toggl API and return a mapping of project_id to
+    project_name.
+
+    Args:
+        session: Authenticated requests.Session object.
+        workspace_id (str): Toggl workspace ID.
+        since (int, optional): Unix timestamp; only projects modified after it
+                               are returned.
+
+    Returns:
+        Optional[Dict[int, str]]: Mapping of project_id to project_name, or
+                                  None if the request failed.
+    """
+    url = f"{TOGGL_API_BASE}/workspaces/{workspace_id}/projects"
+    if since is not None:
+        url += f"?since={since}"
+    try:
+        resp = session.get(url)
+        if resp.status_code != 200:
+            logger.error(f"Failed to fetch projects: {resp.status_code} - "
+                         f"{resp.text}")
+            return None
+        projects = resp.json() or []
+        return {p["id"]: p["name"] for p in projects if "id" in p and "name" in p}
+    except Exception as e:
+        logger.error(f"Error fetching projects: {str(e)}")
+        return None
+
+
+def fetch_toggl_project(
+    session: requests.Session,
+    workspace_id: str,
+    project_id: int
+) -> Optional[str]:
+    """Fetch a single project's name, or None if it can't be retrieved."""
+    url = f"{TOGGL_API_BASE}/workspaces/{workspace_id}/projects/{project_id}"
+    try:
+        resp = session.get(url)
+        if resp.status_code != 200:
+            logger.error(f"Failed to fetch project {project_id}: "
+                         f"{resp.status_code} - {resp.text}")
+            return None
+        return resp.json().get("name")
+    except Exception as e:
+        logger.error(f"Error fetching project {project_id}: {str(e)}")
+        return None
+
+
+def resolve_workspace_id(conn: connection, session: requests.Session) -> Optional[str]:
+    """
+    Return the configured TOGGL_WORKSPACE_ID, else the account's default
+    workspace (looked up once via /me and remembered in sync_state).
+    """
+    if config.TOGGL_WORKSPACE_ID:
+        return config.TOGGL_WORKSPACE_ID
+
+    cached = get_sync_cursor(conn, WORKSPACE_CURSOR)
+    if cached:
+        return json.loads(cached)["workspace_id"]
+
+    try:
+        resp = session.get(f"{TOGGL_API_BASE}/me")
+        if resp.status_code != 200:
+            logger.error(f"Failed to fetch Toggl user: {resp.status_code} - {resp.text}")
+            return None
+        workspace_id = str(resp.json()["default_workspace_id"])
+    except Exception as e:
+        logger.error(f"Error resolving Toggl workspace: {str(e)}")
+        return None
+
+    set_sync_cursor(conn, WORKSPACE_CURSOR, json.dumps({"workspace_id": workspace_id}))
+    logger.info(f"Using default Toggl workspace {workspace_id}")
+    return workspace_id
+
+
+def _load_cached_projects(conn: connection, project_ids: List[int]) -> Dict[int, str]:
+    """Read cached names for the given project ids."""
+    if not project_ids:
+        return {}
+    with conn.cursor() as cur:
+        cur.execute(
+            "SELECT id, name FROM toggl_projects WHERE id = ANY(%s)",
+            (project_ids,)
+        )
+        return {row[0]: row[1] for row in cur.fetchall()}
+
+
+def _store_projects(conn: connection, workspace_id: str, projects: Dict[int, str]) -> None:
+    """Upsert project names into the cache table."""
+    if not projects:
+        return
+    rows = [(pid, int(workspace_id), name) for pid, name in projects.items()]
+    with conn.cursor() as cur:
+        cur.execute(
+            f"""
+            INSERT INTO toggl_projects (id, workspace_id, name)
+            VALUES {values_placeholders(len(rows), 3)}
+            ON CONFLICT (id) DO UPDATE SET
+                workspace_id = EXCLUDED.workspace_id,
+                name = EXCLUDED.name,
+                fetched_at = now()
+            """,
+            [value for row in rows for value in row]
+        )
+    if not conn.autocommit:
+        conn.commit()
+
+
+def refresh_project_cache(
+    conn: connection,
+    session: requests.Session,
+    workspace_id: str,
+    force: bool = False
+) -> int:
+    """
+    Pull projects changed since the last refresh once the TTL has expired.
+    Returns the number of projects written (0 when the cache is still fresh
+    or the fetch failed).
+    """
+    now = datetime.now(timezone.utc)
+    saved = get_sync_cursor(conn, PROJECTS_CURSOR)
+    last_refresh = json.loads(saved)["refreshed_at"] if saved else None
+    ttl = timedelta(hours=config.TOGGL_PROJECT_CACHE_TTL_HOURS)
+    if not force and last_refresh and now.timestamp() - last_refresh < ttl.total_seconds():
+        return 0
+
+    projects = fetch_toggl_projects(session, workspace_id, since=last_refresh)
+    if projects is None:
+        # Keep the old refresh time so the next run asks for the same changes
+        return 0
+    _store_projects(conn, workspace_id, projects)
+    set_sync_cursor(conn, PROJECTS_CURSOR, json.dumps({"refreshed_at": int(now.timestamp())}))
+    logger.info(f"Refreshed Toggl project cache ({len(projects)} changed)")
+    return len(projects)
+
+
+def get_project_mapping(
+    conn: connection,
+    session: requests.Session,
+    workspace_id: str,
+    project_ids: Iterable[Optional[int]]
+) -> Dict[int, str]:
+    """
+    Map the given project ids to names using the cache, refreshing it if the
+    TTL expired and fetching any ids it still doesn't know.
+    """
+    wanted = sorted({pid for pid in project_ids if pid is not None})
+    if not wanted:
+        return {}
+
+    refresh_project_cache(conn, session, workspace_id)
+    mapping = _load_cached_projects(conn, wanted)
+
+    missing = [pid for pid in wanted if pid not in mapping]
+    fetched = {}
+    for project_id in missing:
+        name = fetch_toggl_project(session, workspace_id, project_id)
+        if name is not None:
+            fetched[project_id] = name
+    _store_projects(conn, workspace_id, fetched)
+    mapping.update(fetched)
+
+    logger.info(
+        f"Resolved {len(mapping)} of {len(wanted)} Toggl projects "
+        f"({len(missing)} looked up)"
+    )
+    return mapping
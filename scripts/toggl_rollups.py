@@ -0,0 +1,187 @@
+# scripts/toggl_rollups.py
+"""
+Incrementally refreshed Toggl summary tables.
+
+toggl_rollups holds total seconds and entry counts per day, week and month,
+broken down by project_name (which carries the "Deep Work", "Learning", ...
+categories) and by tag. After a store only the buckets containing a new,
+changed or deleted entry are recomputed, so refresh cost follows the size of
+the change rather than the size of toggl_entries. While toggl_rollups is
+still empty (the first refresh after it was created) every bucket is built
+instead; rebuild_rollups() does the same on demand. refresh_rollup_buckets()
+runs the refresh inside a caller's transaction, so the store and its rollups
+commit together.
+"""
+
+import logging
+from datetime import date, timedelta
+from typing import Any, Callable, Dict, Iterable, List, Set
+
+from psycopg2.extensions import connection
+
+logger = logging.getLogger(__name__)
+
+# Rollup period -> Postgres date_trunc field
+PERIODS = {"day": "day", "week": "week", "month": "month"}
+
+
+def create_toggl_rollups_table_query() -> str:
+    """
+    Returns the SQL statement to create the toggl_rollups table if not exists.
+    """
+    return """
+    CREATE TABLE IF NOT EXISTS toggl_rollups (
+        period TEXT NOT NULL,
+        bucket_start DATE NOT NULL,
+        dimension TEXT NOT NULL,
+        key TEXT NOT NULL,
+        total_seconds BIGINT NOT NULL,
+        entry_count INTEGER NOT NULL,
+        PRIMARY KEY (period, dimension, bucket_start, key)
+    );
+    CREATE INDEX IF NOT EXISTS toggl_entries_date_idx ON toggl_entries (date);
+    """
+
+
+def bucket_start(day: date, period: str) -> date:
+    """First day of the period bucket containing `day` (weeks start Monday)."""
+    if period == "week":
+        return day - timedelta(days=day.weekday())
+    if period == "month":
+        return day.replace(day=1)
+    return day
+
+
+def affected_dates(conn: connection, entries: List[dict]) -> Set[date]:
+    """
+    Dates whose rollups an upcoming store can change: the new dates of the
+    entries plus the dates currently stored for the same ids (an edit may move
+    an entry to another day, and deletions only carry an id).
+
+    Must be called before store_toggl_entries.
+    """
+    dates = {entry["date"] for entry in entries if entry.get("date")}
+    ids = [entry["id"] for entry in entries]
+    if ids:
+        with conn.cursor() as cur:
+            cur.execute(
+                "SELECT DISTINCT date FROM toggl_entries WHERE id = ANY(%s)", (ids,)
+            )
+            dates.update(row[0] for row in cur.fetchall())
+    return dates
+
+
+def refresh_rollups(conn: connection, dates: Iterable[date]) -> Dict[str, int]:
+    """
+    Recompute every day/week/month bucket containing one of `dates`, or
+    every bucket while toggl_rollups is empty.
+
+    Each period's buckets are deleted and re-aggregated from toggl_entries in
+    one transaction, so readers never see a half-refreshed bucket.
+
+    Returns:
+        Mapping of period to the number of buckets refreshed.
+    """
+    return _in_transaction(conn, lambda cur: refresh_rollup_buckets(cur, dates))
+
+
+def rebuild_rollups(conn: connection) -> Dict[str, int]:
+    """Replace all of toggl_rollups with buckets built from every entry."""
+    return _in_transaction(conn, _rebuild_buckets)
+
+
+def refresh_rollup_buckets(cur, dates: Iterable[date]) -> Dict[str, int]:
+    """
+    refresh_rollups on a cursor of an open transaction, e.g. the one
+    store_toggl_entries writes the entries in; nothing is committed here.
+    """
+    cur.execute("SELECT EXISTS (SELECT 1 FROM toggl_rollups)")
+    if not cur.fetchone()[0]:
+        logger.info("toggl_rollups is empty; building every bucket")
+        return _rebuild_buckets(cur)
+    return _refresh_buckets(cur, dates)
+
+
+def _in_transaction(
+    conn: connection,
+    refresh: Callable[[Any], Dict[str, int]]
+) -> Dict[str, int]:
+    """Run refresh(cursor) in its own transaction."""
+    previous_autocommit = conn.autocommit
+    if previous_autocommit:
+        conn.autocommit = False
+    try:
+        with conn.cursor() as cur:
+            refreshed = refresh(cur)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        if previous_autocommit:
+            conn.autocommit = True
+    return refreshed
+
+
+def _rebuild_buckets(cur) -> Dict[str, int]:
+    cur.execute("SELECT DISTINCT date FROM toggl_entries")
+    dates = [row[0] for row in cur.fetchall()]
+    return _refresh_buckets(cur, dates, clear=True)
+
+
+def _refresh_buckets(
+    cur,
+    dates: Iterable[date],
+    clear: bool = False
+) -> Dict[str, int]:
+    """Recompute the buckets containing `dates` (after emptying the table with clear)."""
+    dates = sorted(set(dates))
+    if not dates and not clear:
+        return {}
+
+    refreshed = {}
+    if clear:
+        cur.execute("DELETE FROM toggl_rollups")
+    for period, trunc in PERIODS.items() if dates else ():
+        buckets = sorted({bucket_start(day, period) for day in dates})
+        cur.execute(
+            "DELETE FROM toggl_rollups WHERE period = %s AND bucket_start = ANY(%s)",
+            (period, buckets)
+        )
+        params = {
+            "period": period,
+            "trunc": trunc,
+            "buckets": buckets,
+            # Range bounds let the date index narrow the scan
+            "first": buckets[0],
+            "last": buckets[-1] + timedelta(days=31),
+        }
+        cur.execute(
+            """
+            INSERT INTO toggl_rollups (
+                period, bucket_start, dimension, key, total_seconds, entry_count
+            )
+            SELECT %(period)s, date_trunc(%(trunc)s, e.date)::date, 'project',
+                   COALESCE(e.project_name, 'No Project'),
+                   SUM(e.duration_seconds), COUNT(*)
+            FROM toggl_entries e
+            WHERE e.date >= %(first)s AND e.date < %(last)s
+              AND date_trunc(%(trunc)s, e.date)::date = ANY(%(buckets)s)
+            GROUP BY 2, 4
+            UNION ALL
+            SELECT %(period)s, date_trunc(%(trunc)s, e.date)::date, 'tag',
+                   tag, SUM(e.duration_seconds), COUNT(*)
+            FROM toggl_entries e, unnest(e.tags) AS tag
+            WHERE e.date >= %(first)s AND e.date < %(last)s
+              AND date_trunc(%(trunc)s, e.date)::date = ANY(%(buckets)s)
+            GROUP BY 2, 4
+            """,
+            params
+        )
+        refreshed[period] = len(buckets)
+
+    logger.info(
+        "Refreshed Toggl rollups: "
+        + ", ".join(f"{count} {period}" for period, count in refreshed.items())
+    )
+    return refreshed
@@ -0,0 +1,329 @@
+# scripts/training_load.py
+"""
+Vectorized training-load analytics over workout_stats.
+
+Workouts are binned into daily NumPy arrays, then HR-based training impulse
+(Banister TRIMP), acute/chronic load (exponentially weighted, 7 and 42 day
+time constants), form (TSB) and weekly/monthly totals are all computed with
+array operations, with no per-row Python loops. Results are written to
+training_load (daily) and training_load_periods (weekly/monthly), from the
+first day whose inputs differ from what is stored.
+"""
+
+import logging
+import math
+from datetime import date, datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+from psycopg2.extensions import connection
+
+import scripts.config as config
+from scripts.database import values_placeholders
+from scripts.database_utils import fetch_batches, server_cursor
+
+logger = logging.getLogger(__name__)
+
+ATL_DAYS = 7    # acute load time constant ("fatigue")
+CTL_DAYS = 42   # chronic load time constant ("fitness")
+
+# Heart-rate reserve assumed for workouts recorded without HR
+DEFAULT_HR_RESERVE = 0.5
+
+# Rows per upsert statement
+WRITE_BATCH_SIZE = 1000
+
+# Float columns read per workout, after the day (see WORKOUTS_SQL)
+WORKOUT_FIELDS = ("duration", "avg_hr", "max_hr", "calories", "distance")
+
+# Every column comes back as float8 so a fetched batch converts to one array;
+# days are counted from 1970-01-01 (datetime64[D]'s epoch), NULLs become NaN
+WORKOUTS_SQL = """
+    SELECT (date::date - DATE '1970-01-01')::float8,
+           COALESCE(time::float8, 'NaN'),
+           COALESCE(avg_hr::float8, 'NaN'),
+           COALESCE(max_hr::float8, 'NaN'),
+           COALESCE(calories::float8, 'NaN'),
+           COALESCE(distance::float8, 'NaN')
+    FROM workout_stats
+    ORDER BY date
+"""
+
+# Stored daily inputs; the loads follow from them, so equal inputs mean an
+# unchanged day
+DAILY_INPUTS = ("trimp", "duration_s", "distance_m", "calories")
+STORED_INPUTS_SQL = """
+    SELECT (date - DATE '1970-01-01')::float8, trimp, duration_s, distance_m, calories
+    FROM training_load
+    WHERE date >= %s
+    ORDER BY date
+"""
+
+
+def create_training_load_tables_query() -> str:
+    """
+    Returns the SQL statements to create the training load tables if not exist.
+    """
+    return """
+    CREATE TABLE IF NOT EXISTS training_load (
+        date DATE PRIMARY KEY,
+        trimp FLOAT NOT NULL,
+        atl FLOAT NOT NULL,
+        ctl FLOAT NOT NULL,
+        tsb FLOAT NOT NULL,
+        duration_s FLOAT NOT NULL,
+        distance_m FLOAT NOT NULL,
+        calories FLOAT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS training_load_periods (
+        period TEXT NOT NULL,
+        period_start DATE NOT NULL,
+        sessions INTEGER NOT NULL,
+        trimp FLOAT NOT NULL,
+        duration_s FLOAT NOT NULL,
+        distance_m FLOAT NOT NULL,
+        calories FLOAT NOT NULL,
+        PRIMARY KEY (period, period_start)
+    );
+    """
+
+
+def _read_float_rows(conn: connection, query: str, params: tuple, width: int) -> np.ndarray:
+    """
+    Stream an all-float8 query through a server-side cursor into one 2-D
+    array, converting a fetched batch at a time.
+    """
+    parts = []
+    with server_cursor(conn) as cur:
+        cur.execute(query, params)
+        for rows in fetch_batches(cur):
+            parts.append(np.asarray(rows, dtype=np.float64))
+    if not parts:
+        return np.empty((0, width), dtype=np.float64)
+    return np.concatenate(parts)
+
+
+def load_workout_arrays(conn: connection) -> Optional[Dict[str, np.ndarray]]:
+    """
+    Read the columns needed from workout_stats into NumPy arrays.
+    Returns None if there are no workouts.
+
+    Rows are streamed through a server-side cursor and each batch of tuples
+    becomes an array in one call, so full history never sits in memory as
+    Python objects.
+    """
+    values = _read_float_rows(conn, WORKOUTS_SQL, None, 1 + len(WORKOUT_FIELDS))
+    if not len(values):
+        return None
+
+    arrays = {"day": values[:, 0].astype(np.int64).astype("datetime64[D]")}
+    for column, key in enumerate(WORKOUT_FIELDS, start=1):
+        arrays[key] = values[:, column]
+    for key in ("duration", "calories", "distance"):
+        arrays[key] = np.nan_to_num(arrays[key])
+    return arrays
+
+
+def training_impulse(
+    duration_s: np.ndarray,
+    avg_hr: np.ndarray,
+    resting_hr: float,
+    max_hr: float
+) -> np.ndarray:
+    """Banister TRIMP per workout: minutes * HRr * 0.64 * e^(1.92 * HRr)."""
+    hr_reserve = (avg_hr - resting_hr) / (max_hr - resting_hr)
+    hr_reserve = np.where(
+        np.isfinite(hr_reserve) & (avg_hr > 0), hr_reserve, DEFAULT_HR_RESERVE
+    )
+    hr_reserve = np.clip(hr_reserve, 0.0, 1.0)
+    return duration_s / 60.0 * hr_reserve * 0.64 * np.exp(1.92 * hr_reserve)
+
+
+def exponential_load(daily: np.ndarray, time_constant: float) -> np.ndarray:
+    """
+    Exponentially weighted load, load[t] = load[t-1] + k * (x[t] - load[t-1]),
+    evaluated as one convolution with the (truncated) impulse response.
+    """
+    decay = math.exp(-1.0 / time_constant)
+    # Kernel length where remaining weight drops below 1e-9
+    length = min(len(daily), int(math.ceil(math.log(1e-9) / math.log(decay))))
+    kernel = (1.0 - decay) * decay ** np.arange(length)
+    return np.convolve(daily, kernel)[:len(daily)]
+
+
+def compute_training_load(
+    workouts: Dict[str, np.ndarray],
+    resting_hr: float,
+    max_hr: float,
+    through: Optional[date] = None
+) -> Dict[str, np.ndarray]:
+    """
+    Bin workouts into days and compute daily TRIMP, ATL, CTL, TSB plus weekly
+    and monthly aggregates.
+
+    The daily axis runs through `through` (default: the last workout day),
+    so the loads keep decaying over the rest days since the last workout.
+    """
+    first_day = workouts["day"].min()
+    index = (workouts["day"] - first_day).astype(np.int64)
+    n_days = int(index.max()) + 1
+    if through is not None:
+        n_days = max(n_days, int((np.datetime64(through, "D") - first_day).astype(np.int64)) + 1)
+    days = first_day + np.arange(n_days)
+
+    trimp = training_impulse(workouts["duration"], workouts["avg_hr"], resting_hr, max_hr)
+    daily = {
+        "trimp": np.bincount(index, weights=trimp, minlength=n_days),
+        "duration_s": np.bincount(index, weights=workouts["duration"], minlength=n_days),
+        "distance_m": np.bincount(index, weights=workouts["distance"], minlength=n_days),
+        "calories": np.bincount(index, weights=workouts["calories"], minlength=n_days),
+        "sessions": np.bincount(index, minlength=n_days).astype(np.float64),
+    }
+    atl = exponential_load(daily["trimp"], ATL_DAYS)
+    ctl = exponential_load(daily["trimp"], CTL_DAYS)
+    # Form is yesterday's fitness minus yesterday's fatigue
+    tsb = np.concatenate(([0.0], (ctl - atl)[:-1]))
+
+    # datetime64[D] day 0 (1970-01-01) was a Thursday, so Monday is offset 3
+    weekday = (days.astype(np.int64) + 3) % 7
+    periods = {
+        "week": days - weekday.astype("timedelta64[D]"),
+        "month": days.astype("datetime64[M]").astype("datetime64[D]"),
+    }
+    aggregates = {}
+    for period, starts in periods.items():
+        keys, group = np.unique(starts, return_inverse=True)
+        aggregates[period] = dict(
+            period_start=keys,
+            **{name: np.bincount(group, weights=values) for name, values in daily.items()}
+        )
+
+    return dict(day=days, atl=atl, ctl=ctl, tsb=tsb, periods=aggregates, **daily)
+
+
+def _upsert(conn: connection, sql: str, rows: List[tuple]) -> None:
+    """Write rows in batches using the given INSERT ... {values} statement."""
+    with conn.cursor() as cur:
+        for offset in range(0, len(rows), WRITE_BATCH_SIZE):
+            batch = rows[offset:offset + WRITE_BATCH_SIZE]
+            cur.execute(
+                sql.format(values=values_placeholders(len(batch), len(batch[0]))),
+                [value for row in batch for value in row]
+            )
+    if not conn.autocommit:
+        conn.commit()
+
+
+def _to_date(value: np.datetime64) -> date:
+    """Convert a datetime64[D] value to datetime.date."""
+    return date.fromisoformat(str(value))
+
+
+def first_changed_day(conn: connection, result: Dict[str, np.ndarray]) -> Optional[int]:
+    """
+    Index into result["day"] of the first day whose stored inputs (see
+    DAILY_INPUTS) differ from the computed ones, or are missing. None if
+    every day is stored unchanged.
+    """
+    days = result["day"]
+    stored = _read_float_rows(
+        conn, STORED_INPUTS_SQL, (_to_date(days[0]),), 1 + len(DAILY_INPUTS)
+    )
+    offsets = stored[:, 0].astype(np.int64) - days[0].astype(np.int64)
+    in_range = offsets < len(days)
+    expected = np.full((len(days), len(DAILY_INPUTS)), np.nan)
+    expected[offsets[in_range]] = stored[in_range, 1:]
+    computed = np.column_stack([result[name].round(3) for name in DAILY_INPUTS])
+    # NaN (no stored row) never compares equal, so missing days count as changed
+    changed = np.flatnonzero((computed != expected).any(axis=1))
+    return int(changed[0]) if changed.size else None
+
+
+def store_training_load(
+    conn: connection,
+    result: Dict[str, np.ndarray],
+    start: int = 0
+) -> None:
+    """
+    Upsert daily and period results into the training load tables, from
+    result["day"][start] on. Periods are written from the week and month
+    containing that day.
+    """
+    daily_rows = list(zip(
+        map(_to_date, result["day"][start:]),
+        *(result[name][start:].round(3).tolist() for name in (
+            "trimp", "atl", "ctl", "tsb", "duration_s", "distance_m", "calories"
+        ))
+    ))
+    _upsert(conn, """
+        INSERT INTO training_load (
+            date, trimp, atl, ctl, tsb, duration_s, distance_m, calories
+        ) VALUES {values}
+        ON CONFLICT (date) DO UPDATE SET
+            trimp = EXCLUDED.trimp,
+            atl = EXCLUDED.atl,
+            ctl = EXCLUDED.ctl,
+            tsb = EXCLUDED.tsb,
+            duration_s = EXCLUDED.duration_s,
+            distance_m = EXCLUDED.distance_m,
+            calories = EXCLUDED.calories
+    """, daily_rows)
+
+    first_day = result["day"][start]
+    # datetime64[D] day 0 (1970-01-01) was a Thursday, so Monday is offset 3
+    first_starts = {
+        "week": first_day - (first_day.astype(np.int64) + 3) % 7,
+        "month": first_day.astype("datetime64[M]").astype("datetime64[D]"),
+    }
+    period_rows = []
+    for period, values in result["periods"].items():
+        keep = values["period_start"] >= first_starts[period]
+        period_rows.extend(zip(
+            [period] * int(keep.sum()),
+            map(_to_date, values["period_start"][keep]),
+            values["sessions"][keep].astype(int).tolist(),
+            *(values[name][keep].round(3).tolist() for name in (
+                "trimp", "duration_s", "distance_m", "calories"
+            ))
+        ))
+    _upsert(conn, """
+        INSERT INTO training_load_periods (
+            period, period_start, sessions, trimp, duration_s, distance_m, calories
+        ) VALUES {values}
+        ON CONFLICT (period, period_start) DO UPDATE SET
+            sessions = EXCLUDED.sessions,
+            trimp = EXCLUDED.trimp,
+            duration_s = EXCLUDED.duration_s,
+            distance_m = EXCLUDED.distance_m,
+            calories = EXCLUDED.calories
+    """, period_rows)
+    logger.info(
+        f"Stored training load for {len(daily_rows)} days, {len(period_rows)} periods"
+    )
+
+
+def update_training_load(
+    conn: connection,
+    through: Optional[date] = None
+) -> Optional[Dict[str, np.ndarray]]:
+    """
+    Recompute training load over all of workout_stats through `through`
+    (default: today) and store the days from the first changed one onward.
+    """
+    workouts = load_workout_arrays(conn)
+    if workouts is None:
+        logger.info("No workouts; skipping training load")
+        return None
+    # Never assume a max HR below what a workout actually recorded
+    observed_max = np.nanmax(workouts["max_hr"], initial=0.0)
+    max_hr = max(config.TRAINING_MAX_HR, observed_max)
+    result = compute_training_load(
+        workouts, config.TRAINING_RESTING_HR, max_hr,
+        through=through or datetime.now().date()
+    )
+    start = first_changed_day(conn, result)
+    if start is None:
+        logger.info("Training load unchanged")
+        return result
+    store_training_load(conn, result, start)
+    return result
@@ -0,0 +1,227 @@
+# scripts/workout_dedup.py
+"""
+Cross-source workout dedup: Garmin is the primary source and Strava a hot
+standby that usually receives the same workouts (Garmin uploads to it).
+
+The two services give the same workout different ids and slightly different
+numbers, so matching is done on a fingerprint instead: start time (local),
+duration and distance, each within a tolerance. A FingerprintIndex buckets
+start times so a lookup only compares against workouts starting nearby.
+
+    store_primary_workouts(conn, activities)   # Garmin
+    store_standby_workouts(conn, activities)   # Strava
+
+A standby workout is stored only when nothing stored matches it. A primary
+workout is always stored, and any Strava-only row it matches is deleted
+afterwards, so whichever source lands first each workout ends up as one
+row. Both run under database.workout_write_lock, so sources syncing in
+parallel can't both miss each other's rows.
+"""
+
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from psycopg2.extensions import connection
+
+from scripts import metrics
+from scripts.database import (
+    STRAVA_ID_INDEX,
+    WORKOUT_COLUMNS,
+    activity_to_row,
+    delete_strava_only_workouts,
+    get_workout_fingerprints,
+    store_workout_batch,
+    workout_write_lock
+)
+
+logger = logging.getLogger(__name__)
+
+# Start times within this many seconds can be the same workout
+START_TOLERANCE_SECONDS = 180
+
+# (absolute, relative) slack; the larger of the two applies
+DURATION_TOLERANCE = (60.0, 0.05)  # seconds, fraction
+DISTANCE_TOLERANCE = (100.0, 0.05)  # meters, fraction
+
+_EPOCH = datetime(1970, 1, 1)
+
+# Positions in an activity_to_row() tuple
+_TYPE, _DATE, _TIME, _DISTANCE = (
+    WORKOUT_COLUMNS.index(column)
+    for column in ("activity_type", "date", "time", "distance")
+)
+
+Fingerprint = Tuple[float, float, float]  # (start seconds, duration, distance)
+
+
+def fingerprint(start: datetime, duration: Optional[float], distance: Optional[float]) -> Fingerprint:
+    """Comparable fingerprint of a workout (naive local start time)."""
+    return (
+        (start.replace(tzinfo=None) - _EPOCH).total_seconds(),
+        float(duration or 0),
+        float(distance or 0),
+    )
+
+
+def _close(a: float, b: float, tolerance: Tuple[float, float]) -> bool:
+    absolute, relative = tolerance
+    return abs(a - b) <= max(absolute, relative * max(abs(a), abs(b)))
+
+
+class FingerprintIndex:
+    """Workouts bucketed by start time, matched within the tolerances above."""
+
+    def __init__(self, start_tolerance: float = START_TOLERANCE_SECONDS):
+        self.start_tolerance = start_tolerance
+        self._buckets: Dict[int, List[Tuple[Fingerprint, Any]]] = {}
+
+    def _bucket(self, start: float) -> int:
+        return int(start // self.start_tolerance)
+
+    def add(self, key: Fingerprint, value: Any) -> None:
+        self._buckets.setdefault(self._bucket(key[0]), []).append((key, value))
+
+    def match(self, key: Fingerprint) -> Optional[Any]:
+        """The value of the closest-starting matching workout, or None."""
+        start, duration, distance = key
+        bucket = self._bucket(start)
+        best, best_delta = None, None
+        for neighbour in (bucket - 1, bucket, bucket + 1):
+            for (other_start, other_duration, other_distance), value in self._buckets.get(neighbour, ()):
+                delta = abs(start - other_start)
+                if (
+                    delta <= self.start_tolerance
+                    and _close(duration, other_duration, DURATION_TOLERANCE)
+                    and _close(distance, other_distance, DISTANCE_TOLERANCE)
+                    and (best_delta is None or delta < best_delta)
+                ):
+                    best, best_delta = value, delta
+        return best
+
+    def values(self) -> Iterator[Any]:
+        for entries in self._buckets.values():
+            for _, value in entries:
+                yield value
+
+    def __len__(self) -> int:
+        return sum(len(entries) for entries in self._buckets.values())
+
+
+def row_fingerprint(row: tuple) -> Fingerprint:
+    """Fingerprint of an activity_to_row() tuple."""
+    return fingerprint(row[_DATE], row[_TIME], row[_DISTANCE])
+
+
+def _mapped(activities: List[dict]) -> Iterator[Tuple[dict, Optional[tuple]]]:
+    """(activity, row) pairs; row is None when the activity can't be mapped."""
+    for activity in activities:
+        try:
+            yield activity, activity_to_row(activity)
+        except (KeyError, TypeError, ValueError):
+            yield activity, None
+
+
+def load_index(
+    conn: connection,
+    rows: List[tuple],
+    strava_only: bool = False
+) -> FingerprintIndex:
+    """
+    Index the stored workouts starting around `rows` (only rows recorded
+    by Strava alone with strava_only).
+    """
+    index = FingerprintIndex()
+    if not rows:
+        return index
+    slack = timedelta(seconds=START_TOLERANCE_SECONDS)
+    starts = [row[_DATE] for row in rows]
+    for stored in get_workout_fingerprints(conn, min(starts) - slack, max(starts) + slack):
+        if strava_only and (
+            stored["garmin_activity_id"] is not None or stored["strava_activity_id"] is None
+        ):
+            continue
+        index.add(fingerprint(stored["date"], stored["time"], stored["distance"]), stored)
+    return index
+
+
+def drop_known_workouts(conn: connection, activities: List[dict]) -> List[dict]:
+    """
+    Standby activities that match no stored workout (nor an earlier one in
+    the batch). A Strava-only row is still rewritten when its content
+    changed; a Garmin row is never overwritten, even when its (date, type)
+    key is taken by a workout that doesn't match it. Unmappable activities
+    are kept for the store to reject.
+    """
+    pairs = list(_mapped(activities))
+    index = load_index(conn, [row for _, row in pairs if row is not None])
+    primary_keys = {
+        (stored["date"], stored["activity_type"]) for stored in index.values()
+        if stored.get("garmin_activity_id") is not None
+    }
+    kept = []
+    for activity, row in pairs:
+        if row is None:
+            kept.append(activity)
+            continue
+        if (row[_DATE], row[_TYPE]) in primary_keys:
+            continue
+        key = row_fingerprint(row)
+        stored = index.match(key)
+        if stored is not None:
+            changed = (
+                stored.get("garmin_activity_id") is None
+                and stored.get("strava_activity_id") == row[STRAVA_ID_INDEX]
+                and stored.get("content_hash") != row[-1]
+            )
+            if not changed:
+                continue
+        index.add(key, {"strava_activity_id": row[STRAVA_ID_INDEX], "content_hash": row[-1]})
+        kept.append(activity)
+    return kept
+
+
+def store_standby_workouts(conn: connection, activities: List[dict]) -> Dict[str, Any]:
+    """
+    Store standby (Strava) activities that no stored workout matches.
+
+    Returns:
+        store_workout_batch's result plus 'duplicates' (activities skipped).
+    """
+    with workout_write_lock(conn):
+        new_activities = drop_known_workouts(conn, activities)
+        result = store_workout_batch(conn, new_activities) if new_activities \
+            else {"stored": 0, "rejected": []}
+    result["duplicates"] = len(activities) - len(new_activities)
+    metrics.count("duplicates", result["duplicates"])
+    if result["duplicates"]:
+        logger.info(f"Skipped {result['duplicates']} workouts already stored from another source")
+    return result
+
+
+def store_primary_workouts(conn: connection, activities: List[dict]) -> Dict[str, Any]:
+    """
+    Store primary (Garmin) activities, then delete the Strava-only rows they
+    match.
+
+    Returns:
+        store_workout_batch's result plus 'superseded' (rows deleted).
+    """
+    with workout_write_lock(conn):
+        result = store_workout_batch(conn, activities)
+        rejected = {id(activity) for activity, _ in result["rejected"]}
+        rows = [
+            row for activity, row in _mapped(activities)
+            if row is not None and id(activity) not in rejected
+        ]
+        # A Strava row with the same (date, type) key was merged by the upsert
+        index = load_index(conn, rows, strava_only=True)
+        stale = set()
+        for row in rows:
+            stored = index.match(row_fingerprint(row))
+            if stored is not None:
+                stale.add((stored["date"], stored["activity_type"]))
+        result["superseded"] = delete_strava_only_workouts(conn, sorted(stale)) if stale else 0
+    if result["superseded"]:
+        logger.info(f"Replaced {result['superseded']} Strava-only workouts with Garmin ones")
+    return result
@@ -0,0 +1,68 @@
+"""Per-habit streak state (advance_state in scripts/habit_analytics.py)."""
+
+from datetime import date, timedelta
+
+from scripts.habit_analytics import HISTORY_DAYS, advance_state, new_state
+
+DAY0 = date(2024, 1, 1)
+
+
+def day(n):
+    return DAY0 + timedelta(days=n)
+
+
+def test_consecutive_days_build_a_streak():
+    state = advance_state(new_state("read", DAY0), [day(1), day(2), day(3)], day(3))
+
+    assert state["current_streak"] == 3
+    assert state["best_streak"] == 3
+    assert state["last_date"] == day(3)
+    assert state["recent_days"] == "111"
+
+
+def test_missed_day_resets_current_but_keeps_best():
+    state = advance_state(new_state("read", DAY0), [day(1), day(2), day(4)], day(4))
+
+    assert state["current_streak"] == 1
+    assert state["best_streak"] == 2
+    assert state["recent_days"] == "1101"
+
+
+def test_days_without_rows_count_as_missed():
+    state = advance_state(new_state("read", DAY0), [day(1)], day(1))
+
+    state = advance_state(state, [], day(3))
+
+    assert state["current_streak"] == 0
+    assert state["recent_days"] == "100"
+
+
+def test_advancing_in_steps_matches_one_pass():
+    done = [day(n) for n in (1, 2, 3, 5, 6, 9, 10)]
+    whole = advance_state(new_state("read", DAY0), done, day(10))
+
+    stepped = new_state("read", DAY0)
+    for through in (day(3), day(6), day(10)):
+        stepped = advance_state(stepped, [d for d in done if d <= through], through)
+
+    assert stepped == whole
+
+
+def test_already_processed_days_are_left_alone():
+    state = advance_state(new_state("read", DAY0), [day(1), day(2)], day(2))
+
+    again = advance_state(state, [day(1)], day(1))
+
+    assert again["last_date"] == day(2)
+    assert again["current_streak"] == 2
+    assert again["recent_days"] == "11"
+
+
+def test_history_and_rolling_rates():
+    done = [day(n) for n in range(1, HISTORY_DAYS + 11) if n % 2 == 0]
+    state = advance_state(new_state("read", DAY0), done, day(HISTORY_DAYS + 10))
+
+    assert len(state["recent_days"]) == HISTORY_DAYS
+    assert state["completion_90d"] == 50.0
+    # The last 7 days end on an even (done) day: 4 of 7
+    assert state["completion_7d"] == round(4 / 7 * 100, 1)
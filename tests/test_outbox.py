@@ -0,0 +1,108 @@
+"""Outbox spooling, keyed replacement and replay (scripts/outbox.py)."""
+
+import sqlite3
+from datetime import date
+
+import pytest
+
+from scripts import outbox
+
+
+@pytest.fixture
+def spool_path(tmp_path):
+    return str(tmp_path / "outbox.sqlite3")
+
+
+def test_spool_round_trips_dates(spool_path):
+    records = [{"id": 1, "date": date(2024, 1, 1)}]
+    ids = outbox.spool("toggl", records, path=spool_path)
+
+    assert outbox.pending("toggl", path=spool_path) == list(zip(ids, records))
+
+
+def test_keyed_spool_replaces_pending_record(spool_path):
+    first = outbox.spool("toggl", [{"id": 1, "v": 1}, {"id": 2, "v": 1}], path=spool_path, key="id")
+    again = outbox.spool("toggl", [{"id": 1, "v": 2}], path=spool_path, key="id")
+
+    assert again == first[:1]
+    assert outbox.pending("toggl", path=spool_path) == [
+        (first[0], {"id": 1, "v": 2}),
+        (first[1], {"id": 2, "v": 1}),
+    ]
+
+
+def test_keys_are_per_source(spool_path):
+    outbox.spool("toggl", [{"id": 1}], path=spool_path, key="id")
+    outbox.spool("garmin", [{"id": 1}], path=spool_path, key="id")
+
+    assert outbox.pending_count(path=spool_path) == 2
+
+
+def test_unkeyed_spool_appends(spool_path):
+    outbox.spool("garmin", [{"id": 1}], path=spool_path)
+    outbox.spool("garmin", [{"id": 1}], path=spool_path)
+
+    assert outbox.pending_count("garmin", path=spool_path) == 2
+
+
+def test_spool_file_without_record_key_is_upgraded(spool_path):
+    conn = sqlite3.connect(spool_path)
+    conn.executescript("""
+        CREATE TABLE outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            source TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+        );
+        INSERT INTO outbox (source, payload) VALUES ('toggl', '{"id": 1}');
+    """)
+    conn.close()
+
+    outbox.spool("toggl", [{"id": 1}], path=spool_path, key="id")
+    outbox.spool("toggl", [{"id": 1}], path=spool_path, key="id")
+
+    # The legacy row has no key, so only the keyed copies collapse
+    assert outbox.pending_count("toggl", path=spool_path) == 2
+
+
+def test_ack_removes_records(spool_path):
+    ids = outbox.spool("toggl", [{"id": 1}, {"id": 2}], path=spool_path)
+
+    assert outbox.ack(ids[:1], path=spool_path) == 1
+    assert [record for _, record in outbox.pending("toggl", path=spool_path)] == [{"id": 2}]
+
+
+def test_replay_acks_stored_batches(spool_path):
+    outbox.spool("toggl", [{"id": i} for i in range(5)], path=spool_path)
+    stored = []
+
+    replayed = outbox.replay("toggl", stored.extend, batch_size=2, path=spool_path)
+
+    assert replayed == 5
+    assert [record["id"] for record in stored] == list(range(5))
+    assert outbox.pending_count("toggl", path=spool_path) == 0
+
+
+def test_replay_stops_at_failing_batch(spool_path):
+    outbox.spool("toggl", [{"id": i} for i in range(6)], path=spool_path)
+    calls = []
+
+    def store(batch):
+        calls.append([record["id"] for record in batch])
+        if len(calls) == 2:
+            raise RuntimeError("database went away")
+
+    replayed = outbox.replay("toggl", store, batch_size=2, path=spool_path)
+
+    assert replayed == 2
+    assert calls == [[0, 1], [2, 3]]
+    remaining = [record["id"] for _, record in outbox.pending("toggl", path=spool_path)]
+    assert remaining == [2, 3, 4, 5]
+
+
+def test_marks(spool_path):
+    assert outbox.get_mark("garmin", path=spool_path) is None
+    outbox.set_mark("garmin", "2024-01-01", path=spool_path)
+    assert outbox.get_mark("garmin", path=spool_path) == "2024-01-01"
+    outbox.set_mark("garmin", None, path=spool_path)
+    assert outbox.get_mark("garmin", path=spool_path) is None
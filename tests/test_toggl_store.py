@@ -0,0 +1,58 @@
+"""store_toggl_entries on the SQLite stand-in: savepoints and rejected entries."""
+
+import pytest
+
+from scripts.benchmarks.generators import PROJECTS, toggl_entries
+from scripts.benchmarks.localdb import open_database
+from scripts.toggl_integration import store_toggl_entries
+
+
+@pytest.fixture
+def conn():
+    conn, _, cleanup = open_database()
+    # Entries with this description fail to insert, like a row Postgres rejects
+    conn.raw.execute(
+        "CREATE TRIGGER reject_entry BEFORE INSERT ON toggl_entries "
+        "WHEN NEW.description = 'bad' BEGIN SELECT RAISE(ABORT, 'rejected'); END"
+    )
+    yield conn
+    cleanup()
+
+
+def _query(conn, sql):
+    with conn.cursor() as cur:
+        cur.execute(sql)
+        return cur.fetchall()
+
+
+def test_stores_and_counts_entries(conn):
+    counts = store_toggl_entries(conn, toggl_entries(30), PROJECTS, batch_size=10)
+
+    assert counts == {"inserted": 30, "updated": 0, "conflicted": 0, "deleted": 0, "skipped": 0}
+    assert _query(conn, "SELECT count(*) FROM toggl_entries") == [(30,)]
+    assert conn.autocommit
+
+
+def test_rejected_entries_are_dead_lettered_and_the_rest_stored(conn):
+    entries = toggl_entries(10)
+    entries[4] = dict(entries[4], description="bad")
+    malformed = {key: value for key, value in toggl_entries(11)[10].items() if key != "date"}
+
+    counts = store_toggl_entries(conn, entries + [malformed], PROJECTS, batch_size=5)
+
+    assert counts["inserted"] == 9
+    assert counts["skipped"] == 2
+    rejected = dict(_query(conn, "SELECT id, reason FROM toggl_rejected_entries"))
+    assert set(rejected) == {entries[4]["id"], malformed["id"]}
+    assert rejected[entries[4]["id"]] == "rejected"
+
+
+def test_stored_entry_leaves_the_rejected_table(conn):
+    entry = dict(toggl_entries(1)[0], description="bad")
+    store_toggl_entries(conn, [entry], PROJECTS)
+
+    counts = store_toggl_entries(conn, [dict(entry, description="fixed")], PROJECTS)
+
+    assert counts["inserted"] == 1
+    assert _query(conn, "SELECT count(*) FROM toggl_rejected_entries") == [(0,)]
+
@@ -0,0 +1,67 @@
+"""Windowed Toggl fetches (fetch_toggl_entries_windowed) against a fake session."""
+
+from datetime import date
+
+from scripts.benchmarks.fakes import FakeResponse, FakeTogglSession
+from scripts.benchmarks.generators import toggl_api_entries
+from scripts.toggl_integration import fetch_toggl_entries_windowed, toggl_date_windows
+
+
+class FailingWindowsSession(FakeTogglSession):
+    """Fails the requests whose start_date is one of `failing_starts`."""
+
+    def __init__(self, api_entries, failing_starts=()):
+        super().__init__(api_entries)
+        self.failing = [f"start_date={day.isoformat()}" for day in failing_starts]
+        self.urls = []
+
+    def get(self, url, **kwargs):
+        self.urls.append(url)
+        if any(marker in url for marker in self.failing):
+            self.calls += 1
+            return FakeResponse({"error": "server error"}, status_code=500)
+        return super().get(url, **kwargs)
+
+
+START = date(2024, 1, 1)
+END = date(2024, 4, 1)
+
+
+def test_windows_cover_the_range_half_open():
+    windows = toggl_date_windows(START, END, window_days=30)
+
+    assert windows[0][0] == START
+    assert windows[-1][1] == END
+    assert all(a[1] == b[0] for a, b in zip(windows, windows[1:]))
+
+
+def test_entries_merged_and_deduplicated_across_windows():
+    # Every window answers with the same entries, as boundary days can
+    session = FailingWindowsSession(toggl_api_entries(20))
+
+    entries = fetch_toggl_entries_windowed(session, START, END, window_days=30, workers=3)
+
+    assert len(session.urls) == len(toggl_date_windows(START, END, 30))
+    assert sorted(entry["id"] for entry in entries) == [entry["id"] for entry in toggl_api_entries(20)]
+
+
+def test_one_failed_window_fails_the_fetch():
+    windows = toggl_date_windows(START, END, window_days=30)
+    session = FailingWindowsSession(toggl_api_entries(20), failing_starts=[windows[1][0]])
+
+    assert fetch_toggl_entries_windowed(session, START, END, window_days=30, workers=3) is None
+    assert len(session.urls) == len(windows)
+
+
+def test_every_window_failing_fails_the_fetch():
+    windows = toggl_date_windows(START, END, window_days=30)
+    session = FailingWindowsSession([], failing_starts=[start for start, _ in windows])
+
+    assert fetch_toggl_entries_windowed(session, START, END, window_days=30) is None
+
+
+def test_empty_range_fetches_nothing():
+    session = FailingWindowsSession(toggl_api_entries(5))
+
+    assert fetch_toggl_entries_windowed(session, START, START) == []
+    assert session.urls == []
@@ -0,0 +1,113 @@
+"""store_workout_batch / store_workout_data on the SQLite stand-in."""
+
+import pytest
+
+from scripts.benchmarks.generators import garmin_activities
+from scripts.benchmarks.localdb import open_database
+from scripts.database import store_workout_batch, store_workout_data
+
+
+@pytest.fixture
+def conn():
+    conn, _, cleanup = open_database()
+    yield conn
+    cleanup()
+
+
+def _rows(conn):
+    with conn.cursor() as cur:
+        cur.execute(
+            "SELECT date, activity_type, title, garmin_activity_id, strava_activity_id "
+            "FROM workout_stats ORDER BY date"
+        )
+        return cur.fetchall()
+
+
+def _reject_title(conn, title):
+    """Make every insert of a row with this title fail."""
+    conn.raw.execute(
+        f"CREATE TRIGGER reject_title BEFORE INSERT ON workout_stats "
+        f"WHEN NEW.title = '{title}' BEGIN SELECT RAISE(ABORT, 'rejected'); END"
+    )
+
+
+def _moved(activity, start, **changes):
+    return dict(activity, startTimeLocal=start, **changes)
+
+
+def _strava(activity, strava_id):
+    strava = {key: value for key, value in activity.items() if key != "activityId"}
+    strava["stravaActivityId"] = strava_id
+    return strava
+
+
+def test_batch_stores_every_activity(conn):
+    activities = garmin_activities(25)
+
+    result = store_workout_batch(conn, activities, batch_size=10)
+
+    assert result == {"stored": 25, "rejected": []}
+    assert len(_rows(conn)) == 25
+    assert conn.autocommit
+
+
+def test_moved_garmin_activity_replaces_its_old_row(conn):
+    activity = garmin_activities(1)[0]
+    store_workout_batch(conn, [activity])
+
+    result = store_workout_batch(conn, [_moved(activity, "2024-06-01 07:30:00")])
+
+    assert result["stored"] == 1
+    rows = _rows(conn)
+    assert len(rows) == 1
+    assert str(rows[0][0]).startswith("2024-06-01 07:30")
+    assert rows[0][3] == activity["activityId"]
+
+
+def test_moved_strava_id_leaves_garmin_row_in_place(conn):
+    garmin = garmin_activities(1)[0]
+    store_workout_batch(conn, [dict(garmin, stravaActivityId=77)])
+
+    store_workout_batch(conn, [_moved(_strava(garmin, 77), "2024-06-01 07:30:00")])
+
+    rows = _rows(conn)
+    assert len(rows) == 2
+    kept = [row for row in rows if row[3] == garmin["activityId"]]
+    assert kept and kept[0][4] is None
+
+
+def test_failed_upsert_keeps_the_old_row(conn):
+    activity = garmin_activities(1)[0]
+    store_workout_batch(conn, [activity])
+    _reject_title(conn, "moved")
+
+    result = store_workout_batch(
+        conn, [_moved(activity, "2024-06-01 07:30:00", activityName="moved")]
+    )
+
+    assert result["stored"] == 0
+    assert len(result["rejected"]) == 1
+    assert _rows(conn)[0][2] == activity["activityName"]
+
+
+def test_failed_row_is_rejected_alone_and_counted_once(conn):
+    activities = garmin_activities(6)
+    activities[3] = dict(activities[3], activityName="bad")
+    _reject_title(conn, "bad")
+
+    result = store_workout_batch(conn, activities, batch_size=4)
+
+    assert result["stored"] == 5
+    assert [activity for activity, _ in result["rejected"]] == [activities[3]]
+    assert len(_rows(conn)) == 5
+
+
+def test_single_store_replaces_moved_row(conn):
+    activity = garmin_activities(1)[0]
+    store_workout_data(conn, activity)
+    store_workout_data(conn, _moved(activity, "2024-06-01 07:30:00"))
+
+    rows = _rows(conn)
+    assert len(rows) == 1
+    assert rows[0][3] == activity["activityId"]
+    assert conn.autocommit